@@ -0,0 +1,102 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Benchmark of PololuQik's command throughput and query latency against the qik
+emulator, no hardware required. The emulator throttles the byte stream to the
+emulated baud rate, so the numbers reflect the UART as well as our own code.
+
+To run: cd src/benchmark; python3 CommandThroughputBenchmark.py [--baud 38400]
+"""
+
+import sys,os
+import time
+import argparse
+import logging
+sys.path.append(os.path.join("..","motor control"))
+sys.path.append(os.path.join("..","configuration"))
+import PololuQik, QikEmulator
+
+#------------------------------------------------------------------------------#
+# benchmarkSpeeds: write speed commands as fast as possible, alternating       #
+#                  speeds so redundant command suppression does not kick in.   #
+#                  In asynchronous mode stale commands are coalesced, so fewer #
+#                  commands than submitted reach the emulator.                 #
+#                                                                              #
+# returnvalues: commands per second as seen by the caller, number of commands  #
+#               executed by the emulator and the time until the last one was   #
+#               executed                                                       #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+def benchmarkSpeeds(qik, emulator, count):
+  received = emulator.commandsReceived
+  start = time.time()
+  for i in range(count):
+    qik.setSpeeds(i % 100, -(i % 100))
+  submitted = time.time() - start
+  #wait for the emulator to go quiet
+  executed = submitted
+  lastReceived = None
+  while emulator.commandsReceived != lastReceived:
+    lastReceived = emulator.commandsReceived
+    executed = time.time() - start
+    time.sleep(0.1)
+  return 2 * count / submitted, lastReceived - received, executed
+
+#------------------------------------------------------------------------------#
+# benchmarkQueries: round trip time of reading the error byte                  #
+#                                                                              #
+# returnvalues: list of round trip times in seconds                            #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+def benchmarkQueries(qik, count):
+  times = []
+  for i in range(count):
+    start = time.time()
+    qik.getErrorByte()
+    times.append(time.time() - start)
+  return times
+
+def main():
+  parser = argparse.ArgumentParser(description='PololuQik command throughput benchmark')
+  parser.add_argument('--baud', default=38400, type=int, help='emulated baud rate, 0 for no delay')
+  parser.add_argument('--count', default=2000, type=int, help='number of speed commands per motor')
+  parser.add_argument('--async', dest='asyncWrite', action='store_true', help='use the asynchronous writer')
+  args = parser.parse_args()
+  logger = logging.getLogger('benchmark')
+  emulator = QikEmulator.QikEmulator(logger=logger, baudRate=args.baud)
+  qik = PololuQik.PololuQik(logger=logger, serialPort=emulator.port, baudRate=args.baud or 38400,
+                            asyncWrite=args.asyncWrite)
+  try:
+    submitted, executed, seconds = benchmarkSpeeds(qik, emulator, args.count)
+    print('speed commands: {:.0f}/s submitted, {} of {} executed within {:.3f} s'.format(
+          submitted, executed, 2 * args.count, seconds))
+    times = sorted(benchmarkQueries(qik, 200))
+    print('error byte query: median {:.3f} ms, 99th percentile {:.3f} ms'.format(
+          1e3 * times[len(times) // 2], 1e3 * times[int(len(times) * 0.99)]))
+  finally:
+    qik.close()
+    emulator.close()
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
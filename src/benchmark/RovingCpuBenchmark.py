@@ -0,0 +1,215 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Benchmark of the CPU time used by roving: the original busy waiting roving and
+evade loops against the event driven state machine. Both run the same script
+of obstructions against a motor controller and a sensor which only record what
+they are asked to do, so no serial port is opened. CPU time is the process
+time of all threads whilst roving.
+
+To run: cd src/benchmark; python3 RovingCpuBenchmark.py [--duration 6]
+"""
+
+import sys,os
+import time
+import random
+import argparse
+import threading
+import logging
+sys.path.append(os.path.join("..","robot"))
+import PololuRobot, ManeuverScheduler
+
+#------------------------------------------------------------------------------#
+# RecordingController: stands in for PololuQik, counts the commands            #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class RecordingController():
+  def __init__(self):
+    self.commands = 0
+
+  def setSpeeds(self, m0Speed, m1Speed):
+    self.commands += 1
+
+  def stopMotors(self):
+    self.commands += 1
+
+#------------------------------------------------------------------------------#
+# ScriptedSensor: stands in for ObstructionSensor, reports obstructions at the #
+#                 times of a script from a thread of its own                   #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+# 1.01    hta 18.10.2026 No reflex                                             #
+#------------------------------------------------------------------------------#
+class ScriptedSensor():
+  def __init__(self, script):
+    self.obstructed = False
+    self.listeners  = []
+    self.reflex     = None
+    self.script     = script
+    self.stopped    = threading.Event()
+
+  def addListener(self, listener):
+    self.listeners.append(listener)
+
+  def run(self):
+    start = time.time()
+    for seconds, obstructed in self.script:
+      if self.stopped.wait(max(0.0, start + seconds - time.time())):
+        return
+      self.obstructed = obstructed
+      for listener in self.listeners:
+        listener(obstructed)
+
+#------------------------------------------------------------------------------#
+# LegacyRobot: roving and evade as they were, busy waiting for the sensor and  #
+#              for maneuvers to complete, with a timer thread per maneuver     #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+# 1.01    hta 18.10.2026 Timer thread per maneuver                             #
+#------------------------------------------------------------------------------#
+class LegacyRobot(PololuRobot.PololuRobot):
+  def callback(self,function,time):
+    if time > 0:
+      self.timer = threading.Timer(time,function)
+      self.timer.start()
+      self.timer.join()
+
+  def evade(self):
+    SHARP_TURN_RADIUS=(0.2,1.5)
+    self.isEvading=True
+    action='reverse'
+    while self.isEvading and self.isRoving:
+      if action=='reverse':
+        self.driveBackwards()
+        self.callback(function=self.callbackStop, time=2.0*(70/self.setDriveSpeed))
+        action='reversing'
+      elif action=='reversing':
+        if self.stopped:
+          action='clearedObstacle'
+      elif action=='clearedObstacle':
+        if not self.sensorFront.obstructed:
+          action='turn'
+        else:
+          action='reverse'
+      elif action=='turn':
+        if random.choice(['left','right'])=='left':
+          self.turnLeft(time=self.turnDuration(),radius=SHARP_TURN_RADIUS)
+        else:
+          self.turnRight(time=self.turnDuration(),radius=SHARP_TURN_RADIUS)
+        action='turning'
+      elif action == 'turning':
+        if self.stopped:
+          self.isEvading=False
+
+  def roving(self):
+    self.isEvading=False
+    self.stop()
+    while self.isRoving:
+      if self.stopped and not self.sensorFront.obstructed and not self.isEvading:
+        self.driveForwards()
+      if self.sensorFront.obstructed and not self.isEvading:
+        self.evade()
+
+#------------------------------------------------------------------------------#
+# makeRobot: a robot object with the recording controller and scripted sensor  #
+#            in place of the hardware, no configuration is loaded              #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+# 1.01    hta 18.10.2026 Maneuver scheduler                                    #
+# 1.02    hta 18.10.2026 Motor commands without arbiter                        #
+# 1.03    hta 18.10.2026 No sensor bus                                         #
+# 1.04    hta 18.10.2026 Roving lock                                           #
+#------------------------------------------------------------------------------#
+def makeRobot(robotClass, sensor):
+  robot = robotClass.__new__(robotClass)
+  robot.logger = logging.getLogger('RovingCpuBenchmark')
+  robot.kwargs = {'adaptiveReverse': False}
+  robot.timer = None
+  robot.scheduler = ManeuverScheduler.ManeuverScheduler(logger=robot.logger)
+  robot.motorControl = RecordingController()
+  robot.motorCommands = robot.motorControl
+  robot.commandArbiter = None
+  robot.speedRamp = None
+  robot.sensorBus = None
+  robot.sensorFront = sensor
+  robot.roverCondition = threading.Condition()
+  robot.roverEvents = 0
+  robot.rovingLock = threading.Lock()
+  robot.rovingThread = None
+  robot.setDriveSpeed = 100
+  robot.stopped = True
+  robot.isRoving = False
+  robot.isEvading = False
+  robot.evades = 0
+  robot.evadesCompleted = 0
+  robot.repeatedReverses = 0
+  robot.drivingForwards = False
+  robot.drivingBackwards = False
+  sensor.addListener(robot.sensorChanged)
+  return robot
+
+#------------------------------------------------------------------------------#
+# benchmark: rove through the script of obstructions                           #
+#                                                                              #
+# returnvalues: (CPU seconds, wall clock seconds, motor commands)              #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+# 1.01    hta 18.10.2026 Close maneuver scheduler                              #
+#------------------------------------------------------------------------------#
+def benchmark(robotClass, script, duration):
+  sensor = ScriptedSensor(script)
+  robot = makeRobot(robotClass, sensor)
+  sensorThread = threading.Thread(target=sensor.run)
+  startCpu, start = time.process_time(), time.time()
+  sensorThread.start()
+  robot.runRoving()
+  time.sleep(duration)
+  robot.stopRoving()
+  cpu, wall = time.process_time() - startCpu, time.time() - start
+  sensor.stopped.set()
+  sensorThread.join()
+  for thread in threading.enumerate():
+    if thread.name == 'ROVING':
+      thread.join()
+  robot.scheduler.close()
+  return cpu, wall, robot.motorControl.commands
+
+def main():
+  parser = argparse.ArgumentParser(description='CPU time used by roving')
+  parser.add_argument('--duration', type=float, default=6.0, help='seconds to rove per variant')
+  args = parser.parse_args()
+  logging.basicConfig(level=logging.WARNING)
+  #an obstruction every three seconds, seen for a third of a second
+  script = []
+  for seconds in range(0, int(args.duration), 3):
+    script.append((seconds + 0.5, True))
+    script.append((seconds + 0.8, False))
+  for name, robotClass in (('busy waiting', LegacyRobot), ('event driven', PololuRobot.PololuRobot)):
+    cpu, wall, commands = benchmark(robotClass, script, args.duration)
+    print('{:<13} cpu {:6.3f}s of {:6.3f}s ({:5.1f}%) motor commands {}'.format(name, cpu, wall, 100 * cpu / wall, commands))
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
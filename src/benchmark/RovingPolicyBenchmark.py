@@ -0,0 +1,155 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Monte Carlo benchmark of the roving policy, i.e. PololuRobot.roving and evade
+as they are, on the simulator. For every drive speed the robot roves through
+many random obstacle maps, the same maps for every speed. Trials run in
+parallel on a pool of processes, each trial is one batch of maps advanced
+together by the simulator with its own seed for evade's left or right
+decisions.
+
+Reported per drive speed, averaged over all maps with the standard deviation:
+ - distance covered per minute
+ - share of the time spent evading
+ - collisions per hour, the body ran into something the sensor did not see
+ - repeated evades per hour, evades starting within REPEAT_WINDOW seconds of
+   the end of the previous one (the robot did not get away from the obstacle),
+   including an evade starting straight away when the previous one ends with
+   the obstacle still in view
+ - repeated reverses per hour, evade reversing again as the obstacle is still
+   in view after reversing
+
+Evades are counted by the robot where they start and end, see
+PololuRobot.rovingStep and evade.
+
+With --adaptive-reverse evade reverses about as long as obstacles usually stay
+in view, see PololuRobot.reverseTime, rather than for a fixed time.
+
+To run: cd src/benchmark; python3 RovingPolicyBenchmark.py [--maps 64] [--speeds 30 50 70]
+"""
+
+import sys,os
+import time
+import math
+import random
+import argparse
+import multiprocessing
+import logging
+sys.path.append(os.path.join("..","robot"))
+sys.path.append(os.path.join("..","simulation"))
+import RobotSimulator
+
+# an evade starting within this many simulated seconds of the end of the
+# previous one is counted as repeated
+REPEAT_WINDOW = 3.0
+
+#------------------------------------------------------------------------------#
+# runTrial: rove a batch of random maps at one drive speed, runs in a pool     #
+#           process                                                            #
+#                                                                              #
+# paramteres: trial: (drive speed, first map seed, number of maps, simulated   #
+#                    seconds, adaptive reverse)                                #
+#                                                                              #
+# returnvalues: (drive speed, list with a dictionary of totals per map)        #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+# 1.01    hta 18.10.2026 Adaptive reverse                                      #
+# 1.02    hta 18.10.2026 Evades counted by the robot                           #
+#------------------------------------------------------------------------------#
+def runTrial(trial):
+  speed, firstSeed, maps, seconds, adaptiveReverse = trial
+  logging.getLogger('RobotSimulator').setLevel(logging.WARNING)
+  #map seed n gives the same map whatever the speed, evade's decisions
+  #depend on the seed of the first map in the batch
+  worlds = [RobotSimulator.randomWorld(random.Random(seed)) for seed in range(firstSeed, firstSeed + maps)]
+  random.seed(firstSeed)
+  simulation = RobotSimulator.Simulation(worlds=worlds, driveSpeed=speed, adaptiveReverse=adaptiveReverse)
+  simulation.startRoving()
+  repeats = [0] * maps
+  evades = [0] * maps
+  evadesCompleted = [0] * maps
+  evadeEnded = [None] * maps
+  for step in range(int(round(seconds / simulation.timeStep))):
+    simulation.step()
+    for index, robot in enumerate(simulation.robots):
+      #an evade ends before the next one starts, possibly in the same step
+      if robot.evadesCompleted != evadesCompleted[index]:
+        evadesCompleted[index] = robot.evadesCompleted
+        evadeEnded[index] = simulation.clock.now
+      if robot.evades != evades[index]:
+        if evadeEnded[index] is not None and simulation.clock.now - evadeEnded[index] <= REPEAT_WINDOW:
+          repeats[index] += robot.evades - evades[index]
+        evades[index] = robot.evades
+  results = simulation.getResults()
+  for result, repeated in zip(results, repeats):
+    result['repeats'] = repeated
+  return speed, results
+
+#------------------------------------------------------------------------------#
+# summarize: mean and standard deviation                                       #
+#                                                                              #
+# returnvalues: (mean, standard deviation)                                     #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+def summarize(values):
+  mean = sum(values) / len(values)
+  if len(values) < 2:
+    return mean, 0.0
+  return mean, math.sqrt(sum((value - mean) ** 2 for value in values) / (len(values) - 1))
+
+def main():
+  parser = argparse.ArgumentParser(description='Monte Carlo benchmark of the roving policy on the simulator')
+  parser.add_argument('--speeds', type=int, nargs='+', default=[30, 50, 70], help='drive speeds to compare')
+  parser.add_argument('--maps', type=int, default=64, help='random maps per drive speed')
+  parser.add_argument('--batch', type=int, default=8, help='maps simulated together in one trial')
+  parser.add_argument('--minutes', type=float, default=30.0, help='simulated minutes of roving per map')
+  parser.add_argument('--adaptive-reverse', action='store_true', help='reverse as long as obstacles usually stay in view')
+  parser.add_argument('--processes', type=int, default=None, help='pool size, default one per CPU')
+  args = parser.parse_args()
+  logging.basicConfig(level=logging.WARNING)
+  trials = [(speed, firstSeed, min(args.batch, args.maps - firstSeed), args.minutes * 60, args.adaptive_reverse)
+            for speed in args.speeds for firstSeed in range(0, args.maps, args.batch)]
+  results = dict((speed, []) for speed in args.speeds)
+  start = time.time()
+  pool = multiprocessing.Pool(args.processes)
+  try:
+    for speed, trialResults in pool.imap_unordered(runTrial, trials):
+      results[speed].extend(trialResults)
+  finally:
+    pool.close()
+    pool.join()
+  wall = time.time() - start
+  print('{} maps x {:.0f} simulated minutes per speed in {:.1f}s'.format(args.maps, args.minutes, wall))
+  print('{:>5} {:>17} {:>17} {:>17} {:>17} {:>17}'.format('speed', 'metres/minute', 'evading %', 'collisions/hour',
+                                                         'repeats/hour', 're-reverses/hour'))
+  for speed in args.speeds:
+    hours = [result['seconds'] / 3600 for result in results[speed]]
+    columns = (summarize([60 * result['distance'] / result['seconds'] for result in results[speed]]),
+               summarize([100 * result['evadingTime'] / result['seconds'] for result in results[speed]]),
+               summarize([result['collisions'] / hour for result, hour in zip(results[speed], hours)]),
+               summarize([result['repeats'] / hour for result, hour in zip(results[speed], hours)]),
+               summarize([result['repeatedReverses'] / hour for result, hour in zip(results[speed], hours)]))
+    print('{:>5} '.format(speed) + ' '.join('{:8.2f} +-{:6.2f}'.format(mean, deviation) for mean, deviation in columns))
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,134 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Micro-benchmark comparing the original speed command encoder of PololuQik,
+which builds the command byte by byte in a shared bytearray on every call,
+with the lookup in the precomputed speed frames. Before timing anything the
+benchmark checks that both produce identical bytes for every speed.
+
+No serial port is opened, the benchmark only exercises the encoding.
+
+To run: cd src/benchmark; python3 SpeedEncodingBenchmark.py
+"""
+
+import sys,os
+import timeit
+sys.path.append(os.path.join("..","motor control"))
+import PololuQik
+
+#------------------------------------------------------------------------------#
+# LegacyEncoder: the encoder as it was in PololuQik.setM0Speed/setM1Speed,     #
+#                minus the write to the serial port                            #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class LegacyEncoder():
+  def __init__(self):
+    self.write_bytes = bytearray()
+
+  def setM0Speed(self, speed):
+    del self.write_bytes[:]
+    reverse = False
+    if speed < 0 :
+      speed = -1 * speed
+      reverse = True
+    if speed > 255 :
+      speed = 255
+    if speed > 127 :
+      if reverse :
+        self.write_bytes.append(PololuQik.QIK_MOTOR_M0_FORWARD_8_BIT)
+      else:
+        self.write_bytes.append(PololuQik.QIK_MOTOR_M0_REVERSE_8_BIT)
+      self.write_bytes.append(speed - 128)
+    else:
+      if reverse :
+        self.write_bytes.append(PololuQik.QIK_MOTOR_M0_FORWARD)
+      else:
+        self.write_bytes.append(PololuQik.QIK_MOTOR_M0_REVERSE)
+      self.write_bytes.append(speed)
+    return self.write_bytes
+
+  def setM1Speed(self, speed):
+    del self.write_bytes[:]
+    reverse = False
+    if speed < 0 :
+      speed = -1 * speed
+      reverse = True
+    if speed > 255 :
+      speed = 255
+    if speed > 127 :
+      if reverse :
+        self.write_bytes.append(PololuQik.QIK_MOTOR_M1_REVERSE_8_BIT)
+      else:
+        self.write_bytes.append(PololuQik.QIK_MOTOR_M1_FORWARD_8_BIT)
+      self.write_bytes.append(speed - 128)
+    else:
+      if reverse :
+        self.write_bytes.append(PololuQik.QIK_MOTOR_M1_REVERSE)
+      else:
+        self.write_bytes.append(PololuQik.QIK_MOTOR_M1_FORWARD)
+      self.write_bytes.append(speed)
+    return self.write_bytes
+
+#------------------------------------------------------------------------------#
+# TableEncoder: holds the precomputed speed frames the same way PololuQik does #
+#               and borrows its lookup methods, no serial port required        #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class TableEncoder():
+  def __init__(self):
+    self.m0SpeedFrames = tuple(PololuQik.encodeSpeedCommand(0, speed) for speed in range(-255, 256))
+    self.m1SpeedFrames = tuple(PololuQik.encodeSpeedCommand(1, speed) for speed in range(-255, 256))
+    self.maxSpeed = 255
+  encodeM0Speed = PololuQik.PololuQik.encodeM0Speed
+  encodeM1Speed = PololuQik.PololuQik.encodeM1Speed
+
+def main():
+  legacy = LegacyEncoder()
+  table  = TableEncoder()
+  speeds = list(range(-300, 301))
+  #both encoders must agree on every speed, including out of range speeds
+  for speed in speeds:
+    if bytes(legacy.setM0Speed(speed)) != table.encodeM0Speed(speed) or \
+       bytes(legacy.setM1Speed(speed)) != table.encodeM1Speed(speed):
+      print('encoders disagree on speed['+str(speed)+']')
+      return 1
+
+  def runLegacy():
+    for speed in speeds:
+      legacy.setM0Speed(speed)
+      legacy.setM1Speed(speed)
+
+  def runTable():
+    for speed in speeds:
+      table.encodeM0Speed(speed)
+      table.encodeM1Speed(speed)
+
+  repeat = 200
+  commands = 2 * len(speeds) * repeat
+  for name, function in (('legacy encoder', runLegacy), ('table lookup', runTable)):
+    seconds = min(timeit.repeat(function, number=repeat, repeat=5))
+    print('{:<15} {:8.3f} us/command'.format(name, 1e6 * seconds / commands))
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
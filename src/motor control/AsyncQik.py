@@ -0,0 +1,351 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the AsyncQik class, a qik 2s9v1 controller driven from
+an asyncio event loop. The serial port is put in non-blocking mode and watched
+by the event loop, there are no reader or writer threads.
+
+Motor commands are the precomputed frames of PololuQik. They are buffered per
+motor until the port is writable, a newer command for a motor replaces the one
+still buffered (latest wins) and urgent commands (stop, coast) go out before
+anything else buffered. Queries are coroutines, replies are matched to them
+in order and a query without reply in time raises QikTimeoutError. The query
+after a timeout first discards the waiting queries and flushes the serial
+input, a late reply is never taken for the reply to a newer query.
+
+  qik = AsyncQik(logger=logger, loop=loop, serialPort='/dev/ttyAMA0')
+  loop.run_until_complete(qik.waitUntilReady())
+  qik.setSpeeds(30, 30)
+"""
+
+import os
+import time
+import asyncio
+import collections
+import logging, traceback
+import serial
+import PololuQik
+
+# clock used for deadlines
+clock = getattr(time, 'monotonic', time.time)
+
+QikTimeoutError = PololuQik.QikTimeoutError
+
+class AsyncQik():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger',)
+    self.loop = kwargs.get('loop')
+    self.deviceId = None
+    if kwargs.get('protocol', PololuQik.QIK_PROTOCOL_COMPACT) == PololuQik.QIK_PROTOCOL_POLOLU:
+      self.deviceId = int(kwargs.get('deviceId', PololuQik.QIK_DEFAULT_DEVICE_ID))
+    self.crc = bool(kwargs.get('crc', False))
+    self.replyTimeout   = float(kwargs.get('replyTimeout', 0.5))
+    self.startupTimeout = float(kwargs.get('startupTimeout', 2.0))
+    self.probeInterval  = float(kwargs.get('probeInterval', 0.05))
+    #a timed out query is dropped after this long, unless a newer query
+    #resynchronises first
+    self.gracePeriod = float(kwargs.get('gracePeriod', 1.0))
+    #seconds it took the controller to answer, set by waitUntilReady
+    self.startupTime = None
+    #the same frames PololuQik sends
+    self.m0SpeedFrames = tuple(PololuQik.encodeSpeedCommand(0, speed, self.deviceId, self.crc) for speed in range(-255, 256))
+    self.m1SpeedFrames = tuple(PololuQik.encodeSpeedCommand(1, speed, self.deviceId, self.crc) for speed in range(-255, 256))
+    self.stopFrame = self.m0SpeedFrames[255] + self.m1SpeedFrames[255] + \
+                     self.frame(PololuQik.QIK_2S9V1_MOTOR_M0_COAST) + self.frame(PololuQik.QIK_2S9V1_MOTOR_M1_COAST)
+    self.maxSpeed = 255
+    #last frame sent per motor, used to suppress redundant writes
+    self.lastM0Bytes = None
+    self.lastM1Bytes = None
+    #frames waiting for the port to become writable, latest wins per key
+    self.urgent  = bytearray()
+    self.pending = collections.OrderedDict()
+    #bytes taken from the above but not yet accepted by the port
+    self.buffer  = bytearray()
+    self.writing = False
+    #queries waiting for their reply, oldest first: [replyLength, reply, future]
+    #the future of a timed out query is cancelled
+    self.replies = collections.deque()
+    self.unexpectedBytes = 0
+    #timed out queries whose reply never arrived
+    self.lostReplies = 0
+    #set when a query times out, the next query resynchronises first
+    self.desynced = False
+    serialPort = kwargs.get('serialPort')
+    baudRate   = int(kwargs.get('baudRate', 38400))
+    self.logger.debug('using serial port['+serialPort+'] baudRate['+str(baudRate)+']')
+    self.ser = serial.Serial(serialPort, baudRate, timeout=0)
+    self.ser.nonblocking()
+    self.ser.flushInput()
+    self.fd = self.ser.fileno()
+    self.loop.add_reader(self.fd, self.readable)
+
+  #------------------------------------------------------------------------------#
+  # frame: build a frame for our protocol, device ID and CRC mode                #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def frame(self, command, *data):
+    return PololuQik.buildFrame(command, data, self.deviceId, self.crc)
+
+  #------------------------------------------------------------------------------#
+  # submit: buffer a frame until the port is writable                            #
+  #                                                                              #
+  # Parameters: frame:  bytes to write                                           #
+  #             key:    frames with the same key replace each other whilst still #
+  #                     buffered, None when the frame must never be coalesced    #
+  #             urgent: True to write the frame before anything else buffered    #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def submit(self, frame, key=None, urgent=False):
+    if urgent:
+      if key is not None:
+        self.pending.pop(key, None)
+      self.urgent.extend(frame)
+    else:
+      self.pending[key if key is not None else object()] = frame
+    if not self.writing:
+      self.writing = True
+      self.loop.add_writer(self.fd, self.writable)
+
+  #------------------------------------------------------------------------------#
+  # writable: called by the event loop when the port accepts bytes               #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def writable(self):
+    if not self.buffer:
+      self.buffer.extend(self.urgent)
+      del self.urgent[:]
+      for frame in self.pending.values():
+        self.buffer.extend(frame)
+      self.pending.clear()
+    try:
+      written = os.write(self.fd, self.buffer)
+      del self.buffer[:written]
+    except (BlockingIOError, InterruptedError):
+      return
+    if not self.buffer and not self.urgent and not self.pending:
+      self.writing = False
+      self.loop.remove_writer(self.fd)
+
+  #------------------------------------------------------------------------------#
+  # readable: called by the event loop when bytes arrived, hands them to the     #
+  #           waiting queries oldest first. A timed out query at the head is     #
+  #           dropped rather than fed once newer queries wait behind it          #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Drop a timed out head when newer queries wait         #
+  #------------------------------------------------------------------------------#
+  def readable(self):
+    try:
+      data = os.read(self.fd, 256)
+    except (BlockingIOError, InterruptedError):
+      return
+    for byte in bytearray(data):
+      if not self.replies:
+        self.unexpectedBytes += 1
+        continue
+      while self.replies[0][2].cancelled() and len(self.replies) > 1:
+        self.forget(self.replies[0])
+      entry = self.replies[0]
+      entry[1].append(byte)
+      if len(entry[1]) >= entry[0]:
+        self.replies.popleft()
+        if not entry[2].done():
+          entry[2].set_result(bytes(entry[1]))
+
+  #------------------------------------------------------------------------------#
+  # query: write a command which the qik controller answers and wait for the     #
+  #        reply, a coroutine. After a timeout the reply stream is               #
+  #        resynchronised before the command is written                          #
+  #                                                                              #
+  # Parameters: frame:       command bytes                                       #
+  #             replyLength: number of bytes in the reply                        #
+  #             name:        command type, used in QikTimeoutError               #
+  #             timeout:     seconds to wait for the reply, None for the default #
+  #                                                                              #
+  # returnvalues: reply as bytes, raises QikTimeoutError when the reply does not #
+  #               arrive in time                                                 #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Resynchronise after a lost reply                      #
+  #------------------------------------------------------------------------------#
+  async def query(self, frame, replyLength=1, name='query', timeout=None):
+    if timeout is None:
+      timeout = self.replyTimeout
+    if self.desynced:
+      self.resync()
+    entry = [replyLength, bytearray(), self.loop.create_future()]
+    self.replies.append(entry)
+    self.submit(frame)
+    try:
+      return await asyncio.wait_for(asyncio.shield(entry[2]), timeout)
+    except asyncio.TimeoutError:
+      #abandoned, dropped by the next query or after the grace period
+      entry[2].cancel()
+      self.desynced = True
+      self.loop.call_later(self.gracePeriod, self.forget, entry)
+      raise QikTimeoutError(name, timeout, entry[1])
+
+  #------------------------------------------------------------------------------#
+  # forget: drop a timed out query whose reply has not arrived                   #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Count lost replies                                    #
+  #------------------------------------------------------------------------------#
+  def forget(self, entry):
+    if entry in self.replies:
+      self.replies.remove(entry)
+      self.lostReplies += 1
+      self.logger.warning('reply lost')
+
+  #------------------------------------------------------------------------------#
+  # resync: get back in step with the controller after a reply went missing.     #
+  #         Waiting queries are discarded and the bytes received so far are      #
+  #         dropped, the next command written gets the next reply                #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def resync(self):
+    self.desynced = False
+    for entry in self.replies:
+      if entry[2].cancelled():
+        self.lostReplies += 1
+      else:
+        entry[2].cancel()
+    self.replies.clear()
+    try:
+      while os.read(self.fd, 256):
+        pass
+    except (BlockingIOError, InterruptedError):
+      pass
+    self.ser.flushInput()
+
+  #------------------------------------------------------------------------------#
+  # waitUntilReady: send autodetect and probe the controller with the get        #
+  #                 firmware version command until it answers, see               #
+  #                 PololuQik.waitUntilReady                                     #
+  #                                                                              #
+  # returnvalues: seconds until the controller answered, raises QikTimeoutError  #
+  #               when it does not answer within startupTimeout                  #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Resynchronise after a probe without reply             #
+  #------------------------------------------------------------------------------#
+  async def waitUntilReady(self):
+    start = clock()
+    attempts = 0
+    while True:
+      attempts += 1
+      self.submit(bytes([PololuQik.QIK_AUTODETECT_BAUD_RATE]))
+      try:
+        await self.query(self.frame(PololuQik.QIK_GET_FIRMWARE_VERSION), name='waitUntilReady', timeout=self.probeInterval)
+        break
+      except QikTimeoutError:
+        #the controller did not hear the probe, it will not answer it late
+        self.resync()
+        if clock() - start >= self.startupTimeout:
+          raise QikTimeoutError('waitUntilReady', self.startupTimeout, b'')
+    if attempts > 1:
+      #let late replies to earlier probes arrive, then clear the format
+      #error caused by autodetect bytes sent after detection
+      await asyncio.sleep(self.probeInterval)
+      await self.query(self.frame(PololuQik.QIK_GET_ERROR_BYTE), name='getErrorByte')
+    pwm = await self.query(self.frame(PololuQik.QIK_GET_CONFIGURATION_PARAMETER, PololuQik.QIK_CONFIG_PWM_PARAMETER),
+                           name='getConfigurationParameter')
+    if not bytearray(pwm)[0] & PololuQik.QIK_PWM_8_BIT:
+      self.maxSpeed = 127
+    self.startupTime = clock() - start
+    self.logger.debug('controller ready after [' + '{:.3f}'.format(self.startupTime) + 's] attempts[' + str(attempts) + ']')
+    return self.startupTime
+
+  #------------------------------------------------------------------------------#
+  # setSpeeds: set the speed of both motors, unchanged speeds are not sent again #
+  #                                                                              #
+  # Parameters: m0Speed: -255..255                                               #
+  #             m1Speed: -255..255                                               #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def setSpeeds(self, m0Speed, m1Speed):
+    m0Bytes = self.m0SpeedFrames[int(max(-self.maxSpeed, min(self.maxSpeed, m0Speed))) + 255]
+    m1Bytes = self.m1SpeedFrames[int(max(-self.maxSpeed, min(self.maxSpeed, m1Speed))) + 255]
+    if m0Bytes != self.lastM0Bytes:
+      self.submit(m0Bytes, key='M0')
+      self.lastM0Bytes = m0Bytes
+    if m1Bytes != self.lastM1Bytes:
+      self.submit(m1Bytes, key='M1')
+      self.lastM1Bytes = m1Bytes
+
+  def setSpeed(self, speed):
+    self.setSpeeds(speed, speed)
+
+  #------------------------------------------------------------------------------#
+  # stopMotors: set both speeds to zero then let both motors coast, ahead of     #
+  #             anything else buffered                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def stopMotors(self):
+    self.pending.pop('M0', None)
+    self.pending.pop('M1', None)
+    self.submit(self.stopFrame, urgent=True)
+    #the motors coast now, the next speed must be sent whatever it is
+    self.lastM0Bytes = None
+    self.lastM1Bytes = None
+
+  #------------------------------------------------------------------------------#
+  # close: write whatever is still buffered and close the serial port            #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def close(self):
+    self.loop.remove_reader(self.fd)
+    if self.writing:
+      self.loop.remove_writer(self.fd)
+    try:
+      buffered = bytes(self.buffer) + bytes(self.urgent) + b''.join(self.pending.values())
+      if buffered:
+        self.ser.write(buffered)
+    except Exception:
+      self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
+    self.ser.close()
@@ -0,0 +1,249 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the CommandArbiter class. The arbiter sits in front of a
+PololuQik and decides which motor command goes to the controller when several
+threads (web control, roving, timed maneuvers, the obstruction sensor) command
+the motors at the same time. Commands have a priority:
+
+ - PRIORITY_SAFETY: stops for an obstacle
+ - PRIORITY_ROVING: autonomous roving
+ - PRIORITY_MANUAL: manual control from the web application
+
+Only one command is written at a time, the command with the highest priority
+goes next. A command preempts every command of a lower priority requested
+before it, such commands are dropped rather than written late, so a slow
+manual command cannot overwrite a safety stop. A safety stop is also
+latched: until it is cleared (the obstacle is gone) or a command moving the
+robot backwards arrives, commands moving the robot forwards are rejected, so
+a command decided before the stop but requested just after it cannot drive on
+into the obstacle. The last command rejected is written once the safety stop
+is cleared, unless another command was written after it, so the motors end up
+doing what they were last told to do. There is no arbiter thread, commands are written by the
+thread requesting them, a safety stop therefore waits for at most the one
+write in progress.
+
+The time from request to the command being written is kept in a histogram per
+priority.
+"""
+
+import heapq
+import itertools
+import threading
+import logging, traceback
+import QikStatistics
+
+# command priorities, the lower the value the higher the priority
+PRIORITY_SAFETY = 0
+PRIORITY_ROVING = 1
+PRIORITY_MANUAL = 2
+PRIORITY_NAMES  = ('safety', 'roving', 'manual')
+
+#------------------------------------------------------------------------------#
+# motion: direction a speed command moves the robot in                         #
+#                                                                              #
+# Parameters: m0Speed: speed of motor 0, None when left as is, counted as 0    #
+#             m1Speed: speed of motor 1, None when left as is, counted as 0    #
+#                                                                              #
+# returnvalues: 1 forwards, -1 backwards, 0 neither e.g. stopped or spinning   #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+# 1.01    hta 18.10.2026 Motors left as is                                     #
+#------------------------------------------------------------------------------#
+def motion(m0Speed, m1Speed):
+  total = (m0Speed or 0) + (m1Speed or 0)
+  if total > 0:
+    return 1
+  if total < 0:
+    return -1
+  return 0
+
+class CommandArbiter():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger',)
+    #the PololuQik object driving the motors
+    self.controller = kwargs.get('controller')
+    #returns the priority of commands given without one
+    self.priority = kwargs.get('priority', lambda: PRIORITY_MANUAL)
+    #guards everything below, signals waiting commands
+    self.condition = threading.Condition()
+    #(priority, sequence) of the commands waiting to be written
+    self.waiting = []
+    self.sequence = itertools.count(1)
+    #per priority, commands with a lower sequence have been preempted
+    self.preemptedBefore = [0] * len(PRIORITY_NAMES)
+    #a command is being written
+    self.busy = False
+    #set by a safety stop, forward commands are rejected until cleared
+    self.latched = False
+    #(priority, write, motion) of the last command rejected whilst latched
+    self.deferred = None
+    #counters and request to write latency per priority
+    self.requested = [0] * len(PRIORITY_NAMES)
+    self.written   = [0] * len(PRIORITY_NAMES)
+    self.preempted = [0] * len(PRIORITY_NAMES)
+    self.rejected  = [0] * len(PRIORITY_NAMES)
+    self.latency   = [QikStatistics.Histogram() for name in PRIORITY_NAMES]
+
+  #------------------------------------------------------------------------------#
+  # submit: write a command once no command of a higher priority is waiting,     #
+  #         blocks the caller until the command is written or preempted. A       #
+  #         safety command latches the safety stop, whilst latched forward       #
+  #         commands are rejected and a backward command clears the latch.       #
+  #         The last command rejected is written by clearSafetyStop              #
+  #                                                                              #
+  # Parameters: priority: PRIORITY_SAFETY, PRIORITY_ROVING or PRIORITY_MANUAL    #
+  #             write:    function writing the command to the controller         #
+  #             motion:   1 moves the robot forwards, -1 backwards, see motion   #
+  #                                                                              #
+  # returnvalues: True when written, False when preempted or rejected            #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Safety stop latch                                     #
+  # 1.02    hta 18.10.2026 Keep the last command rejected                        #
+  #------------------------------------------------------------------------------#
+  def submit(self, priority, write, motion=0):
+    start = QikStatistics.clock()
+    with self.condition:
+      sequence = next(self.sequence)
+      self.requested[priority] += 1
+      if priority == PRIORITY_SAFETY:
+        self.latched = True
+      elif self.latched and motion > 0:
+        #would drive on into the obstacle
+        self.rejected[priority] += 1
+        self.deferred = (priority, write, motion)
+        return False
+      else:
+        #a newer command, the one rejected is out of date
+        self.deferred = None
+        if self.latched and motion < 0:
+          self.latched = False
+      #whatever lower priority commands are waiting is out of date now
+      for lower in range(priority + 1, len(PRIORITY_NAMES)):
+        self.preemptedBefore[lower] = sequence
+      heapq.heappush(self.waiting, (priority, sequence))
+      self.condition.notify_all()
+      while self.busy or self.waiting[0] != (priority, sequence):
+        if sequence < self.preemptedBefore[priority]:
+          break
+        self.condition.wait()
+      if sequence < self.preemptedBefore[priority]:
+        self.waiting.remove((priority, sequence))
+        heapq.heapify(self.waiting)
+        self.preempted[priority] += 1
+        self.condition.notify_all()
+        return False
+      heapq.heappop(self.waiting)
+      self.busy = True
+    try:
+      write()
+    finally:
+      with self.condition:
+        self.busy = False
+        self.written[priority] += 1
+        self.latency[priority].add(QikStatistics.clock() - start)
+        self.condition.notify_all()
+    return True
+
+  #------------------------------------------------------------------------------#
+  # setSpeeds: set the speed of both motors                                      #
+  #                                                                              #
+  # Parameters: m0Speed:  speed of motor 0, None leaves motor 0 as is            #
+  #             m1Speed:  speed of motor 1, None leaves motor 1 as is            #
+  #             priority: None for the priority the robot is in now              #
+  #                                                                              #
+  # returnvalues: True when written, False when preempted or rejected            #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Safety stop latch                                     #
+  # 1.02    hta 18.10.2026 Motors left as is                                     #
+  #------------------------------------------------------------------------------#
+  def setSpeeds(self, m0Speed, m1Speed, priority=None):
+    if priority is None:
+      priority = self.priority()
+    return self.submit(priority, lambda: self.controller.setSpeeds(m0Speed, m1Speed),
+                       motion(m0Speed, m1Speed))
+
+  #------------------------------------------------------------------------------#
+  # stopMotors: stop both motors                                                 #
+  #                                                                              #
+  # Parameters: priority: None for the priority the robot is in now              #
+  #                                                                              #
+  # returnvalues: True when written, False when preempted                        #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def stopMotors(self, priority=None):
+    if priority is None:
+      priority = self.priority()
+    return self.submit(priority, self.controller.stopMotors)
+
+  #------------------------------------------------------------------------------#
+  # safetyStop: stop both motors ahead of any other command, forward commands    #
+  #             are rejected until clearSafetyStop or a backward command         #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def safetyStop(self):
+    self.submit(PRIORITY_SAFETY, self.controller.stopMotors)
+
+  #------------------------------------------------------------------------------#
+  # clearSafetyStop: accept forward commands again, e.g. the obstacle is gone,   #
+  #                  and write the last command rejected whilst latched          #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Write the last command rejected                       #
+  #------------------------------------------------------------------------------#
+  def clearSafetyStop(self):
+    with self.condition:
+      self.latched = False
+      deferred, self.deferred = self.deferred, None
+    if deferred is not None:
+      self.submit(*deferred)
+
+  #------------------------------------------------------------------------------#
+  # getStatistics: commands requested, written, preempted and rejected and the   #
+  #                request to write latency per priority                         #
+  #                                                                              #
+  # returnvalues: dictionary with one entry per priority                         #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Rejected commands                                     #
+  #------------------------------------------------------------------------------#
+  def getStatistics(self):
+    with self.condition:
+      return dict((name, dict(requested=self.requested[priority],
+                              written=self.written[priority],
+                              preempted=self.preempted[priority],
+                              rejected=self.rejected[priority],
+                              latency=self.latency[priority].snapshot()))
+                  for priority, name in enumerate(PRIORITY_NAMES))
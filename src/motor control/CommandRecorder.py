@@ -0,0 +1,244 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module records the command stream sent to qik controllers to a binary
+file and replays recorded sessions, e.g. to reproduce an incident from the
+field against the emulator or to benchmark with a real command trace.
+
+A recording starts with a header (magic, version, wall clock time at the start
+of the recording) followed by fixed width records:
+
+  timestamp  double   seconds since the start of the recording, monotonic
+  device     byte     device ID, 0xFF for the compact protocol
+  length     byte     number of frame bytes used in this record, MSB set
+                      when the frame continues in the next record
+  frame      22 bytes frame bytes, zero padded
+
+Frames longer than 22 bytes are split over consecutive records.
+CommandRecorder.record only appends to a list, a background thread writes the
+records to the file so the control path never waits for the disk. When the
+list grows beyond maxPending records new records are dropped and counted
+rather than blocking the caller.
+
+To replay a recording against the emulator at ten times the recorded speed:
+
+  python3 CommandRecorder.py --port /tmp/qik --speed 10 session.rec
+"""
+
+import sys,os
+import time
+import struct
+import argparse
+import threading
+import logging, traceback
+import serial
+
+# clock used for the timestamps
+clock = getattr(time, 'monotonic', time.time)
+
+RECORDING_MAGIC   = b'QIKREC'
+RECORDING_VERSION = 1
+RECORDING_HEADER  = struct.Struct('<6sBd')
+RECORD            = struct.Struct('<dBB22s')
+# frame bytes held by one record
+RECORD_FRAME_SIZE = 22
+# device ID recorded for compact protocol frames
+COMPACT_DEVICE    = 0xFF
+# length bit marking a frame which continues in the next record
+RECORD_CONTINUED  = 0x80
+
+LOGGER = 'CommandRecorder'
+
+class CommandRecorder():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger', logging.getLogger(LOGGER))
+    #file the recording is written to
+    self.path = kwargs.get('path')
+    #seconds between writes to the file
+    self.flushInterval = float(kwargs.get('flushInterval', 0.5))
+    #records waiting to be written, beyond this new records are dropped
+    self.maxPending = int(kwargs.get('maxPending', 65536))
+    self.file = open(self.path, 'wb')
+    self.file.write(RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, time.time()))
+    self.started = clock()
+    #guards the pending records, shared with the writer thread
+    self.lock = threading.Lock()
+    self.pending = []
+    #record counters
+    self.recordsWritten = 0
+    self.recordsDropped = 0
+    self.stopped = threading.Event()
+    self.thread = threading.Thread(target=self.run)
+    self.thread.name = 'COMMAND RECORDER'
+    self.thread.daemon = True
+    self.thread.start()
+
+  #------------------------------------------------------------------------------#
+  # record: add a frame sent to a controller to the recording                    #
+  #                                                                              #
+  # Parameters: device: device ID, None for the compact protocol                 #
+  #             frame:  bytes sent                                               #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def record(self, device, frame):
+    timestamp = clock() - self.started
+    with self.lock:
+      if len(self.pending) >= self.maxPending:
+        self.recordsDropped += 1
+        return
+      self.pending.append((timestamp, COMPACT_DEVICE if device is None else device, bytes(frame)))
+
+  #------------------------------------------------------------------------------#
+  # writePending: encode the pending records and write them to the file          #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def writePending(self):
+    with self.lock:
+      pending, self.pending = self.pending, []
+    if not pending:
+      return
+    buffer = bytearray()
+    for timestamp, device, frame in pending:
+      for offset in range(0, len(frame), RECORD_FRAME_SIZE):
+        chunk = frame[offset:offset + RECORD_FRAME_SIZE]
+        length = len(chunk)
+        if offset + RECORD_FRAME_SIZE < len(frame):
+          length |= RECORD_CONTINUED
+        buffer.extend(RECORD.pack(timestamp, device, length, chunk))
+        self.recordsWritten += 1
+    self.file.write(buffer)
+    self.file.flush()
+
+  #------------------------------------------------------------------------------#
+  # run: writer thread, writes the pending records every flushInterval seconds   #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def run(self):
+    while not self.stopped.wait(self.flushInterval):
+      try:
+        self.writePending()
+      except Exception:
+        self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
+
+  #------------------------------------------------------------------------------#
+  # close: write whatever is still pending and close the file                    #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def close(self):
+    self.stopped.set()
+    self.thread.join()
+    self.writePending()
+    self.file.close()
+    if self.recordsDropped:
+      self.logger.warning('[' + str(self.recordsDropped) + '] records dropped')
+
+#------------------------------------------------------------------------------#
+# readRecording: read a recording, frames split over several records are       #
+#                joined again                                                  #
+#                                                                              #
+# Parameters: path: recording file                                             #
+#                                                                              #
+# returnvalues: generator of (timestamp, device ID or None, frame) tuples      #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+def readRecording(path):
+  with open(path, 'rb') as recording:
+    magic, version, started = RECORDING_HEADER.unpack(recording.read(RECORDING_HEADER.size))
+    if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+      raise ValueError('[' + path + '] is not a command recording')
+    frame = bytearray()
+    while True:
+      data = recording.read(RECORD.size)
+      if len(data) < RECORD.size:
+        break
+      timestamp, device, length, chunk = RECORD.unpack(data)
+      frame.extend(chunk[:length & ~RECORD_CONTINUED])
+      if length & RECORD_CONTINUED:
+        continue
+      yield timestamp, None if device == COMPACT_DEVICE else device, bytes(frame)
+      frame = bytearray()
+
+#------------------------------------------------------------------------------#
+# replay: write recorded frames with the recorded timing                       #
+#                                                                              #
+# Parameters: records: (timestamp, device, frame) tuples as from readRecording #
+#             write:   function writing a frame e.g. serial.Serial.write       #
+#             speed:   1.0 replays in real time, 10.0 ten times faster,        #
+#                      0 as fast as possible                                   #
+#                                                                              #
+# returnvalues: (frames written, bytes written, seconds taken)                 #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+def replay(records, write, speed=1.0):
+  frames = 0
+  byteCount = 0
+  start = clock()
+  for timestamp, device, frame in records:
+    if speed > 0:
+      delay = timestamp / speed - (clock() - start)
+      if delay > 0:
+        time.sleep(delay)
+    write(frame)
+    frames += 1
+    byteCount += len(frame)
+  return frames, byteCount, clock() - start
+
+def main():
+  parser = argparse.ArgumentParser(description='replay a recorded qik command stream')
+  parser.add_argument('recording', help='recording file')
+  parser.add_argument('--port', default='/tmp/qik', help='serial port to replay to e.g. the emulator')
+  parser.add_argument('--baud', type=int, default=38400, help='baud rate')
+  parser.add_argument('--speed', type=float, default=1.0, help='replay speed, 0 for as fast as possible')
+  parser.add_argument('--device', type=int, help='only replay frames for this device ID')
+  args = parser.parse_args()
+  logging.basicConfig(level=logging.INFO)
+  records = readRecording(args.recording)
+  if args.device is not None:
+    records = (record for record in records if record[1] == args.device)
+  ser = serial.Serial(args.port, args.baud)
+  try:
+    frames, byteCount, seconds = replay(records, ser.write, args.speed)
+  finally:
+    ser.close()
+  print('replayed [{}] frames [{}] bytes in [{:.3f}s]'.format(frames, byteCount, seconds))
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
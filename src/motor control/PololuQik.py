@@ -32,8 +32,13 @@ import sys,os
 import logging,traceback
 import serial
 import time
+import threading
 sys.path.append(os.path.join("..","configuration"))
 import Configuration
+import SerialWriter
+import ReplyReader
+import QikStatistics
+import CommandRecorder
 
 
 # Commands
@@ -62,28 +67,289 @@ QIK_CONFIG_DEVICE_ID                       =  0
 QIK_CONFIG_PWM_PARAMETER                   =  1
 QIK_CONFIG_SHUT_DOWN_MOTORS_ON_ERROR       =  2
 QIK_CONFIG_SERIAL_TIMEOUT                  =  3
+QIK_CONFIG_PARAMETERS                      = (QIK_CONFIG_DEVICE_ID, QIK_CONFIG_PWM_PARAMETER,
+                                              QIK_CONFIG_SHUT_DOWN_MOTORS_ON_ERROR, QIK_CONFIG_SERIAL_TIMEOUT)
+
+# PWM parameter bit selecting 8-bit speed resolution
+QIK_PWM_8_BIT                              =  0x01
+
+# Error byte bits
+QIK_ERROR_DATA_OVERRUN           = 0x08
+QIK_ERROR_FRAME                  = 0x10
+QIK_ERROR_CRC                    = 0x20
+QIK_ERROR_FORMAT                 = 0x40
+QIK_ERROR_TIMEOUT                = 0x80
+
+# CRC-7 polynomial x^7 + x^3 + 1, bit reversed as bytes are processed lsb first
+QIK_CRC7_POLYNOMIAL              = 0x91
+
+# Pololu protocol, start byte preceding device ID and command
+QIK_POLOLU_PROTOCOL_START_BYTE   = 0xAA
+# Device ID of a qik controller as shipped
+QIK_DEFAULT_DEVICE_ID            = 0x09
+
+# Protocols
+QIK_PROTOCOL_COMPACT             = 'compact'
+QIK_PROTOCOL_POLOLU              = 'pololu'
 
 # name of logger
 LOGGER = 'PololuQik'
 
+# raised by the query commands when the controller does not reply in time
+QikTimeoutError = ReplyReader.QikTimeoutError
+
+#------------------------------------------------------------------------------#
+# buildCrc7Table: compute the CRC-7 of every possible byte value. As the       #
+#                 CRC register never exceeds 8 bits the CRC of a message is    #
+#                 obtained one table lookup per byte: crc=table[crc ^ byte]    #
+#                                                                              #
+# returnvalues: tuple with 256 CRC values                                      #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+def buildCrc7Table():
+  table = []
+  for value in range(256):
+    crc = value
+    for bit in range(8):
+      if crc & 1:
+        crc ^= QIK_CRC7_POLYNOMIAL
+      crc >>= 1
+    table.append(crc)
+  return tuple(table)
+
+CRC7_TABLE = buildCrc7Table()
+
+#------------------------------------------------------------------------------#
+# crc7: compute the CRC-7 the qik controller expects after a command when CRC  #
+#       error detection is enabled (CRC jumper)                                #
+#                                                                              #
+# Parameters: message: command bytes                                           #
+#                                                                              #
+# returnvalues: CRC byte                                                       #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+def crc7(message):
+  crc = 0
+  for byte in message:
+    crc = CRC7_TABLE[crc ^ byte]
+  return crc
+
+#------------------------------------------------------------------------------#
+# buildFrame: build the bytes for a command. The compact protocol sends the    #
+#             command byte followed by its data bytes, the Pololu protocol     #
+#             addresses a device on a shared serial line by sending 0xAA, the  #
+#             device ID and the command byte with its MSB cleared instead.     #
+#                                                                              #
+# Parameters: command:  command byte e.g. QIK_GET_ERROR_BYTE                   #
+#             data:     data bytes following the command                       #
+#             deviceId: None for the compact protocol, the device ID (0..127)  #
+#                       for the Pololu protocol                                #
+#             crc:      True to append the CRC-7 of the frame                  #
+#                                                                              #
+# returnvalues: bytes to be written to the qik controller                      #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+# 1.01    hta 18.10.2026 CRC-7                                                 #
+#------------------------------------------------------------------------------#
+def buildFrame(command, data=(), deviceId=None, crc=False):
+  if deviceId is None:
+    frame = bytearray([command])
+  else:
+    frame = bytearray([QIK_POLOLU_PROTOCOL_START_BYTE, deviceId, command & 0x7F])
+  frame.extend(data)
+  if crc:
+    frame.append(crc7(frame))
+  return bytes(frame)
+
+#------------------------------------------------------------------------------#
+# encodeSpeedCommand: encode the command setting the speed of a motor. Used    #
+#                     to precompute the speed frames of a PololuQik object,    #
+#                     positive speeds for forward motion, negative speeds for  #
+#                     reverse. As always motor 0 is driven mirrored.           #
+#                                                                              #
+# Parameters: motor:    0 or 1                                                 #
+#             speed:    -255..255                                              #
+#             deviceId: None for the compact protocol, the device ID for the   #
+#                       Pololu protocol                                        #
+#             crc:      True to append the CRC-7 of the frame                  #
+#                                                                              #
+# returnvalues: bytes to be written to the qik controller                      #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version, taken from setM0Speed/setM1Speed     #
+# 1.01    hta 18.10.2026 Pololu protocol                                       #
+# 1.02    hta 18.10.2026 CRC-7                                                 #
+#------------------------------------------------------------------------------#
+def encodeSpeedCommand(motor, speed, deviceId=None, crc=False):
+  if motor == 0:
+    forward, forward8Bit = QIK_MOTOR_M0_REVERSE, QIK_MOTOR_M0_REVERSE_8_BIT
+    reverse, reverse8Bit = QIK_MOTOR_M0_FORWARD, QIK_MOTOR_M0_FORWARD_8_BIT
+  else:
+    forward, forward8Bit = QIK_MOTOR_M1_FORWARD, QIK_MOTOR_M1_FORWARD_8_BIT
+    reverse, reverse8Bit = QIK_MOTOR_M1_REVERSE, QIK_MOTOR_M1_REVERSE_8_BIT
+  if speed < 0 :
+    speed = -1 * speed # make speed a positive number
+    command, command8Bit = reverse, reverse8Bit
+  else:
+    command, command8Bit = forward, forward8Bit
+  if speed > 255 :
+    speed = 255
+  if speed > 127 :
+    # 8-bit mode: actual speed is (speed + 128)
+    return buildFrame(command8Bit, [speed - 128], deviceId, crc)
+  return buildFrame(command, [speed], deviceId, crc)
+
+#------------------------------------------------------------------------------#
+# PololuQik: a single qik 2s9v1 controller, addressed with either the compact  #
+#            or the Pololu protocol                                            #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 12.05.2014 Initial version                                       #
+# 1.01    hta 18.10.2026 Pololu protocol, shared serial port and writer        #
+# 1.02    hta 18.10.2026 CRC-7 mode                                            #
+# 1.03    hta 18.10.2026 Statistics                                            #
+# 1.04    hta 18.10.2026 Reply reader, query timeouts                          #
+# 1.05    hta 18.10.2026 Local copy of configuration parameters                #
+# 1.06    hta 18.10.2026 Readiness probe in place of a fixed sleep             #
+# 1.07    hta 18.10.2026 Command recording                                     #
+# 1.08    hta 18.10.2026 Resynchronise when configuration parameters time out  #
+# 1.09    hta 18.10.2026 Queued commands recorded by the writer once written   #
+#------------------------------------------------------------------------------#
 class PololuQik():
  
   def __init__(self,**kwargs):
     #set logger
     self.logger=kwargs.get('logger',)
-    #assigne serialport  
-    serialPort=kwargs.get('serialPort')
-    baudRate  =int(kwargs.get('baudRate', 38400))
-    self.logger.debug('using serial port['+serialPort+'] baudRate['+str(baudRate)+']')    
-    self.ser = serial.Serial(serialPort, baudRate)
-    # wait for connection to intialize
-    time.sleep(1)
-    # not interested in whatever is in the input buffer
-    self.ser.flushInput()    
-    # create empty byte array for qik commands
-    self.write_bytes = bytearray()
-    # let device detect baud rate and start normal oparation
-    self.autoDetectBaudRate()
+    #compact protocol talks to a single controller, the pololu
+    #protocol addresses the controller by its device ID
+    self.protocol=kwargs.get('protocol', QIK_PROTOCOL_COMPACT)
+    self.deviceId=None
+    if self.protocol == QIK_PROTOCOL_POLOLU:
+      self.deviceId=int(kwargs.get('deviceId', QIK_DEFAULT_DEVICE_ID))
+    #with the CRC jumper in place every command must end with its CRC-7
+    self.crc=bool(kwargs.get('crc', False))
+    #number of CRC errors the controller reported through its error byte
+    self.crcErrors=0
+    #a serial port may be shared by several controllers, in which case
+    #it is opened and its baud rate detected by whoever passes it in
+    self.ser = kwargs.get('ser')
+    self.ownPort = self.ser is None
+    if self.ownPort:
+      #assigne serialport  
+      serialPort=kwargs.get('serialPort')
+      baudRate  =int(kwargs.get('baudRate', 38400))
+      self.logger.debug('using serial port['+serialPort+'] baudRate['+str(baudRate)+']')    
+      self.ser = serial.Serial(serialPort, baudRate)
+      # not interested in whatever is in the input buffer
+      self.ser.flushInput()    
+    # encode every command frame we will ever need for our device ID
+    self.buildFrames()
+    # serializes writes to the serial port and access to the motor command cache
+    self.lock = threading.Lock()
+    # last byte sequence written to each motor, used to suppress redundant writes
+    self.lastM0Bytes = None
+    self.lastM1Bytes = None
+    # redundant writes are only suppressed when asked for, the controller stops
+    # the motors by itself on a serial error or serial timeout and only the
+    # health monitor notices, see resetCommandCache
+    self.suppressRepeats = bool(kwargs.get('suppressRepeats', False))
+    # time of the last motor command written, and seconds after which a repeat
+    # is written anyway to keep the serial timeout from stopping the motors,
+    # None when the serial timeout is disabled or unknown (disabled by default)
+    self.lastMotorWrite = 0.0
+    self.keepAlive = None
+    # seconds a query waits for its reply before raising QikTimeoutError
+    self.replyTimeout = float(kwargs.get('replyTimeout', 0.5))
+    # matches replies to queries, shared with all controllers on the serial port
+    self.replyReader = kwargs.get('replyReader')
+    if self.replyReader is None:
+      self.replyReader = ReplyReader.ReplyReader(logger=self.logger, ser=self.ser)
+    # optional latency and throughput statistics, None when disabled
+    self.statistics = kwargs.get('statistics')
+    if self.statistics is None and kwargs.get('collectStatistics', False):
+      self.statistics = QikStatistics.QikStatistics()
+    # optionally every command sent is recorded, a recorder passed in
+    # (e.g. by PololuQikChain) is shared with other controllers
+    self.recorder = kwargs.get('recorder')
+    self.ownRecorder = False
+    if self.recorder is None and kwargs.get('recordFile'):
+      self.recorder = CommandRecorder.CommandRecorder(logger=self.logger, path=kwargs.get('recordFile'))
+      self.ownRecorder = True
+    # optionally a dedicated thread writes to the serial port, callers only queue.
+    # A writer passed in (e.g. by PololuQikChain) is shared with other controllers,
+    # a writer records the commands once they are written
+    self.writer = kwargs.get('writer')
+    if self.writer is None and kwargs.get('asyncWrite', False):
+      self.writer = SerialWriter.SerialWriter(logger=self.logger, ser=self.ser,
+                                              writeQueueSize=kwargs.get('writeQueueSize', 32),
+                                              statistics=self.statistics, recorder=self.recorder)
+    # keys under which motor commands are coalesced by the writer
+    self.m0Key = (self.deviceId, 'M0')
+    self.m1Key = (self.deviceId, 'M1')
+    # seconds we wait for the controller to answer at startup, and how long
+    # each attempt waits before autodetect is sent again
+    self.startupTimeout = float(kwargs.get('startupTimeout', 2.0))
+    self.probeInterval  = float(kwargs.get('probeInterval', 0.05))
+    # seconds it took the controller to answer, None when we did not wait
+    self.startupTime = None
+    if self.ownPort:
+      # let device detect baud rate and start normal oparation
+      self.autoDetectBaudRate()
+    if self.ownPort or kwargs.get('waitUntilReady', False):
+      # autodetect has been sent, wait for the controller to answer
+      self.startupTime = self.waitUntilReady()
+    # local copy of the configuration parameters, filled with a single read
+    self.configuration = {}
+    # highest speed the configured PWM mode supports, 255 as long as it is unknown
+    self.maxSpeed = 255
+    try:
+      self.loadConfigurationParameters()
+    except QikTimeoutError:
+      self.logger.warning('could not read configuration parameters, controller did not reply')
+      # the replies may still be on their way, get back in step before the next query
+      self.replyReader.resync()
+
+  #------------------------------------------------------------------------------#
+  # buildFrames: encode all motor command frames for our protocol and device ID  #
+  #              every possible speed command for each motor is encoded once,    #
+  #              indexed by speed+255                                            #
+  #                                                                              #
+  # Parameters: None                                                             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Stop frame for both motors                            #
+  #------------------------------------------------------------------------------#
+  def buildFrames(self):
+    self.m0SpeedFrames = tuple(encodeSpeedCommand(0, speed, self.deviceId, self.crc) for speed in range(-255, 256))
+    self.m1SpeedFrames = tuple(encodeSpeedCommand(1, speed, self.deviceId, self.crc) for speed in range(-255, 256))
+    self.m0CoastFrame  = self.frame(QIK_2S9V1_MOTOR_M0_COAST)
+    self.m1CoastFrame  = self.frame(QIK_2S9V1_MOTOR_M1_COAST)
+    self.m0StopFrame   = self.m0SpeedFrames[255] + self.m0CoastFrame
+    self.m1StopFrame   = self.m1SpeedFrames[255] + self.m1CoastFrame
+    #both motors stopped with a single write, for the reflex stop
+    self.stopFrame     = self.m0StopFrame + self.m1StopFrame
+
+  #------------------------------------------------------------------------------#
+  # frame: build the bytes of a command for our protocol, device ID and CRC mode #
+  #                                                                              #
+  # Parameters: command: command byte                                            #
+  #             data:    data bytes following the command byte                   #
+  #                                                                              #
+  # returnvalues: bytes to be written to the qik controller                      #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def frame(self, command, *data):
+    return buildFrame(command, data, self.deviceId, self.crc)
   
   #------------------------------------------------------------------------------#
   # autoDetectBaudRate: triggers the qik controller to detect baud rate and enter#
@@ -94,15 +360,53 @@ class PololuQik():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 12.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 No shared write buffer, write and read under lock     #
   #------------------------------------------------------------------------------#  
   def autoDetectBaudRate(self):
-    #clear byte array
-    del self.write_bytes[:]
-    #set command byte
-    self.write_bytes.append(QIK_AUTODETECT_BAUD_RATE)
-    # Write the byte to the serial port
-    self.ser.write(self.write_bytes)
+    # Write the command byte to the serial port
+    with self.lock:
+      self.writeFrame(bytes([QIK_AUTODETECT_BAUD_RATE]), 'autoDetectBaudRate')
+    # controller state is unknown, next motor commands must be sent
+    self.resetCommandCache()
     
+  #------------------------------------------------------------------------------#
+  # waitUntilReady: probe the controller with the get firmware version command   #
+  #                 until it answers. Autodetect must have been sent already,    #
+  #                 it is sent again when an attempt gets no reply as the        #
+  #                 controller may not have been listening yet.                  #
+  #                                                                              #
+  # Parameters: None, uses startupTimeout and probeInterval                      #
+  #                                                                              #
+  # returnvalues: seconds until the controller answered, raises QikTimeoutError  #
+  #               when it does not answer within startupTimeout                  #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def waitUntilReady(self):
+    start = ReplyReader.clock()
+    attempts = 0
+    while True:
+      attempts += 1
+      try:
+        self.query(self.frame(QIK_GET_FIRMWARE_VERSION), name='waitUntilReady', timeout=self.probeInterval)
+        break
+      except QikTimeoutError:
+        # the controller did not hear the probe, it will not answer it late
+        self.replyReader.discardPending()
+        if ReplyReader.clock() - start >= self.startupTimeout:
+          raise QikTimeoutError('waitUntilReady', self.startupTimeout, b'')
+        self.autoDetectBaudRate()
+    seconds = ReplyReader.clock() - start
+    if attempts > 1:
+      # let late replies to earlier probes arrive, nobody waits for them any more
+      time.sleep(self.probeInterval)
+      # an autodetect byte sent after the baud rate was detected is taken for
+      # a malformed command, reading the error byte clears the format error
+      self.getErrorByte()
+    self.logger.debug('controller ready after [' + '{:.3f}'.format(seconds) + 's] attempts[' + str(attempts) + ']')
+    return seconds
+
   #------------------------------------------------------------------------------#
   # getFirmwareVersion: retrieve firmware version from qik controller            #
   #                                                                              #
@@ -110,19 +414,17 @@ class PololuQik():
   #                                                                              #
   # returnvalues: returnInt  Interger value of firmware version                  #
   #               returnChar String represnting value of firmware version        #
+  #               raises QikTimeoutError when the controller does not reply      #
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 12.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 No shared write buffer, write and read under lock     #
+  # 1.02    hta 18.10.2026 Write and read through query                          #
+  # 1.03    hta 18.10.2026 Pololu protocol                                       #
   #------------------------------------------------------------------------------#      
   def getFirmwareVersion(self):
-    #clear byte array
-    del self.write_bytes[:]
-    #set command byte
-    self.write_bytes.append(QIK_GET_FIRMWARE_VERSION)
-    # Write the byte to the serial port
-    self.ser.write(self.write_bytes)
-    # Wait for response
-    response = self.ser.read()
+    # Write the command byte to the serial port and wait for response
+    response = self.query(self.frame(QIK_GET_FIRMWARE_VERSION), name='getFirmwareVersion')
     try:
       returnInt  = ord(response)
       returnChar = response.decode('ascii').strip()
@@ -145,22 +447,27 @@ class PololuQik():
   #                 bit 5:       CRC Error                                       #
   #                 bit 6:       Format Error                                    #
   #                 bit 7:       Timeout                                         #
+  #               raises QikTimeoutError when the controller does not reply      #
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 12.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 No shared write buffer, write and read under lock     #
+  # 1.02    hta 18.10.2026 Write and read through query                          #
+  # 1.03    hta 18.10.2026 Pololu protocol                                       #
+  # 1.04    hta 18.10.2026 Count CRC errors                                      #
+  # 1.05    hta 18.10.2026 Reset the command cache on error                      #
   #------------------------------------------------------------------------------#        
   def getErrorByte(self):
-    #clear byte array
-    del self.write_bytes[:]
-    #set command byte
-    self.write_bytes.append(QIK_GET_ERROR_BYTE)
-    # Write the byte to the serial port
-    self.ser.write(self.write_bytes)
-    # Wait for response
-    response = self.ser.read(1)
+    # Write the command byte to the serial port and wait for response
+    response = self.query(self.frame(QIK_GET_ERROR_BYTE), name='getErrorByte')
     try:
       returnInt  = ord(response)
       self.logger.debug('error byte[' +'{:08b}'.format(returnInt) + ']')
+      if returnInt & QIK_ERROR_CRC:
+        self.crcErrors += 1
+      if returnInt:
+        # the controller may have stopped the motors (shut down motors on error)
+        self.resetCommandCache()
       return returnInt
     except Exception:
       self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
@@ -172,27 +479,30 @@ class PololuQik():
   #                    1 PWM Parameter (default 0)                               #
   #                    2 Shutdown motors on error (default 1)                    #
   #                    3 Serial Timeout (default 0)                              #
+  #             refresh: True to read the value from the controller even when    #
+  #                      it is known locally                                     #
   #                                                                              #
   # returnvalues: returnInt:  Integer value representing parameter value         #
   #               returnChar: ASCII character representing parameter value       #
+  #               raises QikTimeoutError when the controller does not reply      #
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 12.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 No shared write buffer, write and read under lock     #
+  # 1.02    hta 18.10.2026 Write and read through query                          #
+  # 1.03    hta 18.10.2026 Pololu protocol                                       #
+  # 1.04    hta 18.10.2026 Answer from local copy of configuration parameters    #
   #------------------------------------------------------------------------------#  
-  def getConfigurationParameter(self, param):
-    #clear byte array
-    del self.write_bytes[:]
-    #set command byte
-    self.write_bytes.append(QIK_GET_CONFIGURATION_PARAMETER)
-    #select parameter value to retrieve
-    self.write_bytes.append(param)
-    
-    # Write the bytes to the serial port
-    self.ser.write(self.write_bytes)
-    # Wait for response
-    response = self.ser.read(1)
+  def getConfigurationParameter(self, param, refresh=False):
+    if not refresh and param in self.configuration:
+      # answered from the local copy, no round trip to the controller
+      response = bytes([self.configuration[param]])
+    else:
+      # Write command byte and the parameter to retrieve, wait for response
+      response = self.query(self.frame(QIK_GET_CONFIGURATION_PARAMETER, param), name='getConfigurationParameter')
     try:
       returnInt  = ord(response)
+      self.cacheConfigurationParameter(param, returnInt)
       returnChar = response.decode('ascii').strip()
       self.logger.debug('requested parameter[' + str(param) + '] response value[' + str(returnInt) + '], ascii character[' + returnChar + ']')
       return returnInt,returnChar
@@ -211,34 +521,296 @@ class PololuQik():
   # returnvalues: returnInt:  0: Command OK (success)                            #
   #                           1: Bad Parameter (invalid parameter number)        #
   #                           2: Bad Value (invalid value for parameter)         #
+  #               raises QikTimeoutError when the controller does not reply      #
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 12.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 No shared write buffer, write and read under lock     #
+  # 1.02    hta 18.10.2026 Write and read through query                          #
+  # 1.03    hta 18.10.2026 Pololu protocol                                       #
+  # 1.04    hta 18.10.2026 Update local copy of configuration parameters         #
   #------------------------------------------------------------------------------#      
   def setConfigurationParameter(self, param, value):
-    #clear byte array
-    del self.write_bytes[:]
-    #set command byte
-    self.write_bytes.append(QIK_SET_CONFIGURATION_PARAMETER)
-    #select parameter to set
-    self.write_bytes.append(param)
-    #the desired parameter value
-    self.write_bytes.append(value)
-    #terminate set configuration sequence
-    self.write_bytes.append(0x55)    
-    self.write_bytes.append(0x2A)    
-    # Write the bytes to the serial port
-    self.ser.write(self.write_bytes)
-    # Wait for response
-    response = self.ser.read(1)
+    # Write command byte, parameter, desired value and the two bytes
+    # terminating the set configuration sequence, wait for response
+    response = self.query(self.frame(QIK_SET_CONFIGURATION_PARAMETER, param, value, 0x55, 0x2A),
+                          name='setConfigurationParameter')
+    # e.g. the PWM parameter changes the meaning of the motor commands
+    # so we can no longer rely on what we have sent before
+    self.resetCommandCache()
     try:
       returnInt  = ord(response)
+      if returnInt == 0:
+        self.cacheConfigurationParameter(param, value)
+      else:
+        # rejected, ask the controller next time
+        self.cacheConfigurationParameter(param, None)
       returnChar = response.decode('ascii').strip()
       self.logger.debug('requested parameter[' + str(param) + '] / value[' + str(value) + '], response[' + str(returnInt) + ']')
       return returnInt,returnChar
     except Exception:
       self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')      
 
+  #------------------------------------------------------------------------------#
+  # loadConfigurationParameters: read all configuration parameters with a single #
+  #                              write and keep a local copy of them, after this #
+  #                              getConfigurationParameter needs no round trip   #
+  #                                                                              #
+  # Parameters: None                                                             #
+  #                                                                              #
+  # returnvalues: dictionary parameter: value                                    #
+  #               raises QikTimeoutError when the controller does not reply      #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def loadConfigurationParameters(self):
+    frame = b''.join(self.frame(QIK_GET_CONFIGURATION_PARAMETER, param) for param in QIK_CONFIG_PARAMETERS)
+    # the controller answers the four requests in order, one byte each
+    response = self.query(frame, replyLength=len(QIK_CONFIG_PARAMETERS), name='loadConfigurationParameters')
+    for param, value in zip(QIK_CONFIG_PARAMETERS, bytearray(response)):
+      self.cacheConfigurationParameter(param, value)
+    self.logger.debug('configuration parameters[' + str(self.configuration) + ']')
+    return dict(self.configuration)
+
+  #------------------------------------------------------------------------------#
+  # cacheConfigurationParameter: update the local copy of a configuration        #
+  #                              parameter, the PWM parameter determines the     #
+  #                              highest speed we can send, the serial timeout   #
+  #                              how long a repeat may be left out               #
+  #                                                                              #
+  # Parameters: param: parameter number                                          #
+  #             value: parameter value, None to forget the parameter             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Keep alive interval from the serial timeout           #
+  #------------------------------------------------------------------------------#
+  def cacheConfigurationParameter(self, param, value):
+    if value is None:
+      self.configuration.pop(param, None)
+    else:
+      self.configuration[param] = value
+    if param == QIK_CONFIG_PWM_PARAMETER:
+      if value is None or value & QIK_PWM_8_BIT:
+        self.maxSpeed = 255
+      else:
+        self.maxSpeed = 127
+    elif param == QIK_CONFIG_SERIAL_TIMEOUT:
+      if not value:
+        # no serial timeout, the motors keep going without repeats
+        self.keepAlive = None
+      else:
+        # 0.262s * (lower 4 bits) * 2^(upper 3 bits), repeat well before
+        self.keepAlive = 0.262 * (value & 0x0F) * (2 ** (value >> 4)) / 2
+
+  #------------------------------------------------------------------------------#
+  # writeFrame: write bytes to the serial port, in asynchronous mode the bytes   #
+  #             are queued for the writer thread which records the statistics    #
+  #             and the frame once they are written. Callers hold self.lock.     #
+  #                                                                              #
+  # Parameters: frame: bytes to be written                                       #
+  #             name:  command type the statistics are recorded under            #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Statistics                                            #
+  # 1.02    hta 18.10.2026 Recording                                             #
+  # 1.03    hta 18.10.2026 Statistics recorded where the bytes are written       #
+  # 1.04    hta 18.10.2026 Recorded where the bytes are written                  #
+  #------------------------------------------------------------------------------#
+  def writeFrame(self, frame, name='command'):
+    if self.writer is not None:
+      self.writer.submit(frame, name=name, device=self.deviceId)
+      return
+    if self.statistics is None:
+      self.ser.write(frame)
+    else:
+      start = QikStatistics.clock()
+      self.ser.write(frame)
+      self.statistics.recordWrite(name, len(frame), QikStatistics.clock() - start)
+    if self.recorder is not None:
+      self.recorder.record(self.deviceId, frame)
+
+  #------------------------------------------------------------------------------#
+  # query: write a command which the qik controller answers and wait for the     #
+  #        reply. Several queries may be outstanding at the same time, the reply #
+  #        reader matches replies to queries in order. Motor commands can still  #
+  #        be written whilst waiting for the reply.                              #
+  #                                                                              #
+  # Parameters: frame:       command bytes                                       #
+  #             replyLength: number of bytes in the reply                        #
+  #             name:        command type the statistics are recorded under      #
+  #             timeout:     seconds to wait for the reply, None for the default #
+  #                                                                              #
+  # returnvalues: reply as bytes, raises QikTimeoutError when the reply does not #
+  #               arrive in time, the command cache is reset when it does not    #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Statistics                                            #
+  # 1.02    hta 18.10.2026 Replies matched by the reply reader, with deadline    #
+  # 1.03    hta 18.10.2026 Reset the command cache on timeout                    #
+  #------------------------------------------------------------------------------#
+  def query(self, frame, replyLength=1, name='query', timeout=None):
+    if timeout is None:
+      timeout = self.replyTimeout
+    def write():
+      with self.lock:
+        self.writeFrame(frame, name)
+    request = self.replyReader.request(name, replyLength, timeout, write)
+    if self.statistics is None:
+      try:
+        return self.replyReader.wait(request)
+      except ReplyReader.QikTimeoutError:
+        # whatever went wrong may have stopped the motors as well
+        self.resetCommandCache()
+        raise
+    start = QikStatistics.clock()
+    try:
+      response = self.replyReader.wait(request)
+    except ReplyReader.QikTimeoutError:
+      self.statistics.recordReply(name, QikStatistics.clock() - start, True)
+      self.resetCommandCache()
+      raise
+    self.statistics.recordReply(name, QikStatistics.clock() - start)
+    return response
+
+  #------------------------------------------------------------------------------#
+  # getStatistics: return the latency and throughput statistics collected so far #
+  #                per command type, see QikStatistics                           #
+  #                                                                              #
+  # Parameters: None                                                             #
+  #                                                                              #
+  # returnvalues: dictionary with one entry per command type, None when the      #
+  #               collection of statistics is disabled                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getStatistics(self):
+    if self.statistics is None:
+      return None
+    return self.statistics.snapshot()
+
+  #------------------------------------------------------------------------------#
+  # close: stop the writer thread, if any, after it has written all queued       #
+  #        commands and close the serial port. A shared writer and serial port   #
+  #        are left to their owner.                                              #
+  #                                                                              #
+  # Parameters: None                                                             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Close recorder                                        #
+  #------------------------------------------------------------------------------#
+  def close(self):
+    if self.ownRecorder:
+      self.recorder.close()
+    if self.ownPort:
+      if self.writer is not None:
+        self.writer.close()
+      self.replyReader.close()
+      self.ser.close()
+
+  #------------------------------------------------------------------------------#
+  # resetCommandCache: forget the byte sequences last sent to the motors so that #
+  #                    the next motor commands are always written. Required when #
+  #                    the state of the qik controller is no longer known, e.g.  #
+  #                    after autodetect, a configuration change or a serial      #
+  #                    timeout which has stopped the motors.                     #
+  #                    The qik stops the motors by itself on a serial error or a #
+  #                    serial timeout without telling us, so redundant writes    #
+  #                    are only suppressed when suppressRepeats is set, which    #
+  #                    the health monitor does whilst it watches the error byte. #
+  #                    The cache is also reset whenever the error byte reports   #
+  #                    an error or a query times out, and a repeat is written    #
+  #                    anyway once half the configured serial timeout has passed #
+  #                                                                              #
+  # Parameters: None                                                             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def resetCommandCache(self):
+    with self.lock:
+      self.lastM0Bytes = None
+      self.lastM1Bytes = None
+
+  #------------------------------------------------------------------------------#
+  # writeMotorCommands: write the commands for motor 0 and/or motor 1 to the     #
+  #                     serial port with a single write. With suppressRepeats a  #
+  #                     motor's command is left out when it is identical to the  #
+  #                     last byte sequence sent to that motor, when nothing is   #
+  #                     left to send no write takes place at all.                #
+  #                                                                              #
+  # Parameters: m0Bytes: byte sequence for motor 0, None leaves motor 0 as is    #
+  #             m1Bytes: byte sequence for motor 1, None leaves motor 1 as is    #
+  #             urgent:  in asynchronous mode write ahead of queued commands and #
+  #                      discard queued commands for the same motors             #
+  #             name:    command type the statistics are recorded under, in      #
+  #                      asynchronous mode by the writer thread                  #
+  #                                                                              #
+  # returnvalues: number of bytes written                                        #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Asynchronous mode                                     #
+  # 1.02    hta 18.10.2026 Statistics                                            #
+  # 1.03    hta 18.10.2026 Recording                                             #
+  # 1.04    hta 18.10.2026 Suppress repeats only with suppressRepeats            #
+  # 1.05    hta 18.10.2026 Statistics per command type                           #
+  # 1.06    hta 18.10.2026 Recorded where the bytes are written                  #
+  #------------------------------------------------------------------------------#
+  def writeMotorCommands(self, m0Bytes=None, m1Bytes=None, urgent=False, name='setSpeeds'):
+    with self.lock:
+      now = ReplyReader.clock()
+      # repeats only while the controller is known to run what we sent last
+      suppress = self.suppressRepeats and \
+                 (self.keepAlive is None or now - self.lastMotorWrite < self.keepAlive)
+      frame = bytearray()
+      if m0Bytes is not None and not (suppress and m0Bytes == self.lastM0Bytes):
+        frame.extend(m0Bytes)
+      else:
+        m0Bytes = None
+      if m1Bytes is not None and not (suppress and m1Bytes == self.lastM1Bytes):
+        frame.extend(m1Bytes)
+      else:
+        m1Bytes = None
+      if not frame:
+        return 0
+      # Write the bytes to the serial port, or queue them per motor, the
+      # writer records them once written
+      if self.writer is not None:
+        if m0Bytes is not None:
+          self.writer.submit(m0Bytes, key=self.m0Key, urgent=urgent, name=name, device=self.deviceId)
+        if m1Bytes is not None:
+          self.writer.submit(m1Bytes, key=self.m1Key, urgent=urgent, name=name, device=self.deviceId)
+      else:
+        if self.statistics is None:
+          self.ser.write(frame)
+        else:
+          start = QikStatistics.clock()
+          self.ser.write(frame)
+          self.statistics.recordWrite(name, len(frame), QikStatistics.clock() - start)
+        if self.recorder is not None:
+          self.recorder.record(self.deviceId, frame)
+      # only remember what actually made it to the serial port
+      self.lastMotorWrite = now
+      if m0Bytes is not None:
+        self.lastM0Bytes = m0Bytes
+      if m1Bytes is not None:
+        self.lastM1Bytes = m1Bytes
+      return len(frame)
+
   #------------------------------------------------------------------------------#
   # setM0Coast: set Motor 0 to coast                                             #
   #                                                                              #
@@ -248,14 +820,12 @@ class PololuQik():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 12.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Write through writeMotorCommands                      #
+  # 1.02    hta 18.10.2026 Precomputed frames, Pololu protocol                   #
+  # 1.03    hta 18.10.2026 Statistics per command type                           #
   #------------------------------------------------------------------------------#
   def setM0Coast(self):
-    #clear byte array
-    del self.write_bytes[:]
-    #set command byte
-    self.write_bytes.append(QIK_2S9V1_MOTOR_M0_COAST)
-    # Write the byte to the serial port
-    self.ser.write(self.write_bytes)
+    self.writeMotorCommands(m0Bytes=self.m0CoastFrame, urgent=True, name='setM0Coast')
 
   #------------------------------------------------------------------------------#
   # setM1Coast: set Motor 1 to coast                                             #
@@ -266,14 +836,12 @@ class PololuQik():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 12.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Write through writeMotorCommands                      #
+  # 1.02    hta 18.10.2026 Precomputed frames, Pololu protocol                   #
+  # 1.03    hta 18.10.2026 Statistics per command type                           #
   #------------------------------------------------------------------------------#
   def setM1Coast(self):
-    #clear byte array
-    del self.write_bytes[:]
-    #set command byte
-    self.write_bytes.append(QIK_2S9V1_MOTOR_M1_COAST)
-    # Write the byte to the serial port
-    self.ser.write(self.write_bytes)
+    self.writeMotorCommands(m1Bytes=self.m1CoastFrame, urgent=True, name='setM1Coast')
 
   #------------------------------------------------------------------------------#
   # setCoast: set both motors to coast                                           #
@@ -284,10 +852,95 @@ class PololuQik():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 12.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Both coast commands in a single write                 #
+  # 1.02    hta 18.10.2026 Precomputed frames, Pololu protocol                   #
+  # 1.03    hta 18.10.2026 Statistics per command type                           #
   #------------------------------------------------------------------------------#
   def setCoast(self):
-    self.setM0Coast()
-    self.setM1Coast()
+    self.writeMotorCommands(m0Bytes=self.m0CoastFrame, m1Bytes=self.m1CoastFrame, urgent=True, name='setCoast')
+
+  #------------------------------------------------------------------------------#
+  # stopMotors: set speed of both motors to zero and then let them coast, all    #
+  #             four commands are sent with a single write                       #
+  #                                                                              #
+  # Parameters: None                                                             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Precomputed frames, Pololu protocol                   #
+  # 1.02    hta 18.10.2026 Statistics per command type                           #
+  #------------------------------------------------------------------------------#
+  def stopMotors(self):
+    self.writeMotorCommands(m0Bytes=self.m0StopFrame, m1Bytes=self.m1StopFrame, urgent=True, name='stopMotors')
+
+  #------------------------------------------------------------------------------#
+  # reflexStop: stop both motors as fast as possible, e.g. from a sensor         #
+  #             callback. The pre-encoded stop frame is written even when the    #
+  #             motors are thought to be stopped already, no statistics are      #
+  #             collected                                                        #
+  #                                                                              #
+  # Parameters: None                                                             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Keep alive time                                       #
+  # 1.02    hta 18.10.2026 Recorded by the writer once written                   #
+  #------------------------------------------------------------------------------#
+  def reflexStop(self):
+    with self.lock:
+      if self.writer is not None:
+        self.writer.submit(self.m0StopFrame, key=self.m0Key, urgent=True, device=self.deviceId)
+        self.writer.submit(self.m1StopFrame, key=self.m1Key, urgent=True, device=self.deviceId)
+      else:
+        self.ser.write(self.stopFrame)
+        #recorded once the frame is on its way
+        if self.recorder is not None:
+          self.recorder.record(self.deviceId, self.stopFrame)
+      self.lastM0Bytes = self.m0StopFrame
+      self.lastM1Bytes = self.m1StopFrame
+      self.lastMotorWrite = ReplyReader.clock()
+
+  #------------------------------------------------------------------------------#
+  # encodeM0Speed: return the command setting the speed for motor 0. Positive    #
+  #                speeds for forward motion, negative speeds for reverse        #
+  # Parameters: speed: -255..255 (when 8 bit mode configured)                    #
+  #                    -127..127 (when 7 bit mode configured)                    #
+  # returnvalues: bytes to be written to the qik controller                      #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version, taken from setM0Speed                #
+  # 1.01    hta 18.10.2026 Lookup in precomputed speed frames                    #
+  # 1.02    hta 18.10.2026 Limit to speeds the PWM mode supports                 #
+  #------------------------------------------------------------------------------#
+  def encodeM0Speed(self, speed):
+    if speed > self.maxSpeed :
+      speed = self.maxSpeed
+    elif speed < -self.maxSpeed :
+      speed = -self.maxSpeed
+    return self.m0SpeedFrames[int(speed) + 255]
+
+  #------------------------------------------------------------------------------#
+  # encodeM1Speed: return the command setting the speed for motor 1. Positive    #
+  #                speeds for forward motion, negative speeds for reverse        #
+  # Parameters: speed: -255..255 (when 8 bit mode configured)                    #
+  #                    -127..127 (when 7 bit mode configured)                    #
+  # returnvalues: bytes to be written to the qik controller                      #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version, taken from setM1Speed                #
+  # 1.01    hta 18.10.2026 Lookup in precomputed speed frames                    #
+  # 1.02    hta 18.10.2026 Limit to speeds the PWM mode supports                 #
+  #------------------------------------------------------------------------------#
+  def encodeM1Speed(self, speed):
+    if speed > self.maxSpeed :
+      speed = self.maxSpeed
+    elif speed < -self.maxSpeed :
+      speed = -self.maxSpeed
+    return self.m1SpeedFrames[int(speed) + 255]
 
   #------------------------------------------------------------------------------#
   # setM0Speed: set speed for motor 0. Use positive speeds for forward motion,   #
@@ -298,35 +951,11 @@ class PololuQik():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 12.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Write through writeMotorCommands                      #
+  # 1.02    hta 18.10.2026 Statistics per command type                           #
   #------------------------------------------------------------------------------#
   def setM0Speed(self, speed):
-    #clear byte array
-    del self.write_bytes[:]
-    #initialize reverse 
-    reverse = False
-    if speed < 0 :
-      speed = -1 * speed # make speed a positive number
-      reverse = True # preserve direction
-    
-    if speed > 255 :
-      speed = 255
-    
-    if speed > 127 : 
-      # 8-bit mode: actual speed is (speed + 128) 
-      if reverse :
-        self.write_bytes.append(QIK_MOTOR_M0_FORWARD_8_BIT)
-      else:
-        self.write_bytes.append(QIK_MOTOR_M0_REVERSE_8_BIT)
-      self.write_bytes.append(speed - 128)
-    else:
-      if reverse :
-        self.write_bytes.append(QIK_MOTOR_M0_FORWARD)
-      else:
-        self.write_bytes.append(QIK_MOTOR_M0_REVERSE)
-      self.write_bytes.append(speed)
-      
-    # Write the bytes to the serial port
-    self.ser.write(self.write_bytes)
+    self.writeMotorCommands(m0Bytes=self.encodeM0Speed(speed), name='setM0Speed')
 
   #------------------------------------------------------------------------------#
   # setM1Speed: set speed for motor 1. Use positive speeds for forward motion,   #
@@ -337,35 +966,35 @@ class PololuQik():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 12.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Write through writeMotorCommands                      #
+  # 1.02    hta 18.10.2026 Statistics per command type                           #
   #------------------------------------------------------------------------------#
   def setM1Speed(self, speed):
-    #clear byte array
-    del self.write_bytes[:]
-    #initialize reverse 
-    reverse = False
-    if speed < 0 :
-      speed = -1 * speed # make speed a positive number
-      reverse = True # preserve direction
-    
-    if speed > 255 :
-      speed = 255
-    
-    if speed > 127 : 
-      # 8-bit mode: actual speed is (speed + 128) 
-      if reverse :
-        self.write_bytes.append(QIK_MOTOR_M1_REVERSE_8_BIT)
-      else:
-        self.write_bytes.append(QIK_MOTOR_M1_FORWARD_8_BIT)
-      self.write_bytes.append(speed - 128)
+    self.writeMotorCommands(m1Bytes=self.encodeM1Speed(speed), name='setM1Speed')
+
+  #------------------------------------------------------------------------------#
+  # setSpeeds: set speed for motor 0 and motor 1 with a single write. Use        #
+  #            positive speeds for forward motion, negative speeds for reverse   #
+  # Parameters: m0Speed: -255..255 (when 8 bit mode configured)                  #
+  #                      -127..127 (when 7 bit mode configured)                  #
+  #                      None leaves motor 0 as is                               #
+  #             m1Speed: -255..255 (when 8 bit mode configured)                  #
+  #                      -127..127 (when 7 bit mode configured)                  #
+  #                      None leaves motor 1 as is                               #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 None leaves a motor as is                             #
+  #------------------------------------------------------------------------------#
+  def setSpeeds(self, m0Speed, m1Speed):
+    if m1Speed is None:
+      self.setM0Speed(m0Speed)
+    elif m0Speed is None:
+      self.setM1Speed(m1Speed)
     else:
-      if reverse :
-        self.write_bytes.append(QIK_MOTOR_M1_REVERSE)
-      else:
-        self.write_bytes.append(QIK_MOTOR_M1_FORWARD)
-      self.write_bytes.append(speed)
-      
-    # Write the bytes to the serial port
-    self.ser.write(self.write_bytes)  
+      self.writeMotorCommands(m0Bytes=self.encodeM0Speed(m0Speed),
+                              m1Bytes=self.encodeM1Speed(m1Speed))
 
   #------------------------------------------------------------------------------#
   # setSpeed: set speed for both motors. Use positive speeds for forward motion, #
@@ -376,10 +1005,10 @@ class PololuQik():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 12.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Both speed commands in a single write                 #
   #------------------------------------------------------------------------------#
   def setSpeed(self, speed) :
-    self.setM0Speed(speed)
-    self.setM1Speed(speed)
-      
+    self.setSpeeds(speed, speed)
+
+
 
-  
@@ -0,0 +1,188 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the PololuQikChain class. Several qik controllers can
+be daisy chained on a single serial line when they are addressed with the
+Pololu protocol (0xAA, device ID, command). The chain owns the serial port,
+creates one PololuQik object per device ID and collects the motor commands of
+all of them during a control tick, flush() then writes them with one write.
+
+Urgent commands (stop, coast) and queries are not held back until the next
+tick, they are written straight away together with whatever has been collected
+so far.
+
+  chain = PololuQikChain(logger=logger, serialPort='/dev/ttyAMA0', deviceIds=[9,10])
+  chain[9].setSpeeds(30, 30)
+  chain[10].setSpeeds(-30, 30)
+  chain.flush()
+"""
+
+import threading
+import collections
+import logging
+import serial
+import PololuQik
+import SerialWriter
+import ReplyReader
+import CommandRecorder
+
+class PololuQikChain():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger',)
+    serialPort  = kwargs.get('serialPort')
+    baudRate    = int(kwargs.get('baudRate', 38400))
+    deviceIds   = [int(deviceId) for deviceId in kwargs.get('deviceIds', [PololuQik.QIK_DEFAULT_DEVICE_ID])]
+    crc         = kwargs.get('crc', False)
+    self.logger.debug('using serial port['+serialPort+'] baudRate['+str(baudRate)+'] deviceIds['+str(deviceIds)+']')
+    self.ser = serial.Serial(serialPort, baudRate)
+    # not interested in whatever is in the input buffer
+    self.ser.flushInput()
+    #guards the commands collected during the current tick
+    self.lock = threading.Lock()
+    #(device ID, frame) collected during the current tick, latest command per
+    #key wins
+    self.pending = collections.OrderedDict()
+    #optionally the collected commands are written by a dedicated thread
+    self.serialWriter = None
+    if kwargs.get('asyncWrite', False):
+      self.serialWriter = SerialWriter.SerialWriter(logger=self.logger, ser=self.ser,
+                                                    writeQueueSize=kwargs.get('writeQueueSize', 32))
+    #optionally the commands of all devices are recorded to one file, as they
+    #leave the tick
+    self.recorder = None
+    if kwargs.get('recordFile'):
+      self.recorder = CommandRecorder.CommandRecorder(logger=self.logger, path=kwargs.get('recordFile'))
+    #replies of all devices on the line are read by one reader
+    self.replyReader = ReplyReader.ReplyReader(logger=self.logger, ser=self.ser)
+    # let all devices on the line detect the baud rate
+    self.write(bytes([PololuQik.QIK_AUTODETECT_BAUD_RATE]))
+    if self.recorder is not None:
+      self.recorder.record(None, bytes([PololuQik.QIK_AUTODETECT_BAUD_RATE]))
+    #one controller per device, all of them submit their commands to us
+    self.controllers = collections.OrderedDict()
+    for deviceId in deviceIds:
+      self.controllers[deviceId] = PololuQik.PololuQik(logger=self.logger, ser=self.ser,
+                                                       protocol=PololuQik.QIK_PROTOCOL_POLOLU,
+                                                       deviceId=deviceId, crc=crc, writer=self,
+                                                       replyReader=self.replyReader,
+                                                       replyTimeout=kwargs.get('replyTimeout', 0.5),
+                                                       recorder=self.recorder, waitUntilReady=True,
+                                                       startupTimeout=kwargs.get('startupTimeout', 2.0))
+
+  #------------------------------------------------------------------------------#
+  # __getitem__: return the PololuQik object for a device ID                     #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def __getitem__(self, deviceId):
+    return self.controllers[deviceId]
+
+  #------------------------------------------------------------------------------#
+  # submit: called by the PololuQik objects of the chain in place of writing to  #
+  #         the serial port. Motor commands are collected until the next flush,  #
+  #         urgent commands and queries are written immediately                  #
+  #                                                                              #
+  # Parameters: frame:  bytes to write                                           #
+  #             key:    (device ID, motor), None for commands which must not be  #
+  #                     held back e.g. queries                                   #
+  #             urgent: True to write immediately                                #
+  #             name:   command type, the chain keeps no statistics              #
+  #             device: device ID the frame is recorded under                    #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Command type                                          #
+  # 1.02    hta 18.10.2026 Device ID                                             #
+  #------------------------------------------------------------------------------#
+  def submit(self, frame, key=None, urgent=False, name=None, device=None):
+    immediate = urgent or key is None
+    with self.lock:
+      if key is None:
+        #unique key, never replaced by another frame
+        key = object()
+      else:
+        #a newer frame moves to the end of the tick
+        self.pending.pop(key, None)
+      self.pending[key] = (device, frame)
+    if immediate:
+      self.flush()
+
+  #------------------------------------------------------------------------------#
+  # flush: write all commands collected since the last flush with one write.     #
+  #        Call once per control tick. Commands replaced during the tick are     #
+  #        not recorded, the ones written are                                    #
+  #                                                                              #
+  # returnvalues: number of bytes written                                        #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Recording                                             #
+  #------------------------------------------------------------------------------#
+  def flush(self):
+    with self.lock:
+      if not self.pending:
+        return 0
+      frames = list(self.pending.values())
+      buffer = b''.join(frame for device, frame in frames)
+      self.pending.clear()
+      #write whilst holding the lock so ticks cannot overtake each other
+      self.write(buffer)
+      if self.recorder is not None:
+        for device, frame in frames:
+          self.recorder.record(device, frame)
+    return len(buffer)
+
+  #------------------------------------------------------------------------------#
+  # write: write bytes to the serial port, or queue them for the writer thread   #
+  #                                                                              #
+  # Parameters: buffer: bytes to be written                                      #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def write(self, buffer):
+    if self.serialWriter is not None:
+      self.serialWriter.submit(buffer)
+    else:
+      self.ser.write(buffer)
+
+  #------------------------------------------------------------------------------#
+  # close: write whatever is still pending, stop the writer thread, if any, and  #
+  #        close the serial port and the recording                               #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Close recorder                                        #
+  #------------------------------------------------------------------------------#
+  def close(self):
+    self.flush()
+    if self.serialWriter is not None:
+      self.serialWriter.close()
+    self.replyReader.close()
+    self.ser.close()
+    if self.recorder is not None:
+      self.recorder.close()
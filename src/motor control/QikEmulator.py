@@ -0,0 +1,376 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the QikEmulator class, a software stand-in for the
+Pololu qik 2s9v1 dual serial motor controller. The emulator sits behind a
+pseudo-terminal so PololuQik, and with it the whole PololuRobot application,
+can run on any Linux machine without a qik controller attached.
+
+Emulated are: baud rate autodetection, the compact and the Pololu protocol,
+CRC-7 mode, the motor and coast commands, the four configuration parameters,
+the error byte, the serial timeout and the firmware version. When a baud rate
+is given, the time it takes to transfer each byte over the UART is emulated
+as well (10 bits per byte).
+
+Run it standalone and point SERIAL_PORT in etc/config.ini at the link it
+creates:
+
+  cd "src/motor control"; python3 QikEmulator.py --link /tmp/qik
+
+..https://www.pololu.com/docs/pdf/0J25/qik_2s9v1.pdf
+"""
+
+import sys,os
+import time
+import threading
+import select
+import tty
+import argparse
+import logging, traceback
+sys.path.append(os.path.join("..","configuration"))
+import Configuration
+import PololuQik
+
+# firmware version the emulator reports
+FIRMWARE_VERSION = b'2'
+
+# number of data bytes following each command byte (CRC byte not included)
+COMMAND_DATA_LENGTH = {
+  PololuQik.QIK_GET_FIRMWARE_VERSION:        0,
+  PololuQik.QIK_GET_ERROR_BYTE:              0,
+  PololuQik.QIK_GET_CONFIGURATION_PARAMETER: 1,
+  PololuQik.QIK_SET_CONFIGURATION_PARAMETER: 4,
+  PololuQik.QIK_2S9V1_MOTOR_M0_COAST:        0,
+  PololuQik.QIK_2S9V1_MOTOR_M1_COAST:        0,
+  PololuQik.QIK_MOTOR_M0_FORWARD:            1,
+  PololuQik.QIK_MOTOR_M0_FORWARD_8_BIT:      1,
+  PololuQik.QIK_MOTOR_M0_REVERSE:            1,
+  PololuQik.QIK_MOTOR_M0_REVERSE_8_BIT:      1,
+  PololuQik.QIK_MOTOR_M1_FORWARD:            1,
+  PololuQik.QIK_MOTOR_M1_FORWARD_8_BIT:      1,
+  PololuQik.QIK_MOTOR_M1_REVERSE:            1,
+  PololuQik.QIK_MOTOR_M1_REVERSE_8_BIT:      1,
+}
+
+# motor commands: (motor, direction, 8 bit)
+MOTOR_COMMANDS = {
+  PololuQik.QIK_MOTOR_M0_FORWARD:       (0,  1, False),
+  PololuQik.QIK_MOTOR_M0_FORWARD_8_BIT: (0,  1, True),
+  PololuQik.QIK_MOTOR_M0_REVERSE:       (0, -1, False),
+  PololuQik.QIK_MOTOR_M0_REVERSE_8_BIT: (0, -1, True),
+  PololuQik.QIK_MOTOR_M1_FORWARD:       (1,  1, False),
+  PololuQik.QIK_MOTOR_M1_FORWARD_8_BIT: (1,  1, True),
+  PololuQik.QIK_MOTOR_M1_REVERSE:       (1, -1, False),
+  PololuQik.QIK_MOTOR_M1_REVERSE_8_BIT: (1, -1, True),
+}
+
+# configuration parameters: (default value, maximum value)
+CONFIGURATION_PARAMETERS = {
+  PololuQik.QIK_CONFIG_DEVICE_ID:                 (PololuQik.QIK_DEFAULT_DEVICE_ID, 127),
+  PololuQik.QIK_CONFIG_PWM_PARAMETER:             (0, 3),
+  PololuQik.QIK_CONFIG_SHUT_DOWN_MOTORS_ON_ERROR: (1, 1),
+  PololuQik.QIK_CONFIG_SERIAL_TIMEOUT:            (0, 127),
+}
+
+# name of logger
+LOGGER = 'QikEmulator'
+
+class QikEmulator():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger', logging.getLogger(LOGGER))
+    #emulated UART speed, 0 transfers bytes without delay
+    self.baudRate = int(kwargs.get('baudRate', 0))
+    #CRC jumper in place
+    self.crc = bool(kwargs.get('crc', False))
+    #configuration parameters as stored in the controller's EEPROM
+    self.parameters = dict((param, default) for param, (default, maximum) in CONFIGURATION_PARAMETERS.items())
+    for param, value in kwargs.get('parameters', {}).items():
+      self.parameters[param] = value
+    #controller state
+    self.detected   = False
+    self.errorByte  = 0
+    self.speeds     = [0, 0]
+    self.coasting   = [True, True]
+    self.lastCommandTime = time.time()
+    #statistics
+    self.bytesReceived    = 0
+    self.commandsReceived = 0
+    self.repliesSent      = 0
+    #protects the controller state, which tests and benchmarks may inspect
+    self.lock = threading.RLock()
+    #pseudo-terminal, the slave side is what PololuQik opens
+    self.master, self.slave = os.openpty()
+    tty.setraw(self.master)
+    tty.setraw(self.slave)
+    self.port = os.ttyname(self.slave)
+    #optionally a fixed path pointing at the pseudo-terminal
+    self.link = kwargs.get('link')
+    if self.link:
+      if os.path.islink(self.link):
+        os.remove(self.link)
+      os.symlink(self.port, self.link)
+      self.port = self.link
+    self.logger.debug('emulating qik on port['+self.port+'] baudRate['+str(self.baudRate)+'] crc['+str(self.crc)+']')
+    self.running = True
+    self.thread = threading.Thread(target=self.run)
+    self.thread.name = 'QIK EMULATOR'
+    self.thread.daemon = True
+    self.thread.start()
+
+  #------------------------------------------------------------------------------#
+  # transferDelay: emulate the time it takes to move bytes over the UART         #
+  #                                                                              #
+  # Parameters: count: number of bytes                                           #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def transferDelay(self, count):
+    if self.baudRate > 0:
+      time.sleep(count * 10.0 / self.baudRate)
+
+  #------------------------------------------------------------------------------#
+  # reply: send bytes back to the host                                           #
+  #                                                                              #
+  # Parameters: data: bytes to send                                              #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def reply(self, data):
+    self.transferDelay(len(data))
+    os.write(self.master, data)
+    self.repliesSent += 1
+
+  #------------------------------------------------------------------------------#
+  # setError: set a bit in the error byte, stop the motors when so configured    #
+  #                                                                              #
+  # Parameters: bit: e.g. PololuQik.QIK_ERROR_FORMAT                             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def setError(self, bit):
+    self.errorByte |= bit
+    if self.parameters[PololuQik.QIK_CONFIG_SHUT_DOWN_MOTORS_ON_ERROR]:
+      self.speeds   = [0, 0]
+      self.coasting = [True, True]
+
+  #------------------------------------------------------------------------------#
+  # serialTimeout: serial timeout in seconds as encoded in the configuration     #
+  #                parameter: 0.262s * (lower 4 bits) * 2^(upper 3 bits)         #
+  #                                                                              #
+  # returnvalues: timeout in seconds, 0 when disabled                            #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def serialTimeout(self):
+    value = self.parameters[PololuQik.QIK_CONFIG_SERIAL_TIMEOUT]
+    return 0.262 * (value & 0x0F) * (2 ** (value >> 4))
+
+  #------------------------------------------------------------------------------#
+  # packets: parse the incoming byte stream into commands                        #
+  #          a generator, bytes are sent to it, it yields whenever it needs more #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def packets(self):
+    byte = yield
+    while True:
+      #wait for the baud rate to be detected
+      if not self.detected:
+        if byte == PololuQik.QIK_AUTODETECT_BAUD_RATE:
+          self.detected = True
+          self.logger.debug('baud rate detected')
+        byte = yield
+        continue
+      message = bytearray([byte])
+      deviceId = None
+      if byte == PololuQik.QIK_POLOLU_PROTOCOL_START_BYTE:
+        #pololu protocol: device ID followed by command with MSB cleared
+        deviceId = yield
+        message.append(deviceId)
+        if deviceId & 0x80:
+          self.setError(PololuQik.QIK_ERROR_FORMAT)
+          byte = deviceId
+          continue
+        byte = yield
+        message.append(byte)
+        if byte & 0x80:
+          self.setError(PololuQik.QIK_ERROR_FORMAT)
+          continue
+        command = byte | 0x80
+      elif byte & 0x80:
+        command = byte
+      else:
+        #data byte where a command byte was expected
+        self.setError(PololuQik.QIK_ERROR_FORMAT)
+        byte = yield
+        continue
+      if command not in COMMAND_DATA_LENGTH:
+        self.setError(PololuQik.QIK_ERROR_FORMAT)
+        byte = yield
+        continue
+      data = bytearray()
+      formatError = False
+      for i in range(COMMAND_DATA_LENGTH[command]):
+        byte = yield
+        if byte & 0x80:
+          formatError = True
+          break
+        data.append(byte)
+      if formatError:
+        #a command byte interrupted the packet, start over with it
+        self.setError(PololuQik.QIK_ERROR_FORMAT)
+        continue
+      message.extend(data)
+      if self.crc:
+        byte = yield
+        if byte != PololuQik.crc7(message):
+          self.setError(PololuQik.QIK_ERROR_CRC)
+          byte = yield
+          continue
+      if deviceId is None or deviceId == self.parameters[PololuQik.QIK_CONFIG_DEVICE_ID]:
+        self.execute(command, data)
+      byte = yield
+
+  #------------------------------------------------------------------------------#
+  # execute: execute a complete command                                          #
+  #                                                                              #
+  # Parameters: command: command byte (MSB set)                                  #
+  #             data:    data bytes                                              #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def execute(self, command, data):
+    self.commandsReceived += 1
+    self.lastCommandTime = time.time()
+    if command in MOTOR_COMMANDS:
+      motor, direction, eightBit = MOTOR_COMMANDS[command]
+      speed = data[0] + 128 if eightBit else data[0]
+      self.speeds[motor]   = direction * speed
+      self.coasting[motor] = False
+    elif command == PololuQik.QIK_2S9V1_MOTOR_M0_COAST:
+      self.speeds[0]   = 0
+      self.coasting[0] = True
+    elif command == PololuQik.QIK_2S9V1_MOTOR_M1_COAST:
+      self.speeds[1]   = 0
+      self.coasting[1] = True
+    elif command == PololuQik.QIK_GET_FIRMWARE_VERSION:
+      self.reply(FIRMWARE_VERSION)
+    elif command == PololuQik.QIK_GET_ERROR_BYTE:
+      #reading the error byte clears it
+      errorByte, self.errorByte = self.errorByte, 0
+      self.reply(bytes([errorByte]))
+    elif command == PololuQik.QIK_GET_CONFIGURATION_PARAMETER:
+      self.reply(bytes([self.parameters.get(data[0], 0xFF)]))
+    elif command == PololuQik.QIK_SET_CONFIGURATION_PARAMETER:
+      param, value, check0, check1 = data
+      if check0 != 0x55 or check1 != 0x2A:
+        self.setError(PololuQik.QIK_ERROR_FORMAT)
+      elif param not in CONFIGURATION_PARAMETERS:
+        self.reply(bytes([1]))
+      elif value > CONFIGURATION_PARAMETERS[param][1]:
+        self.reply(bytes([2]))
+      else:
+        self.parameters[param] = value
+        self.reply(bytes([0]))
+
+  #------------------------------------------------------------------------------#
+  # run: emulator thread, reads from the pseudo-terminal and feeds the parser    #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def run(self):
+    parser = self.packets()
+    next(parser)
+    while self.running:
+      try:
+        readable = select.select([self.master], [], [], 0.05)[0]
+        with self.lock:
+          timeout = self.serialTimeout()
+          if timeout and time.time() - self.lastCommandTime > timeout and not self.errorByte & PololuQik.QIK_ERROR_TIMEOUT:
+            self.setError(PololuQik.QIK_ERROR_TIMEOUT)
+        if not readable:
+          continue
+        data = os.read(self.master, 256)
+        self.transferDelay(len(data))
+        with self.lock:
+          self.bytesReceived += len(data)
+          for byte in data:
+            parser.send(byte)
+      except OSError:
+        #pseudo-terminal closed
+        break
+      except Exception:
+        self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
+
+  #------------------------------------------------------------------------------#
+  # close: stop the emulator and release the pseudo-terminal                     #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def close(self):
+    self.running = False
+    self.thread.join()
+    os.close(self.master)
+    os.close(self.slave)
+    if self.link and os.path.islink(self.link):
+      os.remove(self.link)
+
+def main():
+  parser = argparse.ArgumentParser(description='Pololu qik 2s9v1 emulator')
+  parser.add_argument('--link', default='/tmp/qik', help='path of the link to the pseudo-terminal')
+  parser.add_argument('--baud', default=38400, type=int, help='emulated baud rate, 0 for no delay')
+  parser.add_argument('--crc', action='store_true', help='emulate the CRC jumper being in place')
+  args = parser.parse_args()
+  logging.basicConfig(level=logging.DEBUG)
+  emulator = QikEmulator(link=args.link, baudRate=args.baud, crc=args.crc)
+  print('qik emulator listening on ['+emulator.port+'], set SERIAL_PORT='+emulator.port+' in etc/config.ini')
+  try:
+    while True:
+      time.sleep(1)
+  except KeyboardInterrupt:
+    None
+  finally:
+    emulator.close()
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
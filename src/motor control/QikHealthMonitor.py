@@ -0,0 +1,166 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the QikHealthMonitor class. The monitor polls the error
+byte of a qik controller from a background thread and keeps a count per error
+bit. Polling is adaptive: after an error the controller is polled every
+minInterval seconds, every clean poll doubles the interval up to maxInterval.
+A poll without reply backs off instead: the reply stream is resynchronised
+and the next poll waits at least the reply timeout plus the grace period of
+the reply reader, so a lost reply is not followed by a burst of queries.
+
+Reading the error byte is a one byte query which goes through the reply reader
+like any other, so motor commands are not held up while the monitor waits for
+the reply. When an error is seen the command cache of the controller is reset
+as the controller may have stopped the motors (shut down motors on error).
+Only whilst the monitor runs does the controller leave out repeated motor
+commands (suppressRepeats), without it nobody would notice such a stop.
+"""
+
+import threading
+import logging, traceback
+import PololuQik
+
+# error byte bits and the names they are counted under
+ERROR_BITS = ((PololuQik.QIK_ERROR_DATA_OVERRUN, 'dataOverrun'),
+              (PololuQik.QIK_ERROR_FRAME,        'frame'),
+              (PololuQik.QIK_ERROR_CRC,          'crc'),
+              (PololuQik.QIK_ERROR_FORMAT,       'format'),
+              (PololuQik.QIK_ERROR_TIMEOUT,      'timeout'))
+
+class QikHealthMonitor():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger',)
+    #the controller to monitor
+    self.controller = kwargs.get('controller')
+    #polling interval bounds in seconds
+    self.minInterval = float(kwargs.get('minInterval', 0.1))
+    self.maxInterval = float(kwargs.get('maxInterval', 5.0))
+    self.interval = self.minInterval
+    #shortest interval after a poll without reply
+    self.noReplyInterval = float(kwargs.get('noReplyInterval',
+                                 self.controller.replyTimeout + self.controller.replyReader.gracePeriod))
+    #called with this monitor after every poll which found an error
+    self.listener = kwargs.get('listener')
+    #guards the counters
+    self.lock = threading.Lock()
+    self.errorCounts = dict((name, 0) for bit, name in ERROR_BITS)
+    self.polls = 0
+    #polls which got no reply in time
+    self.noReply = 0
+    self.lastErrorByte = 0
+    #redundant motor commands may be left out now that errors are noticed
+    self.suppressRepeats = self.controller.suppressRepeats
+    self.controller.suppressRepeats = True
+    self.stopped = threading.Event()
+    self.thread = threading.Thread(target=self.run)
+    self.thread.name = 'QIK HEALTH'
+    self.thread.daemon = True
+    self.thread.start()
+
+  #------------------------------------------------------------------------------#
+  # poll: read and decode the error byte once                                    #
+  #                                                                              #
+  # returnvalues: True when the controller reported an error, False when it did  #
+  #               not, None when it did not reply                                #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Resynchronise the reply reader without reply          #
+  #------------------------------------------------------------------------------#
+  def poll(self):
+    try:
+      errorByte = self.controller.getErrorByte()
+    except PololuQik.QikTimeoutError:
+      with self.lock:
+        self.polls  += 1
+        self.noReply += 1
+      self.logger.warning('controller did not report its error byte')
+      #get back in step with the controller before anything else is asked
+      self.controller.replyReader.resync()
+      return None
+    with self.lock:
+      self.polls += 1
+      self.lastErrorByte = errorByte or 0
+      for bit, name in ERROR_BITS:
+        if self.lastErrorByte & bit:
+          self.errorCounts[name] += 1
+    if self.lastErrorByte:
+      self.logger.warning('controller error byte[' +'{:08b}'.format(self.lastErrorByte) + ']')
+      #the controller may have stopped the motors, resend the next commands
+      self.controller.resetCommandCache()
+      return True
+    return False
+
+  #------------------------------------------------------------------------------#
+  # run: monitor thread, polls until stopped                                     #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Back off after a poll without reply                   #
+  #------------------------------------------------------------------------------#
+  def run(self):
+    while not self.stopped.wait(self.interval):
+      try:
+        result = self.poll()
+        if result is None:
+          #back off, the controller or the line is in trouble
+          self.interval = min(max(self.interval * 2, self.noReplyInterval), self.maxInterval)
+        elif result:
+          self.interval = self.minInterval
+        else:
+          self.interval = min(self.interval * 2, self.maxInterval)
+        if result is not False and self.listener is not None:
+          self.listener(self)
+      except Exception:
+        self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
+
+  #------------------------------------------------------------------------------#
+  # getHealth: return the counters collected so far                              #
+  #                                                                              #
+  # returnvalues: dictionary with the number of polls, polls without reply, the  #
+  #               last error byte, the current interval and the count per error  #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getHealth(self):
+    with self.lock:
+      return dict(polls=self.polls,
+                  noReply=self.noReply,
+                  lastErrorByte=self.lastErrorByte,
+                  interval=self.interval,
+                  errors=dict(self.errorCounts))
+
+  #------------------------------------------------------------------------------#
+  # close: stop polling, the controller writes every motor command again         #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Restore suppressRepeats of the controller             #
+  #------------------------------------------------------------------------------#
+  def close(self):
+    self.stopped.set()
+    self.thread.join()
+    self.controller.suppressRepeats = self.suppressRepeats
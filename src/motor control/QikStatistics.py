@@ -0,0 +1,167 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the QikStatistics class which collects, per command
+type, the number of commands and bytes written to the qik controller, how
+long writing took, how long we waited for replies and how many replies
+timed out. Durations are kept in histograms with fixed buckets so recording
+a value costs a bisect and a few additions, nothing is kept per command.
+
+PololuQik only records statistics when it has been given a QikStatistics
+object, otherwise the cost is a single test for None.
+"""
+
+import time
+import bisect
+import threading
+
+# clock used for all measurements
+clock = getattr(time, 'perf_counter', time.time)
+
+# upper bounds of the histogram buckets in seconds, the last bucket
+# holds everything above the last bound
+BUCKET_BOUNDS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+#------------------------------------------------------------------------------#
+# Histogram: counts durations in fixed buckets                                 #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class Histogram():
+  def __init__(self, bounds=BUCKET_BOUNDS):
+    self.bounds  = bounds
+    self.buckets = [0] * (len(bounds) + 1)
+    self.count   = 0
+    self.total   = 0.0
+    self.maximum = 0.0
+
+  def add(self, seconds):
+    self.buckets[bisect.bisect_left(self.bounds, seconds)] += 1
+    self.count += 1
+    self.total += seconds
+    if seconds > self.maximum:
+      self.maximum = seconds
+
+  def snapshot(self):
+    return dict(count=self.count,
+                mean=self.total / self.count if self.count else 0.0,
+                maximum=self.maximum,
+                bounds=self.bounds,
+                buckets=list(self.buckets))
+
+#------------------------------------------------------------------------------#
+# CommandStatistics: statistics of one command type                            #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class CommandStatistics():
+  def __init__(self):
+    self.commands     = 0
+    self.bytesWritten = 0
+    self.timeouts     = 0
+    self.writeTime    = Histogram()
+    self.replyTime    = Histogram()
+
+  def snapshot(self):
+    return dict(commands=self.commands,
+                bytesWritten=self.bytesWritten,
+                timeouts=self.timeouts,
+                writeTime=self.writeTime.snapshot(),
+                replyTime=self.replyTime.snapshot())
+
+class QikStatistics():
+  def __init__(self):
+    self.lock     = threading.Lock()
+    self.commands = {}
+    self.started  = time.time()
+
+  #------------------------------------------------------------------------------#
+  # get: statistics for a command type, created when first used. Must be called  #
+  #      with the lock held.                                                     #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def get(self, name):
+    statistics = self.commands.get(name)
+    if statistics is None:
+      statistics = self.commands[name] = CommandStatistics()
+    return statistics
+
+  #------------------------------------------------------------------------------#
+  # recordWrite: record a write to the serial port                               #
+  #                                                                              #
+  # Parameters: name:      command type e.g. 'setSpeeds', 'getErrorByte'         #
+  #             byteCount: number of bytes written                               #
+  #             seconds:   time spent writing                                    #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def recordWrite(self, name, byteCount, seconds):
+    with self.lock:
+      statistics = self.get(name)
+      statistics.commands     += 1
+      statistics.bytesWritten += byteCount
+      statistics.writeTime.add(seconds)
+
+  #------------------------------------------------------------------------------#
+  # recordReply: record waiting for the reply to a query                         #
+  #                                                                              #
+  # Parameters: name:     command type e.g. 'getErrorByte'                       #
+  #             seconds:  time spent waiting                                     #
+  #             timedOut: True when no (complete) reply was received             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def recordReply(self, name, seconds, timedOut=False):
+    with self.lock:
+      statistics = self.get(name)
+      statistics.replyTime.add(seconds)
+      if timedOut:
+        statistics.timeouts += 1
+
+  #------------------------------------------------------------------------------#
+  # snapshot: return all statistics collected so far as a dictionary with one    #
+  #           entry per command type                                             #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def snapshot(self):
+    with self.lock:
+      return dict((name, statistics.snapshot()) for name, statistics in self.commands.items())
+
+  #------------------------------------------------------------------------------#
+  # reset: forget all statistics collected so far                                #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def reset(self):
+    with self.lock:
+      self.commands = {}
+      self.started  = time.time()
@@ -0,0 +1,315 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the ReplyReader class. A ReplyReader owns the read side
+of a serial port and matches the bytes the qik controller sends back to the
+queries waiting for them. The qik answers commands in the order it receives
+them, so outstanding queries are kept in a FIFO and each reply is handed to
+the oldest query still waiting for bytes.
+
+Every query has a deadline. A query which does not get its reply in time
+raises QikTimeoutError instead of blocking its caller forever. Once a reply
+has gone missing the position of later replies in the byte stream is no
+longer known, so the next query first resynchronises: the waiting queries are
+discarded, the reader thread drops whatever it has read and flushes the serial
+input, only then is the next command written. Bytes which arrive late are
+never handed to whichever query happens to be at the head of the FIFO.
+"""
+
+import time
+import binascii
+import threading
+import collections
+import logging, traceback
+
+# clock used for deadlines
+clock = getattr(time, 'monotonic', time.time)
+
+#------------------------------------------------------------------------------#
+# QikTimeoutError: raised when a query does not get its reply in time          #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class QikTimeoutError(Exception):
+  def __init__(self, name, timeout, received):
+    Exception.__init__(self, 'no reply to ['+name+'] within ['+str(timeout)+'s], received ['+binascii.hexlify(bytes(received)).decode('ascii')+']')
+    #command type of the query e.g. 'getErrorByte'
+    self.name     = name
+    #seconds we have waited
+    self.timeout  = timeout
+    #bytes received before the deadline passed
+    self.received = bytes(received)
+
+#------------------------------------------------------------------------------#
+# Request: a query waiting for its reply                                       #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class Request():
+  def __init__(self, name, replyLength, timeout):
+    self.name        = name
+    self.replyLength = replyLength
+    self.timeout     = timeout
+    self.deadline    = clock() + timeout
+    self.reply       = bytearray()
+    self.done        = threading.Event()
+    self.abandoned   = False
+
+class ReplyReader():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger',)
+    #serial port we are the only reader of
+    self.ser = kwargs.get('ser')
+    #a timed out request keeps its place this long, in case its reply is late
+    self.gracePeriod = float(kwargs.get('gracePeriod', 1.0))
+    #the reader thread must wake up regularly to purge expired requests
+    self.ser.timeout = float(kwargs.get('pollInterval', 0.05))
+    #serializes registering a request with writing its command
+    self.requestLock = threading.Lock()
+    #guards the pending requests, shared with the reader thread
+    self.lock = threading.Lock()
+    self.pending = collections.deque()
+    #incremented by resync, bytes read under an older generation are dropped
+    self.generation = 0
+    #generation the reader thread has flushed the serial input for
+    self.readerGeneration = 0
+    #signalled by the reader thread once it has flushed the serial input
+    self.readerCondition = threading.Condition(self.lock)
+    #longest wait for the reader thread to flush the serial input
+    self.resyncTimeout = float(kwargs.get('resyncTimeout', 1.0))
+    #bytes received whilst no request was waiting for them
+    self.unexpectedBytes = 0
+    #timed out requests whose reply never arrived
+    self.lostReplies = 0
+    #number of times the reply stream was resynchronised
+    self.resyncs = 0
+    #set when a request times out, the next request resynchronises first
+    self.desynced = False
+    self.running = True
+    self.thread = threading.Thread(target=self.run)
+    self.thread.name = 'REPLY READER'
+    self.thread.daemon = True
+    self.thread.start()
+
+  #------------------------------------------------------------------------------#
+  # request: register a query and write its command. Registering and writing     #
+  #          happen under one lock so replies arrive in the order requests are   #
+  #          queued, even when several threads query at the same time. When an   #
+  #          earlier request has timed out the reply stream is resynchronised    #
+  #          before the command is written                                       #
+  #                                                                              #
+  # Parameters: name:        command type e.g. 'getErrorByte'                    #
+  #             replyLength: number of bytes in the reply                        #
+  #             timeout:     seconds to wait for the reply                       #
+  #             write:       function writing the command to the serial port     #
+  #                                                                              #
+  # returnvalues: Request, pass it to wait                                       #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Resynchronise after a lost reply                      #
+  #------------------------------------------------------------------------------#
+  def request(self, name, replyLength, timeout, write):
+    request = Request(name, replyLength, timeout)
+    with self.requestLock:
+      if self.desynced:
+        self.resync()
+      with self.lock:
+        self.pending.append(request)
+      try:
+        write()
+      except Exception:
+        with self.lock:
+          self.pending.remove(request)
+        raise
+    return request
+
+  #------------------------------------------------------------------------------#
+  # wait: wait for the reply to a request                                        #
+  #                                                                              #
+  # Parameters: request: as returned by request                                  #
+  #                                                                              #
+  # returnvalues: reply as bytes, raises QikTimeoutError when the deadline of    #
+  #               the request passes first                                       #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Resynchronise before the next request                 #
+  #------------------------------------------------------------------------------#
+  def wait(self, request):
+    if not request.done.wait(max(0.0, request.deadline - clock())):
+      with self.lock:
+        if not request.done.is_set():
+          request.abandoned = True
+          self.desynced = True
+          raise QikTimeoutError(request.name, request.timeout, request.reply)
+    return bytes(request.reply)
+
+  #------------------------------------------------------------------------------#
+  # dispatch: hand received bytes to the waiting requests, oldest first. A timed #
+  #           out request at the head is dropped rather than fed once newer      #
+  #           requests wait behind it. Must be called with the lock held.        #
+  #                                                                              #
+  # Parameters: data: bytes received                                             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Drop a timed out head when newer requests wait        #
+  #------------------------------------------------------------------------------#
+  def dispatch(self, data):
+    for byte in data:
+      if not self.pending:
+        self.unexpectedBytes += 1
+        continue
+      while self.pending[0].abandoned and len(self.pending) > 1:
+        self.dropRequest(self.pending.popleft())
+      request = self.pending[0]
+      request.reply.append(byte)
+      if len(request.reply) >= request.replyLength:
+        self.pending.popleft()
+        request.done.set()
+
+  #------------------------------------------------------------------------------#
+  # purge: drop timed out requests whose reply has not arrived within the grace  #
+  #        period. Must be called with the lock held.                            #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Drop through dropRequest                              #
+  #------------------------------------------------------------------------------#
+  def purge(self):
+    now = clock()
+    while self.pending and self.pending[0].abandoned and now > self.pending[0].deadline + self.gracePeriod:
+      self.dropRequest(self.pending.popleft())
+
+  #------------------------------------------------------------------------------#
+  # dropRequest: count and log a timed out request whose reply never arrived.    #
+  #              Must be called with the lock held.                              #
+  #                                                                              #
+  # Parameters: request: Request removed from the pending requests               #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version, taken from purge                     #
+  #------------------------------------------------------------------------------#
+  def dropRequest(self, request):
+    self.lostReplies += 1
+    self.logger.warning('reply to ['+request.name+'] lost')
+
+  #------------------------------------------------------------------------------#
+  # discardPending: forget all waiting requests, their replies will not come     #
+  #                 e.g. the controller was not listening when they were sent.   #
+  #                 Callers still waiting get QikTimeoutError at their deadline. #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Count abandoned requests as lost                      #
+  #------------------------------------------------------------------------------#
+  def discardPending(self):
+    with self.lock:
+      for request in self.pending:
+        if request.abandoned:
+          self.dropRequest(request)
+        request.abandoned = True
+      self.pending.clear()
+
+  #------------------------------------------------------------------------------#
+  # resync: get back in step with the controller after a reply went missing.     #
+  #         Waiting requests are discarded and the reader thread drops the bytes #
+  #         it has read so far and flushes the serial input. Returns once the    #
+  #         reader has done so, the next command written gets the next reply.    #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def resync(self):
+    self.discardPending()
+    with self.lock:
+      self.desynced = False
+      self.generation += 1
+      self.resyncs += 1
+      generation = self.generation
+      deadline = clock() + self.resyncTimeout
+      while self.running and self.readerGeneration != generation:
+        remaining = deadline - clock()
+        if remaining <= 0:
+          self.logger.warning('reply reader did not flush the serial input')
+          break
+        self.readerCondition.wait(remaining)
+    self.logger.debug('reply stream resynchronised, lost replies[' + str(self.lostReplies) + ']')
+
+  #------------------------------------------------------------------------------#
+  # run: reader thread, reads replies until stopped. Flushes the serial input    #
+  #      when resync asks for it, bytes read across a resync are dropped         #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Flush the serial input on resync                      #
+  #------------------------------------------------------------------------------#
+  def run(self):
+    while self.running:
+      try:
+        with self.lock:
+          generation = self.generation
+          if self.readerGeneration != generation:
+            self.ser.flushInput()
+            self.readerGeneration = generation
+            self.readerCondition.notify_all()
+        data = self.ser.read(1)
+        if data:
+          waiting = self.ser.inWaiting()
+          if waiting:
+            data += self.ser.read(waiting)
+        with self.lock:
+          if generation == self.generation:
+            self.dispatch(data)
+          else:
+            # read before resync flushed the serial input, belongs to no one
+            self.unexpectedBytes += len(data)
+          self.purge()
+      except Exception:
+        if self.running:
+          self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
+          time.sleep(self.ser.timeout)
+
+  #------------------------------------------------------------------------------#
+  # close: stop the reader thread                                                #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def close(self):
+    self.running = False
+    self.thread.join()
@@ -0,0 +1,191 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the SerialWriter class. A SerialWriter owns the write
+side of a serial port: callers hand it frames which are put in a bounded queue
+and written by a single dedicated thread, so callers never block on the UART.
+
+Frames may carry a key (e.g. 'M0', 'M1'), a newer frame replaces a queued frame
+with the same key (latest wins). Urgent frames (stop, coast) are written before
+anything else still queued and discard queued frames with the same key.
+
+With statistics, the bytes of every write are recorded under the command type
+of the frames they belong to, once they have actually been written. With a
+CommandRecorder the frames are recorded at the same point, so frames replaced
+or discarded whilst queued never appear in a recording.
+"""
+
+import threading
+import collections
+import logging, traceback
+import QikStatistics
+
+class SerialWriter():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger',)
+    #serial port we are the only writer of
+    self.ser = kwargs.get('ser')
+    #maximum number of frames waiting in the normal queue
+    self.maxQueueSize = int(kwargs.get('writeQueueSize', 32))
+    #guards the queues and signals the writer thread and blocked callers
+    self.condition = threading.Condition()
+    #queued entries, each entry is a list [key, frame, name, device]
+    self.queue  = collections.deque()
+    self.urgent = collections.deque()
+    #queued entry per key, used for coalescing
+    self.keyed  = {}
+    #optional latency and throughput statistics of the actual writes
+    self.statistics = kwargs.get('statistics')
+    #optional CommandRecorder, frames are recorded once written
+    self.recorder = kwargs.get('recorder')
+    #frame counters
+    self.framesWritten   = 0
+    self.framesCoalesced = 0
+    self.running = True
+    self.thread = threading.Thread(target=self.run)
+    self.thread.name = 'SERIAL WRITER'
+    self.thread.daemon = True
+    self.thread.start()
+
+  #------------------------------------------------------------------------------#
+  # submit: queue a frame to be written to the serial port                       #
+  #                                                                              #
+  # Parameters: frame:  bytes to write                                           #
+  #             key:    frames with the same key replace each other whilst still #
+  #                     queued, None when the frame must never be coalesced      #
+  #             urgent: True to write the frame ahead of the normal queue        #
+  #             name:   command type the statistics are recorded under           #
+  #             device: device ID the frame is recorded under, None for the      #
+  #                     compact protocol                                         #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Command type per frame                                #
+  # 1.02    hta 18.10.2026 Device ID per frame                                   #
+  #------------------------------------------------------------------------------#
+  def submit(self, frame, key=None, urgent=False, name='command', device=None):
+    with self.condition:
+      entry = self.keyed.get(key) if key is not None else None
+      if urgent:
+        if entry is not None:
+          #a queued frame for this key is stale now, blank it out
+          entry[1] = None
+          self.framesCoalesced += 1
+        entry = [key, frame, name, device]
+        self.urgent.append(entry)
+      elif entry is not None:
+        #latest wins, the queued entry keeps its position
+        entry[1] = frame
+        entry[2] = name
+        entry[3] = device
+        self.framesCoalesced += 1
+        return
+      else:
+        #bounded queue, wait for the writer thread to make room
+        while len(self.queue) >= self.maxQueueSize and self.running:
+          self.condition.wait()
+        entry = [key, frame, name, device]
+        self.queue.append(entry)
+      if key is not None:
+        self.keyed[key] = entry
+      self.condition.notify_all()
+
+  #------------------------------------------------------------------------------#
+  # take: remove all queued frames, urgent frames first, and return them as one  #
+  #       buffer. Must be called with the condition held.                        #
+  #                                                                              #
+  # returnvalues: bytearray with the frames to be written, dictionary with the   #
+  #               number of bytes per command type, list of (device, frame) to   #
+  #               be recorded                                                    #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Bytes per command type                                #
+  # 1.02    hta 18.10.2026 Frames to be recorded                                 #
+  #------------------------------------------------------------------------------#
+  def take(self):
+    buffer = bytearray()
+    byteCounts = {}
+    frames = []
+    for entries in (self.urgent, self.queue):
+      while entries:
+        key, frame, name, device = entries.popleft()
+        if frame is not None:
+          buffer.extend(frame)
+          byteCounts[name] = byteCounts.get(name, 0) + len(frame)
+          if self.recorder is not None:
+            frames.append((device, frame))
+          self.framesWritten += 1
+    self.keyed.clear()
+    #there is room in the queue again
+    self.condition.notify_all()
+    return buffer, byteCounts, frames
+
+  #------------------------------------------------------------------------------#
+  # run: writer thread, writes whatever is queued until stopped                  #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Statistics                                            #
+  # 1.02    hta 18.10.2026 Statistics per command type                           #
+  # 1.03    hta 18.10.2026 Recording                                             #
+  #------------------------------------------------------------------------------#
+  def run(self):
+    while True:
+      with self.condition:
+        while self.running and not self.urgent and not self.queue:
+          self.condition.wait()
+        if not self.running and not self.urgent and not self.queue:
+          break
+        buffer, byteCounts, frames = self.take()
+      if buffer:
+        try:
+          if self.statistics is None:
+            self.ser.write(buffer)
+          else:
+            start = QikStatistics.clock()
+            self.ser.write(buffer)
+            seconds = QikStatistics.clock() - start
+            #each command type once per write, with the time of the whole write
+            for name, byteCount in byteCounts.items():
+              self.statistics.recordWrite(name, byteCount, seconds)
+          #only what actually went out is recorded
+          for device, frame in frames:
+            self.recorder.record(device, frame)
+        except Exception:
+          self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
+
+  #------------------------------------------------------------------------------#
+  # close: write whatever is still queued and stop the writer thread             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def close(self):
+    with self.condition:
+      self.running = False
+      self.condition.notify_all()
+    self.thread.join()
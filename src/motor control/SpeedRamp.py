@@ -0,0 +1,221 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the SpeedRamp class. Rather than jumping to a new speed
+the motors are moved towards their target speed at a limited rate (speed units
+per second) on a fixed tick, which avoids wheel slip when starting, reversing
+or turning.
+
+A speed command is only written for a motor whose speed has changed by at
+least one unit since its last write, the other motor's command is not repeated.
+The ramp thread sleeps whilst both motors are at their target. A write the controller refuses (a command arbiter
+returns False) does not count as sent, the next write includes that motor
+again. stop() bypasses the ramp: the motors are stopped straight
+away and the ramp is reset. reset() only resets the ramp, for callers which
+stop the motors themselves e.g. through a safety stop.
+"""
+
+import time
+import threading
+import logging, traceback
+
+# clock used for the ticks
+clock = getattr(time, 'monotonic', time.time)
+
+class SpeedRamp():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger',)
+    #the PololuQik object driving the motors
+    self.controller = kwargs.get('controller')
+    #maximum change of speed per second
+    self.rate = float(kwargs.get('rate', 300.0))
+    #seconds between ticks
+    self.tickInterval = float(kwargs.get('tickInterval', 0.02))
+    #guards targets and speeds, signals the ramp thread
+    self.condition = threading.Condition()
+    #speeds the motors are moving towards
+    self.targets = [0.0, 0.0]
+    #speeds the motors are at now, as sent to the controller
+    self.speeds = [0.0, 0.0]
+    self.sent = [0, 0]
+    #counters
+    self.ticks  = 0
+    self.writes = 0
+    self.running = True
+    self.thread = threading.Thread(target=self.run)
+    self.thread.name = 'SPEED RAMP'
+    self.thread.daemon = True
+    self.thread.start()
+
+  #------------------------------------------------------------------------------#
+  # setSpeeds: set the speeds the motors ramp towards                            #
+  #                                                                              #
+  # Parameters: m0Speed: target speed of motor 0                                 #
+  #             m1Speed: target speed of motor 1                                 #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def setSpeeds(self, m0Speed, m1Speed):
+    with self.condition:
+      self.targets = [float(m0Speed), float(m1Speed)]
+      self.condition.notify_all()
+
+  #------------------------------------------------------------------------------#
+  # stop: stop the motors immediately, bypassing the ramp                        #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Reset through reset                                   #
+  #------------------------------------------------------------------------------#
+  def stop(self):
+    with self.condition:
+      self.reset()
+      #written under the condition so no tick can slip in after the stop
+      self.controller.stopMotors()
+
+  #------------------------------------------------------------------------------#
+  # reset: set targets and speeds to zero without writing anything, no further   #
+  #        ticks are written until new targets are set. The caller stops the     #
+  #        motors.                                                               #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version, taken from stop                      #
+  #------------------------------------------------------------------------------#
+  def reset(self):
+    with self.condition:
+      self.targets = [0.0, 0.0]
+      self.speeds  = [0.0, 0.0]
+      self.sent    = [0, 0]
+
+  #------------------------------------------------------------------------------#
+  # timeToTarget: seconds the ramp takes from the current speeds to the given    #
+  #               targets                                                        #
+  #                                                                              #
+  # Parameters: m0Speed: target speed of motor 0                                 #
+  #             m1Speed: target speed of motor 1                                 #
+  #                                                                              #
+  # returnvalues: seconds                                                        #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def timeToTarget(self, m0Speed, m1Speed):
+    with self.condition:
+      return max(abs(m0Speed - self.speeds[0]), abs(m1Speed - self.speeds[1])) / self.rate
+
+  #------------------------------------------------------------------------------#
+  # isSettled: True when both motors are at their target speed                   #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def isSettled(self):
+    with self.condition:
+      return self.speeds == self.targets
+
+  #------------------------------------------------------------------------------#
+  # step: move the speeds one tick towards their targets and write the speed of  #
+  #       each motor whose speed changed by at least one unit. Must be called    #
+  #       with the condition held. A write refused by the controller is not      #
+  #       sent.                                                                  #
+  #                                                                              #
+  # Parameters: seconds: time since the previous tick                            #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Refused writes are not sent                           #
+  # 1.02    hta 18.10.2026 Only the motors whose speed changed                   #
+  #------------------------------------------------------------------------------#
+  def step(self, seconds):
+    maxChange = self.rate * seconds
+    for motor in (0, 1):
+      difference = self.targets[motor] - self.speeds[motor]
+      if abs(difference) <= maxChange:
+        self.speeds[motor] = self.targets[motor]
+      elif difference > 0:
+        self.speeds[motor] += maxChange
+      else:
+        self.speeds[motor] -= maxChange
+    speeds = [int(speed) for speed in self.speeds]
+    self.ticks += 1
+    if speeds != self.sent:
+      #None leaves a motor whose speed did not change as it is
+      changed = [speed if speed != sent else None for speed, sent in zip(speeds, self.sent)]
+      if self.controller.setSpeeds(changed[0], changed[1]) is not False:
+        self.sent = speeds
+      self.writes += 1
+
+  #------------------------------------------------------------------------------#
+  # run: ramp thread, ticks at a fixed rate whilst a motor is not at its target  #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def run(self):
+    nextTick = None
+    while True:
+      with self.condition:
+        while self.running and self.speeds == self.targets:
+          nextTick = None
+          self.condition.wait()
+        if not self.running:
+          break
+        now = clock()
+        if nextTick is None:
+          #first tick after being idle, a full tick of change straight away
+          previousTick = now - self.tickInterval
+          nextTick = now
+        if now >= nextTick:
+          try:
+            self.step(now - previousTick)
+          except Exception:
+            self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
+          previousTick = now
+          #fixed rate, a late tick does not shift the ones after it
+          nextTick += self.tickInterval
+          if nextTick < now:
+            nextTick = now + self.tickInterval
+        #woken early when the targets change
+        self.condition.wait(max(0.0, nextTick - clock()))
+
+  #------------------------------------------------------------------------------#
+  # close: stop the ramp thread, the motors keep their current speed             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def close(self):
+    with self.condition:
+      self.running = False
+      self.condition.notify_all()
+    self.thread.join()
@@ -0,0 +1,551 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the GPIO backends the obstruction sensors read their
+inputs through. A backend offers
+
+  setupInput(channel, pullUp)         configure a channel as input
+  read(channel)                       current level, LOW or HIGH
+  addEdgeCallback(channel, callback)  callback(channel) on every edge
+  removeEdgeCallback(channel)
+  cleanUp()
+
+ - RPiGpioBackend uses RPi.GPIO, which is only imported when the backend is
+   created, so the modules using a backend can be imported on any machine
+ - CdevGpioBackend and SysfsGpioBackend watch all their channels from one
+   thread waiting on an epoll object, through the kernel's GPIO character
+   device (/dev/gpiochipN, line events) or the sysfs value files
+   (/sys/class/gpio/gpioN/value). Each edge is read once by that thread, the
+   level it left is kept and read returns it without a system call. Like the
+   rest of the application they run on Python 3.2, system call errors are
+   told apart by their errno
+ - SimulatedGpioBackend keeps the levels in memory. Edges are set by hand or
+   played from a script (e.g. one made by randomEdges) at precise times, from
+   a thread of its own as RPi.GPIO calls its callbacks. How late each scripted
+   edge was played is kept in a histogram
+
+createBackend makes a backend by name, 'rpi', 'cdev', 'sysfs' or 'simulated'.
+"""
+
+import sys,os
+import errno
+import fcntl
+import select
+import struct
+import heapq
+import itertools
+import threading
+import logging, traceback
+sys.path.append(os.path.join("..","motor control"))
+import QikStatistics
+
+# pin levels
+LOW  = 0
+HIGH = 1
+
+# GPIO character device, version 1 of the line event interface (linux/gpio.h)
+GPIO_GET_LINEEVENT_IOCTL         = 0xC030B404
+GPIOHANDLE_GET_LINE_VALUES_IOCTL = 0xC040B408
+GPIOHANDLE_REQUEST_INPUT         = 1 << 0
+GPIOHANDLE_REQUEST_BIAS_PULL_UP  = 1 << 5
+GPIOHANDLE_REQUEST_BIAS_PULL_DOWN= 1 << 6
+GPIOEVENT_REQUEST_BOTH_EDGES     = 0x03
+GPIOEVENT_EVENT_RISING_EDGE      = 0x01
+# struct gpioevent_request: lineoffset, handleflags, eventflags,
+# consumer_label[32], fd
+GPIOEVENT_REQUEST = struct.Struct('III32si')
+# struct gpioevent_data: timestamp, id, padded to 16 bytes
+GPIOEVENT_DATA    = struct.Struct('QI4x')
+
+#------------------------------------------------------------------------------#
+# RPiGpioBackend: inputs of the Raspberry Pi's GPIO header, Broadcom numbering #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version, taken from ObstructionSensor         #
+#------------------------------------------------------------------------------#
+class RPiGpioBackend():
+  def __init__(self, **kwargs):
+    import RPi.GPIO
+    self.GPIO = RPi.GPIO
+    #use Broadcom Pin numbers
+    self.GPIO.setmode(self.GPIO.BCM)
+
+  def setupInput(self, channel, pullUp=True):
+    self.GPIO.setup(channel, self.GPIO.IN,
+                    pull_up_down = self.GPIO.PUD_UP if pullUp else self.GPIO.PUD_DOWN)
+
+  def read(self, channel):
+    return LOW if self.GPIO.input(channel) == self.GPIO.LOW else HIGH
+
+  def addEdgeCallback(self, channel, callback):
+    #rising as well as falling edges
+    self.GPIO.add_event_detect(channel, self.GPIO.BOTH, callback=callback)
+
+  def removeEdgeCallback(self, channel):
+    self.GPIO.remove_event_detect(channel)
+
+  def cleanUp(self):
+    self.GPIO.cleanup()
+
+#------------------------------------------------------------------------------#
+# EpollGpioBackend: inputs watched by one thread waiting on an epoll object,   #
+#                   subclasses open the lines and read their edges             #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class EpollGpioBackend():
+  #epoll events signalling an edge on a line
+  EVENT_MASK = select.EPOLLIN
+
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger',)
+    #guards levels, callbacks and the file descriptors
+    self.lock = threading.Lock()
+    #last level seen per channel
+    self.levels = {}
+    self.callbacks = {}
+    #file descriptor per channel and channel per file descriptor
+    self.lineFds = {}
+    self.fdChannels = {}
+    self.edgesRead = 0
+    self.epoll = select.epoll()
+    #written to by cleanUp to wake up the reader thread
+    self.wakeup = os.pipe()
+    self.epoll.register(self.wakeup[0], select.EPOLLIN)
+    self.running = True
+    self.thread = threading.Thread(target=self.run)
+    self.thread.name = 'GPIO EPOLL'
+    self.thread.daemon = True
+    self.thread.start()
+
+  def setupInput(self, channel, pullUp=True):
+    with self.lock:
+      if channel in self.lineFds:
+        return
+      fd, level = self.openLine(channel, pullUp)
+      self.lineFds[channel] = fd
+      self.fdChannels[fd] = channel
+      self.levels[channel] = level
+      self.epoll.register(fd, self.EVENT_MASK)
+
+  def read(self, channel):
+    return self.levels.get(channel, HIGH)
+
+  def addEdgeCallback(self, channel, callback):
+    with self.lock:
+      self.callbacks[channel] = callback
+
+  def removeEdgeCallback(self, channel):
+    with self.lock:
+      self.callbacks.pop(channel, None)
+
+  #------------------------------------------------------------------------------#
+  # run: reader thread, reads the edges of every line as epoll reports them and  #
+  #      calls the callback of the line once per edge                            #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Interrupted poll told by errno                        #
+  #------------------------------------------------------------------------------#
+  def run(self):
+    while self.running:
+      try:
+        events = self.epoll.poll()
+      except (OSError, IOError) as e:
+        #interrupted by a signal
+        if e.errno == errno.EINTR:
+          continue
+        raise
+      for fd, mask in events:
+        if fd == self.wakeup[0]:
+          continue
+        with self.lock:
+          channel = self.fdChannels.get(fd)
+        if channel is None:
+          continue
+        try:
+          for level in self.readEdges(fd):
+            with self.lock:
+              self.levels[channel] = level
+              self.edgesRead += 1
+              callback = self.callbacks.get(channel)
+            if callback is not None:
+              callback(channel)
+        except Exception:
+          self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
+
+  #------------------------------------------------------------------------------#
+  # getStatistics: channels watched and edges read                               #
+  #                                                                              #
+  # returnvalues: dictionary                                                     #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getStatistics(self):
+    with self.lock:
+      return dict(channels=sorted(self.lineFds), edgesRead=self.edgesRead)
+
+  def cleanUp(self):
+    if not self.running:
+      return
+    self.running = False
+    os.write(self.wakeup[1], b'x')
+    if self.thread is not threading.current_thread():
+      self.thread.join()
+    with self.lock:
+      for channel, fd in self.lineFds.items():
+        self.epoll.unregister(fd)
+        self.closeLine(channel, fd)
+      self.lineFds.clear()
+      self.fdChannels.clear()
+      self.callbacks.clear()
+    self.epoll.close()
+    os.close(self.wakeup[0])
+    os.close(self.wakeup[1])
+
+#------------------------------------------------------------------------------#
+# CdevGpioBackend: lines of a GPIO character device, the edges are queued by   #
+#                  the kernel so none is lost while the reader thread is busy  #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class CdevGpioBackend(EpollGpioBackend):
+  def __init__(self, **kwargs):
+    #character device of the GPIO chip, gpiochip0 is the header of a Pi
+    self.chip = kwargs.get('gpioChip') or '/dev/gpiochip0'
+    self.chipFd = os.open(self.chip, os.O_RDONLY)
+    EpollGpioBackend.__init__(self, **kwargs)
+
+  #------------------------------------------------------------------------------#
+  # openLine: request edge events of a line                                      #
+  #                                                                              #
+  # Parameters: channel: line offset on the chip                                 #
+  #             pullUp:  pull the line up, else down                             #
+  #                                                                              #
+  # returnvalues: (event file descriptor, current level)                         #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Non-blocking through fcntl (Python 3.2)             #
+  #------------------------------------------------------------------------------#
+  def openLine(self, channel, pullUp):
+    bias = GPIOHANDLE_REQUEST_BIAS_PULL_UP if pullUp else GPIOHANDLE_REQUEST_BIAS_PULL_DOWN
+    for flags in (GPIOHANDLE_REQUEST_INPUT | bias, GPIOHANDLE_REQUEST_INPUT):
+      request = bytearray(GPIOEVENT_REQUEST.pack(channel, flags, GPIOEVENT_REQUEST_BOTH_EDGES,
+                                                 b'PololuRobot', 0))
+      try:
+        fcntl.ioctl(self.chipFd, GPIO_GET_LINEEVENT_IOCTL, request, True)
+        break
+      except (OSError, IOError) as e:
+        #kernels before 5.5 know no bias flags, the pull is left as it is
+        if e.errno != errno.EINVAL or flags == GPIOHANDLE_REQUEST_INPUT:
+          raise
+        self.logger.warning('cannot set the pull of line['+str(channel)+'] on '+self.chip)
+    fd = GPIOEVENT_REQUEST.unpack(request)[4]
+    fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+    values = bytearray(64)
+    fcntl.ioctl(fd, GPIOHANDLE_GET_LINE_VALUES_IOCTL, values, True)
+    return fd, HIGH if values[0] else LOW
+
+  #------------------------------------------------------------------------------#
+  # readEdges: read the queued edge events of a line                             #
+  #                                                                              #
+  # Parameters: fd: event file descriptor                                        #
+  #                                                                              #
+  # returnvalues: list with the level after each edge                            #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 No BlockingIOError or iter_unpack (Python 3.2)      #
+  #------------------------------------------------------------------------------#
+  def readEdges(self, fd):
+    try:
+      data = os.read(fd, 16 * GPIOEVENT_DATA.size)
+    except OSError as e:
+      #no events queued
+      if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+        return []
+      raise
+    return [HIGH if GPIOEVENT_DATA.unpack_from(data, offset)[1] == GPIOEVENT_EVENT_RISING_EDGE else LOW
+            for offset in range(0, len(data) - GPIOEVENT_DATA.size + 1, GPIOEVENT_DATA.size)]
+
+  def closeLine(self, channel, fd):
+    os.close(fd)
+
+  def cleanUp(self):
+    EpollGpioBackend.cleanUp(self)
+    os.close(self.chipFd)
+
+#------------------------------------------------------------------------------#
+# SysfsGpioBackend: GPIO lines exported to sysfs, for kernels without the      #
+#                   character device. sysfs cannot set the pull of a line and  #
+#                   only reports that the value changed, it is read again      #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class SysfsGpioBackend(EpollGpioBackend):
+  EVENT_MASK = select.EPOLLPRI | select.EPOLLERR
+
+  def __init__(self, **kwargs):
+    self.path = '/sys/class/gpio'
+    #sysfs number of channel 0, newer kernels number the Pi's GPIOs from 512
+    self.base = int(kwargs.get('sysfsBase') or 0)
+    EpollGpioBackend.__init__(self, **kwargs)
+
+  #------------------------------------------------------------------------------#
+  # openLine: export a line as input with edge notification on both edges        #
+  #                                                                              #
+  # Parameters: channel: GPIO channel, Broadcom numbering                        #
+  #             pullUp:  ignored, sysfs cannot set the pull                      #
+  #                                                                              #
+  # returnvalues: (value file descriptor, current level)                         #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def openLine(self, channel, pullUp):
+    gpio = os.path.join(self.path, 'gpio'+str(self.base + channel))
+    if not os.path.exists(gpio):
+      with open(os.path.join(self.path, 'export'), 'w') as export:
+        export.write(str(self.base + channel))
+    with open(os.path.join(gpio, 'direction'), 'w') as direction:
+      direction.write('in')
+    with open(os.path.join(gpio, 'edge'), 'w') as edge:
+      edge.write('both')
+    fd = os.open(os.path.join(gpio, 'value'), os.O_RDONLY | os.O_NONBLOCK)
+    #reading the value clears the pending notification
+    return fd, self.readEdges(fd)[0]
+
+  def readEdges(self, fd):
+    os.lseek(fd, 0, os.SEEK_SET)
+    return [HIGH if os.read(fd, 8).strip() == b'1' else LOW]
+
+  def closeLine(self, channel, fd):
+    os.close(fd)
+    try:
+      with open(os.path.join(self.path, 'unexport'), 'w') as unexport:
+        unexport.write(str(self.base + channel))
+    except (OSError, IOError):
+      None
+
+class SimulatedGpioBackend():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger',)
+    #scripted edges are slept for until this many seconds before they are
+    #due, then waited for by spinning
+    self.spinTime = float(kwargs.get('spinTime', 0.001))
+    #guards levels, callbacks and the script, signals the edge thread
+    self.condition = threading.Condition()
+    self.levels = {}
+    self.callbacks = {}
+    #(clock reading, sequence, channel, level) of the scripted edges
+    self.script = []
+    self.sequence = itertools.count()
+    #a scripted edge is being played
+    self.playing = False
+    #seconds scripted edges were played late
+    self.lateness = QikStatistics.Histogram()
+    self.edgesPlayed = 0
+    self.running = True
+    self.thread = threading.Thread(target=self.run)
+    self.thread.name = 'GPIO SIMULATOR'
+    self.thread.daemon = True
+    self.thread.start()
+
+  def setupInput(self, channel, pullUp=True):
+    with self.condition:
+      self.levels.setdefault(channel, HIGH if pullUp else LOW)
+
+  def read(self, channel):
+    return self.levels.get(channel, HIGH)
+
+  def addEdgeCallback(self, channel, callback):
+    with self.condition:
+      self.callbacks[channel] = callback
+
+  def removeEdgeCallback(self, channel):
+    with self.condition:
+      self.callbacks.pop(channel, None)
+
+  #------------------------------------------------------------------------------#
+  # setLevel: change the level of a channel now, the edge callback is called     #
+  #           from the calling thread when the level changed                     #
+  #                                                                              #
+  # Parameters: channel: GPIO channel                                            #
+  #             level:   LOW or HIGH                                             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def setLevel(self, channel, level):
+    with self.condition:
+      if self.levels.get(channel, HIGH) == level:
+        return
+      self.levels[channel] = level
+      callback = self.callbacks.get(channel)
+    if callback is not None:
+      try:
+        callback(channel)
+      except Exception:
+        self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
+
+  #------------------------------------------------------------------------------#
+  # play: play edges from the edge thread at the given times                     #
+  #                                                                              #
+  # Parameters: edges: (seconds, channel, level) tuples, seconds from start      #
+  #             start: clock reading the seconds count from, None for now        #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def play(self, edges, start=None):
+    if start is None:
+      start = QikStatistics.clock()
+    with self.condition:
+      for seconds, channel, level in edges:
+        heapq.heappush(self.script, (start + seconds, next(self.sequence), channel, level))
+      self.condition.notify_all()
+
+  #------------------------------------------------------------------------------#
+  # waitUntilPlayed: wait until all scripted edges have been played              #
+  #                                                                              #
+  # Parameters: timeout: seconds, None to wait as long as it takes               #
+  #                                                                              #
+  # returnvalues: True when all edges have been played                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def waitUntilPlayed(self, timeout=None):
+    with self.condition:
+      return self.condition.wait_for(lambda: not self.script and not self.playing, timeout)
+
+  #------------------------------------------------------------------------------#
+  # run: edge thread, plays the scripted edges as they fall due                  #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def run(self):
+    while True:
+      with self.condition:
+        while self.running and (not self.script or
+                                self.script[0][0] - QikStatistics.clock() > self.spinTime):
+          self.condition.wait(self.script[0][0] - QikStatistics.clock() - self.spinTime if self.script else None)
+        if not self.running:
+          break
+        due = self.script[0][0]
+      #the last stretch is spun, sleeping is not precise enough
+      while QikStatistics.clock() < due:
+        None
+      with self.condition:
+        due, sequence, channel, level = heapq.heappop(self.script)
+        self.lateness.add(QikStatistics.clock() - due)
+        self.edgesPlayed += 1
+        self.playing = True
+      self.setLevel(channel, level)
+      with self.condition:
+        self.playing = False
+        self.condition.notify_all()
+
+  #------------------------------------------------------------------------------#
+  # getStatistics: edges played and how late                                     #
+  #                                                                              #
+  # returnvalues: dictionary                                                     #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getStatistics(self):
+    with self.condition:
+      return dict(edgesPlayed=self.edgesPlayed, lateness=self.lateness.snapshot())
+
+  def cleanUp(self):
+    with self.condition:
+      self.running = False
+      self.condition.notify_all()
+    if self.thread is not threading.current_thread():
+      self.thread.join()
+
+#------------------------------------------------------------------------------#
+# randomEdges: a random obstruction script, alternately clear and obstructed   #
+#              for exponentially distributed times, each change optionally     #
+#              followed by bounces                                             #
+#                                                                              #
+# Parameters: rng:            random.Random                                    #
+#             channel:        GPIO channel                                     #
+#             duration:       seconds the script covers                        #
+#             meanClear:      mean seconds without obstruction                 #
+#             meanObstructed: mean seconds obstructed                          #
+#             bounces:        extra edges following each change                #
+#             bounceTime:     seconds the bounces are spread over              #
+#                                                                              #
+# returnvalues: list of (seconds, channel, level) tuples, as for play          #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+def randomEdges(rng, channel, duration, meanClear=2.0, meanObstructed=0.5, bounces=0, bounceTime=0.002):
+  edges = []
+  seconds = rng.expovariate(1.0 / meanClear)
+  level = LOW
+  while seconds < duration:
+    edges.append((seconds, channel, level))
+    #each bounce toggles the level, an even number ends on the new level
+    for bounce, offset in enumerate(sorted(rng.uniform(0, bounceTime) for bounce in range(2 * bounces))):
+      edges.append((seconds + offset, channel, level if bounce % 2 else HIGH - level))
+    seconds += bounceTime + rng.expovariate(1.0 / (meanObstructed if level == LOW else meanClear))
+    level = HIGH - level
+  return edges
+
+#------------------------------------------------------------------------------#
+# createBackend: a backend by name                                             #
+#                                                                              #
+# Parameters: name: 'rpi', 'cdev', 'sysfs' or 'simulated'                      #
+#                                                                              #
+# returnvalues: backend                                                        #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+# 1.01    hta 18.10.2026 Character device and sysfs                            #
+#------------------------------------------------------------------------------#
+def createBackend(name, **kwargs):
+  if name == 'rpi':
+    return RPiGpioBackend(**kwargs)
+  elif name == 'cdev':
+    return CdevGpioBackend(**kwargs)
+  elif name == 'sysfs':
+    return SysfsGpioBackend(**kwargs)
+  elif name == 'simulated':
+    return SimulatedGpioBackend(**kwargs)
+  raise ValueError('unknown GPIO backend['+str(name)+']')
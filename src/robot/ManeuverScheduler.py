@@ -0,0 +1,181 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the ManeuverScheduler class. Timed maneuvers (the end of
+a turn, reversing away from an obstacle) are kept in a heap ordered by their
+deadline on the monotonic clock and run by a single scheduler thread, so
+scheduling one neither starts a thread nor blocks the caller.
+
+schedule returns a Maneuver handle which can be cancelled. Once cancel returns
+the maneuver's function either has completed or will never run, so a stale
+stop cannot hit a maneuver started after the cancel. How late each function
+runs compared to its deadline is kept in a histogram.
+"""
+
+import os,sys
+import time
+import heapq
+import itertools
+import threading
+import logging, traceback
+sys.path.append(os.path.join('..','motor control'))
+import QikStatistics
+
+# clock used for deadlines
+clock = getattr(time, 'monotonic', time.time)
+
+#------------------------------------------------------------------------------#
+# Maneuver: handle of a scheduled function                                     #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class Maneuver():
+  def __init__(self, scheduler, deadline, function):
+    self.scheduler = scheduler
+    self.deadline  = deadline
+    self.function  = function
+    self.cancelled = False
+    self.done      = False
+
+  #------------------------------------------------------------------------------#
+  # cancel: make sure the function does not run, waits when it is running now    #
+  #                                                                              #
+  # returnvalues: True when cancelled before the function ran                    #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def cancel(self):
+    return self.scheduler.cancel(self)
+
+class ManeuverScheduler():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger',)
+    #guards the heap and signals the scheduler thread
+    self.condition = threading.Condition()
+    #held whilst a function runs, cancel waits for it
+    self.callbackLock = threading.RLock()
+    #(deadline, sequence, maneuver), the sequence keeps equal deadlines in order
+    self.heap = []
+    self.sequence = itertools.count()
+    #seconds functions ran after their deadline
+    self.overshoot = QikStatistics.Histogram()
+    self.scheduled = 0
+    self.cancelled = 0
+    self.running = True
+    self.thread = threading.Thread(target=self.run)
+    self.thread.name = 'MANEUVER SCHEDULER'
+    self.thread.daemon = True
+    self.thread.start()
+
+  #------------------------------------------------------------------------------#
+  # schedule: run a function after a delay                                       #
+  #                                                                              #
+  # Parameters: delay:    seconds from now                                       #
+  #             function: called without arguments from the scheduler thread     #
+  #                                                                              #
+  # returnvalues: Maneuver handle                                                #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def schedule(self, delay, function):
+    maneuver = Maneuver(self, clock() + delay, function)
+    with self.condition:
+      heapq.heappush(self.heap, (maneuver.deadline, next(self.sequence), maneuver))
+      self.scheduled += 1
+      #wake up the scheduler when this is the new earliest deadline
+      if self.heap[0][2] is maneuver:
+        self.condition.notify_all()
+    return maneuver
+
+  #------------------------------------------------------------------------------#
+  # cancel: cancel a maneuver, see Maneuver.cancel. Cancelled maneuvers stay in  #
+  #         the heap until their deadline and are skipped then                   #
+  #                                                                              #
+  # Parameters: maneuver: as returned by schedule                                #
+  #                                                                              #
+  # returnvalues: True when cancelled before the function ran                    #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def cancel(self, maneuver):
+    with self.callbackLock:
+      if maneuver.done or maneuver.cancelled:
+        return False
+      maneuver.cancelled = True
+      self.cancelled += 1
+      return True
+
+  #------------------------------------------------------------------------------#
+  # run: scheduler thread, runs the functions as their deadlines pass            #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def run(self):
+    while True:
+      with self.condition:
+        while self.running and (not self.heap or self.heap[0][0] > clock()):
+          self.condition.wait(self.heap[0][0] - clock() if self.heap else None)
+        if not self.running:
+          break
+        deadline, sequence, maneuver = heapq.heappop(self.heap)
+      with self.callbackLock:
+        if maneuver.cancelled:
+          continue
+        self.overshoot.add(clock() - deadline)
+        try:
+          maneuver.function()
+        except Exception:
+          self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
+        maneuver.done = True
+
+  #------------------------------------------------------------------------------#
+  # getStatistics: maneuver counts and how late functions ran                    #
+  #                                                                              #
+  # returnvalues: dictionary                                                     #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getStatistics(self):
+    with self.callbackLock:
+      return dict(scheduled=self.scheduled,
+                  cancelled=self.cancelled,
+                  overshoot=self.overshoot.snapshot())
+
+  #------------------------------------------------------------------------------#
+  # close: stop the scheduler thread, maneuvers not yet due are dropped          #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def close(self):
+    with self.condition:
+      self.running = False
+      self.condition.notify_all()
+    self.thread.join()
@@ -19,38 +19,107 @@
 """
 This module implements the ObstructionSensor class. The obstruction sensor is 
 attached to the front of the robot and interfaces as an input on channel 4 of 
-the GPIO with the raspberry PI, using the RPi.GPIO module.
+the GPIO with the raspberry PI, using the RPi.GPIO module through a GPIO
+backend (see GpioBackend), or a simulated input. Sensors on other channels
+(sides, rear) are grouped by ObstructionSensorArray.
+
+Optionally a reflex is called straight from the GPIO callback when an
+obstruction is detected, before anything is logged or any listener is called,
+and the time from the edge callback to the reflex having written its command
+is kept in a histogram.
+
+Edges are debounced. The first edge changing the state is taken straight
+away, after a change further edges are only recorded for debounceTime
+seconds. The sensor is only reported clear once the pin has stayed high for
+clearDelay seconds, so a sensor bouncing around its threshold does not make
+roving flap between driving and evading. When edges are held back the pin is
+read again once the quiet time has passed. Listeners, the reflex and the log
+only see the debounced changes. Only the reflex runs with the sensor's lock
+held, listeners are called after it is released, one change at a time in the
+order the changes were made. Every raw edge is kept with its timestamp in a
+preallocated ring buffer.
+
+The debounced changes are kept in a SensorHistory as well, giving rolling
+statistics such as the duty cycle and the mean time an obstacle stays in view.
+
+When given a SensorEventBus the sensor publishes its raw edges and changes of
+state on it, subscribers then get them without polling the obstructed flag.
 
 ..http://sourceforge.net/p/raspberry-gpio-python/wiki/Home/
 """
 
 import sys,os,time
+import array
+import collections
+import threading
 import logging
-import RPi.GPIO as GPIO
 sys.path.append(os.path.join("..","configuration"))
 sys.path.append(os.path.join("..","motor control"))
 import Configuration
+import QikStatistics
+import GpioBackend
+import SensorEventBus
+import SensorHistory
 
 class ObstructionSensor():
   def __init__(self,**kwargs):
     #set our logger
     self.logger = kwargs.get('logger',)
-    #which channel is the sensor attached to
-    self.channel = int(kwargs.get('obstructionSensorFront'))
+    #which channel is the sensor attached to, the front sensor's by default
+    self.channel = int(kwargs.get('channel', kwargs.get('obstructionSensorFront')))
+    #name of the sensor in published events
+    self.name = kwargs.get('name') or 'FRONT'
+    #edges and changes of state are published here, when given
+    self.sensorBus = kwargs.get('sensorBus')
     #define obstructed flag    
     self.obstructed = None
-    #use Broadcom Pin numbers
-    GPIO.setmode(GPIO.BCM)
+    #functions called with the obstructed flag on every edge
+    self.listeners = []
+    #called first thing when an obstruction is detected, see setReflex
+    self.reflex = None
+    #seconds from edge callback to reflex command written
+    self.reflexLatency = QikStatistics.Histogram()
+    #seconds edges are ignored after a change of state
+    self.debounceTime = float(kwargs.get('debounceTime') or 0)
+    #seconds the pin must be high before the sensor is clear
+    self.clearDelay = float(kwargs.get('clearDelay') or 0)
+    #guards the state, callback and settle timer thread
+    self.lock = threading.RLock()
+    #changes of state the listeners have not been called with yet, the
+    #listeners are called by one thread at a time holding listenerLock
+    self.pendingChanges = collections.deque()
+    self.listenerLock = threading.Lock()
+    #time of the last change of state and of the last raw edge
+    self.lastChange = None
+    self.lastEdge = None
+    #reads the pin again once edges have been held back
+    self.settleTimer = None
+    #ring buffer of raw edges, time and pin level
+    self.edgeBufferSize = int(kwargs.get('edgeBufferSize') or 256)
+    self.edgeTimes = array.array('d', bytes(8 * self.edgeBufferSize))
+    self.edgeLevels = array.array('b', bytes(self.edgeBufferSize))
+    self.edgeIndex = 0
+    self.rawEdges = 0
+    self.changes = 0
+    #the latest debounced changes with rolling statistics
+    self.history = SensorHistory.SensorHistory(size=kwargs.get('historySize'))
+    #GPIO backend, or the name of one, RPi.GPIO by default. A backend given
+    #may be shared with other sensors and is not cleaned up by this one
+    self.gpio = kwargs.get('gpioBackend') or 'rpi'
+    self.ownBackend = isinstance(self.gpio, str)
+    if self.ownBackend:
+      self.gpio = GpioBackend.createBackend(self.gpio, **kwargs)
     #as long as output is high, no obstruction detected
-    GPIO.setup(self.channel, GPIO.IN, pull_up_down = GPIO.PUD_UP)
+    self.gpio.setupInput(self.channel, pullUp=True)
     #initialize state of sensor
     self.do_edge(self.channel)
     #add event to detect falling edge i.e. obstruction detected
     #and to also detect rising edge i.e. no obstruction detected
-    GPIO.add_event_detect(self.channel, GPIO.BOTH, callback=self.do_edge)
+    self.gpio.addEdgeCallback(self.channel, self.do_edge)
   #------------------------------------------------------------------------------#
   # do_edge: This function called when either a rising or a falling edge is      #
-  #          is detected on our sensor channel                                   #
+  #          is detected on our sensor channel. The edge is recorded and the     #
+  #          state changed when debouncing allows                                #
   #                                                                              #
   # paramteres:  channel: the GPIO channel on wich the edge was detected         #
   #                                                                              #
@@ -58,14 +127,199 @@ class ObstructionSensor():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Call listeners                                        #
+  # 1.02    hta 18.10.2026 Reflex                                                #
+  # 1.03    hta 18.10.2026 Debounced, edges recorded in ring buffer              #
+  # 1.04    hta 18.10.2026 GPIO backend                                          #
+  # 1.05    hta 18.10.2026 Publish edges                                         #
+  # 1.06    hta 18.10.2026 Listeners called without the lock held                #
   #------------------------------------------------------------------------------#     
   def do_edge(self,channel):
-    if GPIO.input(self.channel) == GPIO.LOW:
-      self.logger.debug('setting obstructed to True')
-      self.obstructed=True
-    else:
-      self.logger.debug('setting obstructed to False')
-      self.obstructed=False
+    edgeTime=QikStatistics.clock()
+    level=self.gpio.read(self.channel)
+    with self.lock:
+      #record the raw edge, no allocation
+      self.edgeTimes[self.edgeIndex]=edgeTime
+      self.edgeLevels[self.edgeIndex]=level
+      self.edgeIndex=(self.edgeIndex+1) % self.edgeBufferSize
+      self.rawEdges+=1
+      self.lastEdge=edgeTime
+      if self.sensorBus is not None:
+        self.sensorBus.publish(self.name, SensorEventBus.EDGE, level == GpioBackend.LOW, edgeTime)
+      self.evaluate(edgeTime, level)
+    self.notifyListeners()
+
+  #------------------------------------------------------------------------------#
+  # evaluate: change state when the pin level differs from it and the debounce   #
+  #           time and clear delay have passed, read the pin again later when    #
+  #           they have not. Must be called with the lock held, the listeners    #
+  #           are called by notifyListeners once it is released                  #
+  #                                                                              #
+  # paramteres:  now:   clock reading                                            #
+  #              level: pin level read at that time                              #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 GPIO backend                                          #
+  # 1.02    hta 18.10.2026 Publish changes of state                              #
+  # 1.03    hta 18.10.2026 Changes kept in history                               #
+  # 1.04    hta 18.10.2026 Listeners called by notifyListeners                   #
+  #------------------------------------------------------------------------------#
+  def evaluate(self, now, level):
+    obstructed = level == GpioBackend.LOW
+    if obstructed == self.obstructed:
+      return
+    if self.lastChange is not None:
+      changeAt = self.lastChange + self.debounceTime
+      if not obstructed:
+        changeAt = max(changeAt, self.lastEdge + self.clearDelay)
+      if now < changeAt:
+        if self.settleTimer is None:
+          self.settleTimer = threading.Timer(changeAt - now, self.settle)
+          self.settleTimer.name = 'SENSOR SETTLE'
+          self.settleTimer.daemon = True
+          self.settleTimer.start()
+        return
+    if obstructed:
+      #the reflex goes ahead of everything else
+      if self.reflex is not None and self.reflex():
+        self.reflexLatency.add(QikStatistics.clock()-self.lastEdge)
+    self.obstructed=obstructed
+    self.lastChange=now
+    self.changes+=1
+    self.history.record(now, obstructed)
+    if self.sensorBus is not None:
+      self.sensorBus.publish(self.name, SensorEventBus.STATE, obstructed, now)
+    self.logger.debug('setting obstructed to '+str(obstructed))
+    self.pendingChanges.append(obstructed)
+
+  #------------------------------------------------------------------------------#
+  # notifyListeners: call the listeners with the changes of state made since the #
+  #                  last call, in order. Must be called without the lock held   #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version, taken from evaluate                  #
+  #------------------------------------------------------------------------------#
+  def notifyListeners(self):
+    with self.listenerLock:
+      while True:
+        with self.lock:
+          if not self.pendingChanges:
+            return
+          obstructed = self.pendingChanges.popleft()
+          listeners = list(self.listeners)
+        for listener in listeners:
+          listener(obstructed)
+
+  #------------------------------------------------------------------------------#
+  # settle: settle timer, reads the pin again once edges were held back          #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 GPIO backend                                          #
+  # 1.02    hta 18.10.2026 Listeners called without the lock held                #
+  #------------------------------------------------------------------------------#
+  def settle(self):
+    with self.lock:
+      self.settleTimer = None
+      self.evaluate(QikStatistics.clock(), self.gpio.read(self.channel))
+    self.notifyListeners()
+
+  #------------------------------------------------------------------------------#
+  # getEdges: the raw edges still in the ring buffer, oldest first               #
+  #                                                                              #
+  # returnvalues: list of (clock reading, pin level) tuples                      #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getEdges(self):
+    with self.lock:
+      count = min(self.rawEdges, self.edgeBufferSize)
+      first = self.edgeIndex - count
+      return [(self.edgeTimes[index % self.edgeBufferSize], self.edgeLevels[index % self.edgeBufferSize])
+              for index in range(first, first + count)]
+
+  #------------------------------------------------------------------------------#
+  # getEdgeCounts: raw edges seen and debounced changes of state                 #
+  #                                                                              #
+  # returnvalues: dictionary                                                     #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getEdgeCounts(self):
+    with self.lock:
+      return dict(rawEdges=self.rawEdges, changes=self.changes)
+
+  #------------------------------------------------------------------------------#
+  # getHistoryStatistics: rolling statistics of the debounced changes and the    #
+  #                       rate of raw edges over the edges in the ring buffer    #
+  #                                                                              #
+  # returnvalues: dictionary as returned by SensorHistory.getStatistics with     #
+  #               edgeRate added, None before the first change                   #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getHistoryStatistics(self):
+    now = QikStatistics.clock()
+    with self.lock:
+      statistics = self.history.getStatistics(now)
+      if statistics is not None:
+        count = min(self.rawEdges, self.edgeBufferSize)
+        oldest = self.edgeTimes[(self.edgeIndex - count) % self.edgeBufferSize]
+        statistics['edgeRate'] = count / (now - oldest) if count and now > oldest else None
+      return statistics
+
+  #------------------------------------------------------------------------------#
+  # addListener: have a function called on every edge, rather than polling the   #
+  #              obstructed flag                                                 #
+  #                                                                              #
+  # paramteres:  listener: function called with the obstructed flag, from the    #
+  #                        GPIO callback thread (without the sensor's lock       #
+  #                        held) so it must return quickly                       #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def addListener(self, listener):
+    self.listeners.append(listener)
+
+  #------------------------------------------------------------------------------#
+  # setReflex: have a function called straight from the GPIO callback when an    #
+  #            obstruction is detected, ahead of logging and listeners           #
+  #                                                                              #
+  # paramteres:  reflex: function without arguments returning True when it has   #
+  #                      written a command, the time taken is recorded then.     #
+  #                      None to remove the reflex                               #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def setReflex(self, reflex):
+    self.reflex = reflex
+
+  #------------------------------------------------------------------------------#
+  # getReflexLatency: time from edge callback to reflex command written          #
+  #                                                                              #
+  # returnvalues: dictionary as returned by QikStatistics.Histogram.snapshot     #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getReflexLatency(self):
+    return self.reflexLatency.snapshot()
       
   #------------------------------------------------------------------------------#
   # cleanUp: Houskeeping, release the resources we used                          #
@@ -77,10 +331,17 @@ class ObstructionSensor():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Cancel settle timer                                   #
+  # 1.02    hta 18.10.2026 GPIO backend                                          #
+  # 1.03    hta 18.10.2026 Shared backend left to its owner                      #
   #------------------------------------------------------------------------------#        
   def cleanUp(self):  
-    GPIO.remove_event_detect(self.channel)
-    GPIO.cleanup()
+    self.gpio.removeEdgeCallback(self.channel)
+    with self.lock:
+      if self.settleTimer is not None:
+        self.settleTimer.cancel()
+    if self.ownBackend:
+      self.gpio.cleanUp()
     
 def main():
   ########################
@@ -90,6 +351,10 @@ def main():
   config=Configuration.general_configuration();
   #get sensor parameters
   obstructionSensorFront = Configuration.CONFIG['ObstructionSensors']['FRONT']  
+  gpioBackend            = Configuration.CONFIG['ObstructionSensors'].get('GPIO_BACKEND', 'rpi')
+  historySize            = Configuration.CONFIG['ObstructionSensors'].get('HISTORY_SIZE', '64')
+  gpioChip               = Configuration.CONFIG['ObstructionSensors'].get('GPIO_CHIP', '/dev/gpiochip0')
+  sysfsBase              = Configuration.CONFIG['ObstructionSensors'].get('GPIO_SYSFS_BASE', '0')
 
   ###############
   #SETUP LOGGING#
@@ -103,7 +368,9 @@ def main():
   logger =  logging.getLogger(LOGGER) 
 
   #go start application server
-  mySensor = ObstructionSensor(logger=logger, obstructionSensorFront=int(obstructionSensorFront))
+  mySensor = ObstructionSensor(logger=logger, obstructionSensorFront=int(obstructionSensorFront),
+                               gpioBackend=gpioBackend, gpioChip=gpioChip, sysfsBase=sysfsBase,
+                               historySize=historySize)
   
   while True:
     logger.debug('mySensor.obstructed['+str(mySensor.obstructed)+']')
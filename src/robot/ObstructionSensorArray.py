@@ -0,0 +1,201 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the ObstructionSensorArray class, any number of
+obstruction sensors (front, sides, rear) sharing one GPIO backend. With the
+'cdev' or 'sysfs' backend all sensors are watched by a single thread waiting
+on an epoll object, rather than by a callback thread per pin.
+
+Every sensor is an ObstructionSensor, debounced as a single sensor is, and
+publishes on the SensorEventBus given, if any, under its name. Every sensor
+has a bit in the snapshot, bit n for the n-th sensor of the array, set while
+it is obstructed. The snapshot is a plain int replaced as a whole whenever a
+sensor changes state, so a reader always gets the state of every sensor at
+one moment without taking a lock.
+"""
+
+import sys,os,time
+import collections
+import threading
+import logging
+sys.path.append(os.path.join("..","configuration"))
+import Configuration
+import ObstructionSensor
+import GpioBackend
+
+class ObstructionSensorArray():
+  def __init__(self,**kwargs):
+    #set our logger
+    self.logger = kwargs.get('logger',)
+    #sensor name and channel, in bit order
+    self.channels = collections.OrderedDict(kwargs.get('obstructionSensors') or
+                                            [('FRONT', kwargs.get('obstructionSensorFront'))])
+    #bit of each sensor in the snapshot
+    self.bits = collections.OrderedDict((name, 1 << index) for index, name in enumerate(self.channels))
+    #functions called with name, obstructed flag and snapshot on every change
+    self.listeners = []
+    #serializes snapshot updates, readers do not need it
+    self.lock = threading.Lock()
+    #one backend for all sensors, made here when given by name
+    self.gpio = kwargs.get('gpioBackend') or 'rpi'
+    self.ownBackend = isinstance(self.gpio, str)
+    if self.ownBackend:
+      self.gpio = GpioBackend.createBackend(self.gpio, **kwargs)
+    sensorKwargs = dict(kwargs, gpioBackend=self.gpio)
+    self.sensors = collections.OrderedDict()
+    for name, channel in self.channels.items():
+      sensorKwargs.update(channel=channel, name=name)
+      self.sensors[name] = ObstructionSensor.ObstructionSensor(**sensorKwargs)
+    self.snapshot = 0
+    for name, sensor in self.sensors.items():
+      sensor.addListener(lambda obstructed, name=name: self.sensorChanged(name, obstructed))
+      if sensor.obstructed:
+        self.snapshot |= self.bits[name]
+
+  #------------------------------------------------------------------------------#
+  # sensorChanged: update the snapshot when a sensor changed state and tell the  #
+  #                listeners, called from the GPIO callback thread               #
+  #                                                                              #
+  # paramteres:  name:       name of the sensor                                  #
+  #              obstructed: its new state                                       #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def sensorChanged(self, name, obstructed):
+    with self.lock:
+      if obstructed:
+        snapshot = self.snapshot | self.bits[name]
+      else:
+        snapshot = self.snapshot & ~self.bits[name]
+      #a single assignment, readers see the old or the new snapshot
+      self.snapshot = snapshot
+    for listener in self.listeners:
+      listener(name, obstructed, snapshot)
+
+  #------------------------------------------------------------------------------#
+  # getSnapshot: state of all sensors at one moment                              #
+  #                                                                              #
+  # returnvalues: int with the bit of every obstructed sensor set                #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getSnapshot(self):
+    return self.snapshot
+
+  #------------------------------------------------------------------------------#
+  # getObstructed: names of the obstructed sensors                               #
+  #                                                                              #
+  # paramteres:  snapshot: as returned by getSnapshot, None for the current one  #
+  #                                                                              #
+  # returnvalues: list of names                                                  #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getObstructed(self, snapshot=None):
+    if snapshot is None:
+      snapshot = self.snapshot
+    return [name for name, bit in self.bits.items() if snapshot & bit]
+
+  def getSensor(self, name):
+    return self.sensors[name]
+
+  #------------------------------------------------------------------------------#
+  # addListener: have a function called whenever a sensor changes state          #
+  #                                                                              #
+  # paramteres:  listener: function called with the sensor name, its obstructed  #
+  #                        flag and the snapshot after the change, from the GPIO #
+  #                        callback thread so it must return quickly             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def addListener(self, listener):
+    self.listeners.append(listener)
+
+  #------------------------------------------------------------------------------#
+  # cleanUp: Houskeeping, release the sensors and the backend                    #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def cleanUp(self):
+    for sensor in self.sensors.values():
+      sensor.cleanUp()
+    if self.ownBackend:
+      self.gpio.cleanUp()
+
+#------------------------------------------------------------------------------#
+# sensorChannels: the sensors named in the SENSORS list of a configuration     #
+#                 section with their channels                                  #
+#                                                                              #
+# paramteres:  section: configuration section, e.g. ObstructionSensors         #
+#                                                                              #
+# returnvalues: list of (name, channel) tuples                                 #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+def sensorChannels(section):
+  names = [name.strip().upper() for name in section.get('SENSORS', 'FRONT').split(',') if name.strip()]
+  return [(name, int(section[name])) for name in names]
+
+def main():
+  ########################
+  #GENERAL CONFIGURATION #
+  ########################
+  #load config
+  config=Configuration.general_configuration();
+  #get sensor parameters
+  section     = Configuration.CONFIG['ObstructionSensors']
+  gpioBackend = section.get('GPIO_BACKEND', 'rpi')
+
+  ###############
+  #SETUP LOGGING#
+  ###############
+  LOGGER = 'ObstructionSensor'
+  #load logging configuration
+  Configuration.logging_configuration();
+  #configure logger as per configuration
+  Configuration.init_log(LOGGER);
+  #create logger
+  logger =  logging.getLogger(LOGGER)
+
+  mySensors = ObstructionSensorArray(logger=logger, obstructionSensors=sensorChannels(section),
+                                     gpioBackend=gpioBackend,
+                                     gpioChip=section.get('GPIO_CHIP', '/dev/gpiochip0'),
+                                     sysfsBase=section.get('GPIO_SYSFS_BASE', '0'),
+                                     debounceTime=section.get('DEBOUNCE_TIME', '0'),
+                                     clearDelay=section.get('CLEAR_DELAY', '0'))
+
+  while True:
+    logger.debug('obstructed['+', '.join(mySensors.getObstructed())+']')
+    time.sleep(.5)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,297 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module defines an alternative runtime for the PololuRobot application in
+which everything runs on a single asyncio event loop:
+
+ - the motor controller is an AsyncQik, serial writes and replies are handled
+   by the event loop on the non-blocking serial port
+ - timed maneuvers are call_later handles on the event loop
+ - sensor edges are handed from the GPIO callback thread to the event loop
+ - roving is a task which waits for sensor edges and completed maneuvers
+ - the web control application (WSGI) is served by an asyncio HTTP server
+
+So robot state is only ever touched from the event loop thread and commands
+reach the controller in the order they were given. PololuAsyncRobot reuses the
+driving and evading logic of PololuRobot.
+
+To start the application with this runtime
+  cd src/robot; sudo python3 PololuAsyncRobot.py
+"""
+
+import sys,os
+import io
+import time
+import asyncio
+import threading
+import collections
+import logging, traceback
+sys.path.append(os.path.join('..','motor control'))
+sys.path.append(os.path.join('..','web control'))
+sys.path.append(os.path.join('..','configuration'))
+import PololuRobot, ObstructionSensorArray, PololuRobotWebControl
+import AsyncQik
+
+# largest request head and body we accept from a web client
+MAX_REQUEST_SIZE = 65536
+
+class PololuAsyncRobot(PololuRobot.PololuRobot):
+  def __init__(self, loop=None):
+    self.loop=loop or asyncio.new_event_loop()
+    self.timer=None
+    #seconds spent per startup step, in the order the steps finished
+    self.startupTimes=collections.OrderedDict()
+    self.startupLock=threading.Lock()
+    self.startupBegin=time.time()
+    #load configuration
+    self.kwargs=self.timeStartup('config', self.loadConfig)
+    self.logger=self.timeStartup('logging', self.setupLogging)
+    self.kwargs.update(loop=self.loop)
+    #set by start
+    self.sensors=None
+    self.sensorFront=None
+    self.motorControl=None
+    #not available in this runtime, the event loop serializes motor commands
+    self.healthMonitor=None
+    self.speedRamp=None
+    self.commandArbiter=None
+    self.motorCommands=None
+    #sensor edges are handed to the event loop directly
+    self.sensorBus=None
+    self.controllerHealth=None
+    #initialize initial speed
+    self.setDriveSpeed=30
+    #initially the robot is stopped
+    self.stopped=True
+    #roving mode can be chosen from web application
+    self.isRoving=False
+    #evading action (whilst roving)
+    self.isEvading=False
+    #evades started, evades completed and reverses repeated within an evade
+    #because the obstacle was still seen, counted where they happen
+    self.evades=0
+    self.evadesCompleted=0
+    self.repeatedReverses=0
+    #not driving forwards or backwards now
+    self.drivingForwards=False
+    self.drivingBackwards=False
+    #wakes up the roving task, created on the event loop by start
+    self.roverWakeup=None
+    self.rovingTask=None
+
+  #------------------------------------------------------------------------------#
+  # start: bring up the motor controller and the sensor, a coroutine. The sensor #
+  #        is set up whilst we wait for the controller to answer                 #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Motor commands                                        #
+  #------------------------------------------------------------------------------#
+  async def start(self):
+    start=time.time()
+    self.roverWakeup=asyncio.Event()
+    self.motorControl=AsyncQik.AsyncQik(**self.kwargs)
+    #commands are written in the order the event loop runs them
+    self.motorCommands=self.motorControl
+    ready=asyncio.ensure_future(self.motorControl.waitUntilReady())
+    self.timeStartup('obstructionSensor', self.startSensor)
+    await ready
+    self.startupTimes['motorControl']=time.time()-start
+
+  #------------------------------------------------------------------------------#
+  # startSensor: set up the obstruction sensors, the front sensor's edges are    #
+  #              handed over to the event loop                                   #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Sensor array                                          #
+  #------------------------------------------------------------------------------#
+  def startSensor(self):
+    self.sensors=ObstructionSensorArray.ObstructionSensorArray(**self.kwargs)
+    self.sensorFront=self.sensors.getSensor('FRONT')
+    self.sensorFront.addListener(
+      lambda obstructed: self.loop.call_soon_threadsafe(self.sensorChanged, obstructed))
+
+  #------------------------------------------------------------------------------#
+  # notifyRover: wake up the roving task                                         #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def notifyRover(self):
+    if self.roverWakeup is not None:
+      self.roverWakeup.set()
+
+  #------------------------------------------------------------------------------#
+  # callback: call function after time seconds, from the event loop              #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def callback(self,function,time):
+    if time > 0:
+      self.timer = self.loop.call_later(time,function)
+
+  def getManeuverStatistics(self):
+    return None
+
+  #------------------------------------------------------------------------------#
+  # runRoving: start the roving task                                             #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def runRoving(self):
+    if not self.isRoving:
+      self.isRoving=True
+      self.rovingTask=asyncio.ensure_future(self.roving())
+
+  #------------------------------------------------------------------------------#
+  # roving: Drive around and avoid collisions, a coroutine waiting for sensor    #
+  #         edges and completed maneuvers                                        #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  async def roving(self):
+    self.isEvading=False
+    self.stop()
+    action=None
+    while self.isRoving:
+      self.roverWakeup.clear()
+      action=self.rovingStep(action)
+      if self.isRoving:
+        await self.roverWakeup.wait()
+    self.logger.info('leaving roving')
+
+  #------------------------------------------------------------------------------#
+  # handleRequest: serve one HTTP request with the WSGI application, a coroutine #
+  #                                                                              #
+  # paramteres: app:    WSGI application                                         #
+  #             reader: asyncio StreamReader of the connection                   #
+  #             writer: asyncio StreamWriter of the connection                   #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  async def handleRequest(self, app, reader, writer):
+    try:
+      head=await reader.readuntil(b'\r\n\r\n')
+      if len(head) > MAX_REQUEST_SIZE:
+        return
+      lines=head.decode('latin-1').split('\r\n')
+      method, target, protocol=lines[0].split(' ', 2)
+      path, _, query=target.partition('?')
+      environ={'REQUEST_METHOD':method, 'SCRIPT_NAME':'', 'PATH_INFO':path,
+               'QUERY_STRING':query, 'SERVER_PROTOCOL':protocol,
+               'SERVER_NAME':str(self.kwargs.get('webServerIp')),
+               'SERVER_PORT':str(self.kwargs.get('webServerPort')),
+               'wsgi.version':(1,0), 'wsgi.url_scheme':'http', 'wsgi.errors':sys.stderr,
+               'wsgi.multithread':False, 'wsgi.multiprocess':False, 'wsgi.run_once':False}
+      for line in lines[1:]:
+        if ':' in line:
+          name, value=line.split(':', 1)
+          name=name.strip().upper().replace('-', '_')
+          if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name]=value.strip()
+          else:
+            environ['HTTP_'+name]=value.strip()
+      length=min(int(environ.get('CONTENT_LENGTH') or 0), MAX_REQUEST_SIZE)
+      environ['wsgi.input']=io.BytesIO(await reader.readexactly(length) if length else b'')
+      response=[]
+      def start_response(status, headers, exc_info=None):
+        response[:]=[status, headers]
+      body=b''.join(app(environ, start_response))
+      status, headers=response
+      head='HTTP/1.0 '+status+'\r\n'+''.join(name+': '+value+'\r\n' for name, value in headers)+'Connection: close\r\n\r\n'
+      writer.write(head.encode('latin-1')+body)
+      await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+      None
+    except Exception:
+      self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
+      writer.write(b'HTTP/1.0 500 Internal Server Error\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+    finally:
+      writer.close()
+
+  #------------------------------------------------------------------------------#
+  # run: start everything and serve the web control application until stopped,   #
+  #      a coroutine                                                             #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  async def run(self):
+    await self.start()
+    kwargs=self.kwargs
+    kwargs.update(robot=self)
+    app=PololuRobotWebControl.PololuRobotWebControlApp(**kwargs)
+    start=time.time()
+    server=await asyncio.start_server(lambda reader, writer: self.handleRequest(app, reader, writer),
+                                      str(kwargs.get('webServerIp')), int(kwargs.get('webServerPort')))
+    self.startupTimes['webServer']=time.time()-start
+    self.logger.debug('webServerIp['+str(self.kwargs.get('webServerIp'))+'] webServerPort['+ str(self.kwargs.get('webServerPort')) +']')
+    self.logger.info('startup times['+', '.join(name+' '+'{:.3f}'.format(seconds)+'s' for name, seconds in self.getStartupReport().items())+']')
+    try:
+      await asyncio.Event().wait()
+    finally:
+      server.close()
+
+  #------------------------------------------------------------------------------#
+  # main: run the event loop until interrupted, then stop the robot              #
+  #                                                                              #
+  # returnvalues: 0                                                              #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Clean up all sensors                                  #
+  #------------------------------------------------------------------------------#
+  def main(self):
+    asyncio.set_event_loop(self.loop)
+    try:
+      self.loop.run_until_complete(self.run())
+    except (KeyboardInterrupt):
+      None
+    finally:
+      self.isRoving=False
+      try:
+        if self.motorControl is not None:
+          self.stop()
+          self.motorControl.close()
+      except Exception as e:
+        logging.error(str(traceback.format_exc()))
+      try:
+        if self.sensors is not None:
+          self.sensors.cleanUp()
+      except Exception as e:
+        logging.error(str(traceback.format_exc()))
+      self.loop.close()
+    return 0
+
+if __name__ == '__main__':
+    main=PololuAsyncRobot()
+    sys.exit(main())
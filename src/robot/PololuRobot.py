@@ -30,28 +30,67 @@ import time
 import logging, traceback
 import random
 import threading
+import collections
 from wsgiref.simple_server import make_server
 sys.path.append(os.path.join('..','motor control'))
 sys.path.append(os.path.join('..','web control'))
 sys.path.append(os.path.join('..','configuration'))
 import PololuQik, Configuration, ObstructionSensor, PololuRobotWebControl    
+import ObstructionSensorArray
+import SensorEventBus
+import QikHealthMonitor
+import SpeedRamp
+import ManeuverScheduler
+import CommandArbiter
 
 #tuple defining "radius" of a curve by specifying the percentage of the
 #speed of the inner and the outer track (e.g. when turning left the left 
 #track is the inner track and should turn slower than the outer track
 #to accomplish a left turn)
 DFLT_RADIUS=(0.4,1.0)
+#adaptive reverse: reverse for this many times the mean time obstacles stay
+#in view of the front sensor, once ADAPTIVE_MIN_SAMPLES obstacles have been
+#seen, but for at least MIN_REVERSE_FRACTION of the fixed reverse time
+REVERSE_MARGIN=4.0
+MIN_REVERSE_FRACTION=0.75
+ADAPTIVE_MIN_SAMPLES=3
     
 class PololuRobot():
   def __init__(self):
     self.timer=None
+    #seconds spent per startup step, in the order the steps finished
+    self.startupTimes=collections.OrderedDict()
+    self.startupLock=threading.Lock()
+    self.startupBegin=time.time()
     #load configuration
-    self.kwargs=self.loadConfig()
-    self.logger=self.setupLogging()
-    #there is one obstruction sensor at the front of the robot
-    self.sensorFront=ObstructionSensor.ObstructionSensor(**self.kwargs)
-    #we have one motor controller for both motors
-    self.motorControl=PololuQik.PololuQik(**self.kwargs)
+    self.kwargs=self.timeStartup('config', self.loadConfig)
+    self.logger=self.timeStartup('logging', self.setupLogging)
+    #wakes up the roving thread, counts the events it has not seen yet
+    self.roverCondition=threading.Condition()
+    self.roverEvents=0
+    #web requests are served concurrently, only one of them starts roving
+    self.rovingLock=threading.Lock()
+    self.rovingThread=None
+    #ends timed maneuvers (turns, reversing) from a single thread
+    self.scheduler=ManeuverScheduler.ManeuverScheduler(logger=self.logger)
+    #the sensors publish their edges and changes of state here
+    self.sensorBus=SensorEventBus.SensorEventBus(logger=self.logger)
+    self.kwargs.update(sensorBus=self.sensorBus)
+    #the sensor and the motor controller do not depend on each other
+    #so they are brought up in parallel
+    #all obstruction sensors, roving drives by the front one
+    self.sensors=None
+    self.sensorFront=None
+    self.motorControl=None
+    self.healthMonitor=None
+    self.speedRamp=None
+    #motor commands go to the arbiter when enabled, to motorControl otherwise
+    self.commandArbiter=None
+    self.motorCommands=None
+    self.startInParallel(('obstructionSensor', self.startSensor),
+                         ('motorControl', self.startMotorControl))
+    #error counts last published by the health monitor
+    self.controllerHealth=None
     #initialize initial speed
     self.setDriveSpeed=30
     #initially the robot is stopped
@@ -60,9 +99,143 @@ class PololuRobot():
     self.isRoving=False
     #evading action (whilst roving)
     self.isEvading=False
+    #evades started, evades completed and reverses repeated within an evade
+    #because the obstacle was still seen, counted where they happen
+    self.evades=0
+    self.evadesCompleted=0
+    self.repeatedReverses=0
     #not driving forwards or backwards now
     self.drivingForwards=False
     self.drivingBackwards=False
+    #optionally the sensor stops the motors itself when it sees an obstacle
+    if self.kwargs.get('reflexStop'):
+      self.sensorFront.setReflex(self.obstacleReflex)
+  #------------------------------------------------------------------------------#
+  # timeStartup: run a startup step and record how long it took                  #
+  #                                                                              #
+  # paramteres: name:     name of the step in the startup report                 #
+  #             function: the step                                               #
+  #                                                                              #
+  # returnvalues: whatever function returns                                      #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def timeStartup(self, name, function):
+    start=time.time()
+    try:
+      return function()
+    finally:
+      with self.startupLock:
+        self.startupTimes[name]=time.time()-start
+
+  #------------------------------------------------------------------------------#
+  # startInParallel: run independent startup steps each in its own thread and    #
+  #                  wait for all of them. The first error is raised once every  #
+  #                  step has finished                                           #
+  #                                                                              #
+  # paramteres: steps: (name, function) tuples                                   #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def startInParallel(self, *steps):
+    errors=[]
+    def run(name, function):
+      try:
+        self.timeStartup(name, function)
+      except Exception as e:
+        self.logger.error('startup of ['+name+'] failed['+  str(traceback.format_exc()) +']')
+        errors.append(e)
+    threads=[]
+    for name, function in steps:
+      thread=threading.Thread(target=run, args=(name, function))
+      thread.name='STARTUP '+name
+      thread.start()
+      threads.append(thread)
+    for thread in threads:
+      thread.join()
+    if errors:
+      raise errors[0]
+
+  #------------------------------------------------------------------------------#
+  # startSensor: set up the obstruction sensors                                  #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version, taken from __init__                  #
+  # 1.01    hta 18.10.2026 Notify roving of sensor edges                         #
+  # 1.02    hta 18.10.2026 Sensor array                                          #
+  # 1.03    hta 18.10.2026 Roving woken through the sensor bus                   #
+  # 1.04    hta 18.10.2026 Safety stop through the sensor bus                    #
+  #------------------------------------------------------------------------------#
+  def startSensor(self):
+    #the sensors configured, at least the one at the front of the robot
+    self.sensors=ObstructionSensorArray.ObstructionSensorArray(**self.kwargs)
+    self.sensorFront=self.sensors.getSensor('FRONT')
+    #the safety stop waits for the arbiter and the serial port, so it is made
+    #by a subscriber of its own rather than from the GPIO callback thread,
+    #which only runs the reflex. Roving is woken by another subscriber
+    self.sensorBus.subscribe('safety', handler=lambda event: self.sensorChanged(event.obstructed),
+                             sensors=('FRONT',), maxSize=8)
+    self.sensorBus.subscribe('roving', handler=lambda event: self.notifyRover(),
+                             sensors=('FRONT',), maxSize=8)
+
+  #------------------------------------------------------------------------------#
+  # startMotorControl: open the motor controller, returns once it answers        #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version, taken from __init__                  #
+  # 1.01    hta 18.10.2026 Speed ramp                                            #
+  # 1.02    hta 18.10.2026 Command arbiter                                       #
+  #------------------------------------------------------------------------------#
+  def startMotorControl(self):
+    #we have one motor controller for both motors
+    self.motorControl=PololuQik.PololuQik(**self.kwargs)
+    self.motorCommands=self.motorControl
+    #optionally commands from web control, roving and the sensor are arbitrated
+    if self.kwargs.get('commandArbiter'):
+      self.commandArbiter=CommandArbiter.CommandArbiter(logger=self.logger,
+                                                        controller=self.motorControl,
+                                                        priority=self.commandPriority)
+      self.motorCommands=self.commandArbiter
+    #optionally the controller's error byte is watched in the background
+    if self.kwargs.get('healthMonitor'):
+      self.healthMonitor=QikHealthMonitor.QikHealthMonitor(logger=self.logger, 
+                                                           controller=self.motorControl,
+                                                           minInterval=self.kwargs.get('healthMinInterval'),
+                                                           maxInterval=self.kwargs.get('healthMaxInterval'),
+                                                           listener=self.controllerError)
+    #optionally the motors are ramped towards their speed rather than jumping to it
+    if float(self.kwargs.get('rampRate') or 0) > 0:
+      self.speedRamp=SpeedRamp.SpeedRamp(logger=self.logger,
+                                         controller=self.motorCommands,
+                                         rate=self.kwargs.get('rampRate'),
+                                         tickInterval=self.kwargs.get('rampTickInterval'))
+
+  #------------------------------------------------------------------------------#
+  # getStartupReport: where the time went during startup                         #
+  #                                                                              #
+  # returnvalues: dictionary with the seconds per startup step and the total     #
+  #               seconds since the robot object was created                     #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getStartupReport(self):
+    with self.startupLock:
+      report=collections.OrderedDict(self.startupTimes)
+    if self.motorControl is not None and self.motorControl.startupTime is not None:
+      #part of motorControl, waiting for the controller to answer
+      report['motorControlReady']=self.motorControl.startupTime
+    report['total']=time.time()-self.startupBegin
+    return report
+
   #------------------------------------------------------------------------------#
   # loadConfig: loads configuration from config.ini and return values as         #
   #             keyword arguments                                                #
@@ -70,6 +243,21 @@ class PololuRobot():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Asynchronous serial writes                            #
+  # 1.02    hta 18.10.2026 Protocol and device ID                                #
+  # 1.03    hta 18.10.2026 CRC mode                                              #
+  # 1.04    hta 18.10.2026 Serial statistics                                     #
+  # 1.05    hta 18.10.2026 Reply timeout                                         #
+  # 1.06    hta 18.10.2026 Controller health monitor                             #
+  # 1.07    hta 18.10.2026 Controller startup timeout                            #
+  # 1.08    hta 18.10.2026 Command recording                                     #
+  # 1.09    hta 18.10.2026 Speed ramp                                            #
+  # 1.10    hta 18.10.2026 Command arbiter                                       #
+  # 1.11    hta 18.10.2026 Reflex stop                                           #
+  # 1.12    hta 18.10.2026 Sensor debouncing                                     #
+  # 1.13    hta 18.10.2026 GPIO backend                                          #
+  # 1.14    hta 18.10.2026 Sensor array                                          #
+  # 1.15    hta 18.10.2026 Sensor history, adaptive reverse                      #
   #------------------------------------------------------------------------------#   
   def loadConfig(self):
     ########################
@@ -84,13 +272,63 @@ class PololuRobot():
     mjpgStreamServer       = Configuration.CONFIG['PololuRobotWebControl']['MJPG_STREAM_SERVER'] 
     serialPort             = Configuration.CONFIG['PololuQik']['SERIAL_PORT']    
     baudRate               = Configuration.CONFIG['PololuQik']['BAUD_RATE']    
+    asyncWrite             = Configuration.CONFIG['PololuQik'].getboolean('ASYNC_WRITE', False)
+    writeQueueSize         = Configuration.CONFIG['PololuQik'].get('WRITE_QUEUE_SIZE', '32')
+    protocol               = Configuration.CONFIG['PololuQik'].get('PROTOCOL', 'compact')
+    deviceId               = Configuration.CONFIG['PololuQik'].get('DEVICE_ID', '9')
+    crc                    = Configuration.CONFIG['PololuQik'].getboolean('CRC', False)
+    collectStatistics      = Configuration.CONFIG['PololuQik'].getboolean('STATISTICS', False)
+    replyTimeout           = Configuration.CONFIG['PololuQik'].get('REPLY_TIMEOUT', '0.5')
+    healthMonitor          = Configuration.CONFIG['PololuQik'].getboolean('HEALTH_MONITOR', False)
+    healthMinInterval      = Configuration.CONFIG['PololuQik'].get('HEALTH_MIN_INTERVAL', '0.1')
+    healthMaxInterval      = Configuration.CONFIG['PololuQik'].get('HEALTH_MAX_INTERVAL', '5.0')
+    startupTimeout         = Configuration.CONFIG['PololuQik'].get('STARTUP_TIMEOUT', '2.0')
+    recordFile             = Configuration.CONFIG['PololuQik'].get('RECORD_FILE', '')
+    rampRate               = Configuration.CONFIG['PololuQik'].get('RAMP_RATE', '0')
+    rampTickInterval       = Configuration.CONFIG['PololuQik'].get('RAMP_TICK_INTERVAL', '0.02')
+    commandArbiter         = Configuration.CONFIG['PololuQik'].getboolean('COMMAND_ARBITER', False)
+    reflexStop             = Configuration.CONFIG['ObstructionSensors'].getboolean('REFLEX_STOP', False)
+    debounceTime           = Configuration.CONFIG['ObstructionSensors'].get('DEBOUNCE_TIME', '0')
+    clearDelay             = Configuration.CONFIG['ObstructionSensors'].get('CLEAR_DELAY', '0')
+    edgeBufferSize         = Configuration.CONFIG['ObstructionSensors'].get('EDGE_BUFFER_SIZE', '256')
+    gpioBackend            = Configuration.CONFIG['ObstructionSensors'].get('GPIO_BACKEND', 'rpi')
+    gpioChip               = Configuration.CONFIG['ObstructionSensors'].get('GPIO_CHIP', '/dev/gpiochip0')
+    sysfsBase              = Configuration.CONFIG['ObstructionSensors'].get('GPIO_SYSFS_BASE', '0')
+    historySize            = Configuration.CONFIG['ObstructionSensors'].get('HISTORY_SIZE', '64')
+    adaptiveReverse        = Configuration.CONFIG['ObstructionSensors'].getboolean('ADAPTIVE_REVERSE', False)
+    obstructionSensors     = ObstructionSensorArray.sensorChannels(Configuration.CONFIG['ObstructionSensors'])
     
     kwargs=dict(obstructionSensorFront=obstructionSensorFront, 
                 webServerIp=webServerIp, 
                 webServerPort=webServerPort,
                 mjpgStreamServer=mjpgStreamServer,
                 serialPort=serialPort,
-                baudRate=baudRate)
+                baudRate=baudRate,
+                asyncWrite=asyncWrite,
+                writeQueueSize=writeQueueSize,
+                protocol=protocol,
+                deviceId=deviceId,
+                crc=crc,
+                collectStatistics=collectStatistics,
+                replyTimeout=replyTimeout,
+                healthMonitor=healthMonitor,
+                healthMinInterval=healthMinInterval,
+                healthMaxInterval=healthMaxInterval,
+                startupTimeout=startupTimeout,
+                recordFile=recordFile,
+                rampRate=rampRate,
+                rampTickInterval=rampTickInterval,
+                commandArbiter=commandArbiter,
+                reflexStop=reflexStop,
+                debounceTime=debounceTime,
+                clearDelay=clearDelay,
+                edgeBufferSize=edgeBufferSize,
+                gpioBackend=gpioBackend,
+                gpioChip=gpioChip,
+                sysfsBase=sysfsBase,
+                historySize=historySize,
+                adaptiveReverse=adaptiveReverse,
+                obstructionSensors=obstructionSensors)
     return kwargs
   #------------------------------------------------------------------------------#
   # setupLogging: loads configuration from log.ini, setups a logger and adds it  #
@@ -115,6 +353,151 @@ class PololuRobot():
     self.kwargs.update(logger=logger)
     return logger
 
+  #------------------------------------------------------------------------------#
+  # controllerError: called by the health monitor when the motor controller      #
+  #                  reported an error or did not reply, publishes the error     #
+  #                  counts to the robot                                         #
+  # paramteres: monitor: QikHealthMonitor                                        #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def controllerError(self, monitor):
+    self.controllerHealth=monitor.getHealth()
+
+  #------------------------------------------------------------------------------#
+  # getControllerHealth: error counts of the motor controller                    #
+  #                                                                              #
+  # returnvalues: dictionary as returned by QikHealthMonitor.getHealth, None     #
+  #               when the health monitor is disabled                            #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getControllerHealth(self):
+    if self.healthMonitor is None:
+      return None
+    return self.healthMonitor.getHealth()
+
+  #------------------------------------------------------------------------------#
+  # getManeuverStatistics: how many timed maneuvers were scheduled and cancelled #
+  #                        and how late they ended                               #
+  #                                                                              #
+  # returnvalues: dictionary as returned by ManeuverScheduler.getStatistics      #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getManeuverStatistics(self):
+    return self.scheduler.getStatistics()
+
+  #------------------------------------------------------------------------------#
+  # getCommandStatistics: motor commands requested, written, preempted and       #
+  #                       rejected and their request to write latency per        #
+  #                       priority                                               #
+  #                                                                              #
+  # returnvalues: dictionary as returned by CommandArbiter.getStatistics, None   #
+  #               when the command arbiter is disabled                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getCommandStatistics(self):
+    if self.commandArbiter is None:
+      return None
+    return self.commandArbiter.getStatistics()
+
+  #------------------------------------------------------------------------------#
+  # getSensorEventStatistics: sensor events published, delivered and dropped per #
+  #                           subscriber                                         #
+  #                                                                              #
+  # returnvalues: dictionary as returned by SensorEventBus.getStatistics, None   #
+  #               without a sensor bus                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getSensorEventStatistics(self):
+    if self.sensorBus is None:
+      return None
+    return self.sensorBus.getStatistics()
+
+  #------------------------------------------------------------------------------#
+  # getSensorHistoryStatistics: rolling statistics of every obstruction sensor,  #
+  #                             e.g. to spot a stuck or chattering sensor        #
+  #                                                                              #
+  # returnvalues: dictionary sensor name: dictionary as returned by              #
+  #               ObstructionSensor.getHistoryStatistics                         #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getSensorHistoryStatistics(self):
+    return dict((name, sensor.getHistoryStatistics()) for name, sensor in self.sensors.sensors.items())
+
+  #------------------------------------------------------------------------------#
+  # getReflexLatency: time from the sensor's edge to the reflex stop written     #
+  #                                                                              #
+  # returnvalues: dictionary as returned by ObstructionSensor.getReflexLatency,  #
+  #               None when the reflex stop is disabled                          #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getReflexLatency(self):
+    if self.sensorFront.reflex is None:
+      return None
+    return self.sensorFront.getReflexLatency()
+
+  #------------------------------------------------------------------------------#
+  # getObstructedSensors: names of the sensors obstructed now                    #
+  #                                                                              #
+  # returnvalues: list of names, e.g. ['FRONT', 'LEFT']                          #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getObstructedSensors(self):
+    return self.sensors.getObstructed(self.sensors.getSnapshot())
+
+  #------------------------------------------------------------------------------#
+  # commandPriority: priority of the motor commands given now, roving commands   #
+  #                  preempt manual ones                                         #
+  #                                                                              #
+  # returnvalues: CommandArbiter.PRIORITY_ROVING or PRIORITY_MANUAL              #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def commandPriority(self):
+    if self.isRoving:
+      return CommandArbiter.PRIORITY_ROVING
+    return CommandArbiter.PRIORITY_MANUAL
+
+  #------------------------------------------------------------------------------#
+  # setMotorSpeeds: set the speed of both motors, through the speed ramp and the #
+  #                 command arbiter when enabled                                 #
+  #                                                                              #
+  # paramteres: M0Speed: speed of the right hand side track                      #
+  #             M1Speed: speed of the left hand side track                       #
+  #                                                                              #
+  # returnvalues: seconds until the motors reach these speeds, 0 without ramp   #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Command arbiter                                       #
+  # 1.02    hta 18.10.2026 Time to reach the speeds                              #
+  #------------------------------------------------------------------------------#
+  def setMotorSpeeds(self, M0Speed, M1Speed):
+    if self.speedRamp is not None:
+      rampTime=self.speedRamp.timeToTarget(M0Speed, M1Speed)
+      self.speedRamp.setSpeeds(M0Speed, M1Speed)
+      return rampTime
+    self.motorCommands.setSpeeds(M0Speed, M1Speed)
+    return 0
+
   #------------------------------------------------------------------------------#
   # driveBackwards: Make robot drive backwards                                   #
   #                                                                              #
@@ -122,12 +505,13 @@ class PololuRobot():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Speed ramp                                            #
   #------------------------------------------------------------------------------#    
   def driveBackwards(self):
     self.logger.debug('driving backwards')
     #cancel any callback to stop, if it exists
     self.cancelCallback()      
-    self.motorControl.setSpeed(-1*self.setDriveSpeed)
+    self.setMotorSpeeds(-1*self.setDriveSpeed, -1*self.setDriveSpeed)
     #robot is not stopped
     self.stopped=False
     self.drivingBackwards=True
@@ -139,12 +523,13 @@ class PololuRobot():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Speed ramp                                            #
   #------------------------------------------------------------------------------#  
   def driveForwards(self):
     self.logger.debug('driving forwards')
     #cancel any callback to stop, if it exists
     self.cancelCallback()      
-    self.motorControl.setSpeed(self.setDriveSpeed)
+    self.setMotorSpeeds(self.setDriveSpeed, self.setDriveSpeed)
     #robot is not stopped
     self.stopped=False
     self.drivingForwards=True
@@ -175,6 +560,10 @@ class PololuRobot():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Single write for both motors                          #
+  # 1.02    hta 18.10.2026 Speed ramp bypassed                                   #
+  # 1.03    hta 18.10.2026 Wake up the roving thread                             #
+  # 1.04    hta 18.10.2026 Command arbiter                                       #
   #------------------------------------------------------------------------------#     
   def stop(self):
     self.logger.debug('stopping')
@@ -183,11 +572,15 @@ class PololuRobot():
     self.drivingBackwards=False  
     #cancel any callback to stop, if it exists
     self.cancelCallback()    
-    #set speed to zero, then coast
-    self.motorControl.setSpeed(0)      
-    self.motorControl.setCoast()
+    #set speed to zero, then coast (single write), never ramped
+    if self.speedRamp is not None:
+      self.speedRamp.stop()
+    else:
+      self.motorCommands.stopMotors()
     #robot is stoped
     self.stopped=True
+    #roving may be waiting for a maneuver to complete
+    self.notifyRover()
     
   #------------------------------------------------------------------------------#
   # turnRight: turn right. If a value for time is passed the right turn will be  #
@@ -205,6 +598,9 @@ class PololuRobot():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Single write for both motors                          #
+  # 1.02    hta 18.10.2026 Speed ramp                                            #
+  # 1.03    hta 18.10.2026 Turn time counted from reaching the turn speeds       #
   #------------------------------------------------------------------------------#      
   def turnRight(self,time=0,radius=DFLT_RADIUS):
     self.logger.debug('turning right')
@@ -227,11 +623,13 @@ class PololuRobot():
     M1Speed= int((M0Speed / inner_rate) * outer_rate)
     if M1Speed > max_speed:
      M1Speed = max_speed
-    self.motorControl.setM0Speed(M0Speed)          
-    self.motorControl.setM1Speed(M1Speed)
+    rampTime=self.setMotorSpeeds(M0Speed, M1Speed)
     self.stopped=False
     #if time has been set > 0 than the right turn 
-    #is stopped after that amount of time
+    #is stopped after that amount of time, counted from
+    #the moment the speed ramp reaches the turn speeds
+    if time > 0:
+      time+=rampTime
     self.callback(function=self.callbackStop, time=time)
 
   #------------------------------------------------------------------------------#
@@ -249,6 +647,9 @@ class PololuRobot():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Single write for both motors                          #
+  # 1.02    hta 18.10.2026 Speed ramp                                            #
+  # 1.03    hta 18.10.2026 Turn time counted from reaching the turn speeds       #
   #------------------------------------------------------------------------------# 
   def turnLeft(self,time=0, radius=DFLT_RADIUS):
     self.logger.debug('turning left')
@@ -271,11 +672,13 @@ class PololuRobot():
     M0Speed= int((M1Speed / inner_rate) * outer_rate)
     if M0Speed > max_speed:
       M0Speed = max_speed
-    self.motorControl.setM0Speed(M0Speed)          
-    self.motorControl.setM1Speed(M1Speed)
+    rampTime=self.setMotorSpeeds(M0Speed, M1Speed)
     self.stopped=False
     #if time has been set > 0 than the left turn 
-    #is stopped after that amount of time
+    #is stopped after that amount of time, counted from
+    #the moment the speed ramp reaches the turn speeds
+    if time > 0:
+      time+=rampTime
     self.callback(function=self.callbackStop, time=time)
 
   #------------------------------------------------------------------------------#
@@ -294,23 +697,23 @@ class PololuRobot():
   def callbackStop(self):
     self.stop()
   #------------------------------------------------------------------------------#
-  # callback: This function starts a timer after which the function passed as a  #
-  #            parameter is called. This is used to terminate  turns after a     #
-  #            certain amount of time                                            #
+  # callback: This function schedules the function passed as a parameter to be   #
+  #            called after a certain amount of time. This is used to terminate  #
+  #            turns after a certain amount of time. Returns straight away, the  #
+  #            function is called from the scheduler thread                      #
   # paramteres:                                                                  #
   #                                                                              #
   # returnvalues: None                                                           #
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Maneuver scheduler, no thread per call, no join       #
   #------------------------------------------------------------------------------#     
   def callback(self,function,time):
     if time > 0:
-      self.timer = threading.Timer(time,function)
-      self.timer.start()
-      self.timer.join()
+      self.timer = self.scheduler.schedule(time,function)
   #------------------------------------------------------------------------------#
-  # cancelCallback: This function is used to terminate a started callback timer. #
+  # cancelCallback: This function is used to cancel a scheduled callback.        #
   #                 In particular if a turn was stopped by turning the other way #
   #                 driving forwards or backwards or stopping otherwise, any     #
   #                 started callback is no longer required and must therefore be #
@@ -321,6 +724,7 @@ class PololuRobot():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Cancel maneuver handle                                #
   #------------------------------------------------------------------------------#           
   def cancelCallback(self):
     try:
@@ -331,85 +735,202 @@ class PololuRobot():
     except:
       self.logger.warning('failed to cancel timer['+  str(traceback.format_exc()) +']')   
   #------------------------------------------------------------------------------#
-  # evade: Evade an obstacle by reversing a bit then turning left or right       #
-  #                                                                              #
+  # notifyRover: wake up the roving thread, something it may be waiting for has  #
+  #              changed (sensor edge, maneuver complete, roving stopped)        #
   #                                                                              #
   # paramteres:                                                                  #
   #                                                                              #
   # returnvalues: None                                                           #
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def notifyRover(self):
+    with self.roverCondition:
+      self.roverEvents+=1
+      self.roverCondition.notify_all()
+
+  #------------------------------------------------------------------------------#
+  # sensorChanged: called on every change of the front sensor, by the safety   #
+  #                subscriber of the sensor bus or, without a bus, by the        #
+  #                sensor itself. Stops for an obstacle when moving forwards     #
+  #                and the arbiter or the reflex stop is enabled, clears the     #
+  #                arbiter's safety stop when the obstacle is gone               #
+  #                                                                              #
+  # paramteres: obstructed: True when an obstruction is detected                 #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Safety stop                                           #
+  # 1.02    hta 18.10.2026 Reflex stop                                           #
+  # 1.03    hta 18.10.2026 Roving woken through the sensor bus                   #
+  # 1.04    hta 18.10.2026 Clear the safety stop                                 #
+  # 1.05    hta 18.10.2026 Called through the sensor bus                         #
+  #------------------------------------------------------------------------------#
+  def sensorChanged(self, obstructed):
+    #with the command arbiter or the reflex stop the robot stops for an
+    #obstacle straight away
+    if (obstructed and (self.commandArbiter is not None or self.sensorFront.reflex is not None) and
+        not self.stopped and not self.drivingBackwards):
+      self.safetyStop()
+    elif not obstructed and self.commandArbiter is not None:
+      self.commandArbiter.clearSafetyStop()
+    #without a sensor bus roving is woken from here, called as a listener
+    if self.sensorBus is None:
+      self.notifyRover()
+
+  #------------------------------------------------------------------------------#
+  # obstacleReflex: called straight from the sensor's GPIO callback when an      #
+  #                 obstacle is seen, writes the pre-encoded stop frame when     #
+  #                 moving forwards. The robot's state is brought in line by     #
+  #                 sensorChanged afterwards                                     #
+  #                                                                              #
+  # returnvalues: True when the stop was written                                 #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def obstacleReflex(self):
+    if self.stopped or self.drivingBackwards:
+      return False
+    if self.commandArbiter is not None:
+      self.commandArbiter.submit(CommandArbiter.PRIORITY_SAFETY, self.motorControl.reflexStop)
+    else:
+      self.motorControl.reflexStop()
+    return True
+
+  #------------------------------------------------------------------------------#
+  # safetyStop: stop for an obstacle, the stop is written ahead of and preempts  #
+  #             all other motor commands. The speed ramp is reset first so none  #
+  #             of its ticks follows the stop, the arbiter rejects forward       #
+  #             commands until the obstacle is gone and then writes the last     #
+  #             of them, so the robot does what its state says                   #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Without command arbiter                               #
+  # 1.02    hta 18.10.2026 Speed ramp reset ahead of the stop                    #
+  #------------------------------------------------------------------------------#
+  def safetyStop(self):
+    self.logger.debug('safety stop')
+    if self.commandArbiter is not None:
+      if self.speedRamp is not None:
+        self.speedRamp.reset()
+      self.commandArbiter.safetyStop()
+    #then bring the robot's state, the speed ramp and any maneuver in line
+    self.stop()
+
+  #------------------------------------------------------------------------------#
+  # reverseTime: how long to reverse away from an obstacle. With adaptive        #
+  #              reverse no longer than obstacles usually stay in view, evade    #
+  #              reverses again when the obstacle is still seen afterwards       #
+  #                                                                              #
+  # returnvalues: duration in seconds                                            #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version, taken from evade                     #
+  #------------------------------------------------------------------------------#
+  def reverseTime(self):
+    duration=2.0*(70/self.setDriveSpeed)
+    if self.kwargs.get('adaptiveReverse'):
+      meanObstructed=self.sensorFront.history.getMeanObstructed(ADAPTIVE_MIN_SAMPLES)
+      if meanObstructed is not None:
+        duration=max(MIN_REVERSE_FRACTION*duration, min(duration, REVERSE_MARGIN*meanObstructed))
+    return duration
+
+  #------------------------------------------------------------------------------#
+  # turnDuration: duration of the turn evading an obstacle, aim is to turn       #
+  #               aprox. 90 degrees at the current speed                         #
+  #                                                                              #
+  # returnvalues: duration in seconds                                            #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version, taken from evade                     #
+  #------------------------------------------------------------------------------#
+  def turnDuration(self):
+    duration=0.9
+    if self.setDriveSpeed > 0 and self.setDriveSpeed <= 20:
+      duration=1.10
+    elif self.setDriveSpeed > 20 and self.setDriveSpeed <= 30:
+      duration=1.05
+    elif self.setDriveSpeed > 30 and self.setDriveSpeed <= 40:
+      duration=1.00
+    elif self.setDriveSpeed > 40 and self.setDriveSpeed <= 50:
+      duration=0.95
+    elif self.setDriveSpeed > 50 and self.setDriveSpeed <= 60:
+      duration=0.90
+    elif self.setDriveSpeed > 60 and self.setDriveSpeed <= 70:
+      duration=0.85
+    elif self.setDriveSpeed > 70 and self.setDriveSpeed <= 80:
+      duration=0.8
+    elif self.setDriveSpeed > 80 :
+      duration=0.7
+    return duration
+
+  #------------------------------------------------------------------------------#
+  # evade: Evade an obstacle by reversing a bit then turning left or right.      #
+  #        One step of the evasive action, the roving thread calls it again      #
+  #        whenever something changed                                            #
+  #                                                                              #
+  # paramteres: action: the evasive action we are in                             #
+  #                                                                              #
+  # returnvalues: next action, the same action when waiting for a maneuver to    #
+  #               complete, None once the obstacle has been evaded               #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Single step of a state machine, no busy waiting       #
+  # 1.02    hta 18.10.2026 Reverse time from reverseTime                         #
+  # 1.03    hta 18.10.2026 Count repeated reverses                               #
   #------------------------------------------------------------------------------#           
-  def evade(self):
-
+  def evade(self, action='reverse'):
     SHARP_TURN_RADIUS=(0.2,1.5)
-    self.isEvading=True
-    action='reverse'
-    while self.isEvading and self.isRoving:
-      if action=='reverse':
-        self.logger.debug('action['+action+']')
-        #evasive action starts with reversing
-        #until the front sensor no longer sees
-        #the obstacle
-        self.driveBackwards()
-        #we'll drive backwards for a bit
-        self.callback(function=self.callbackStop, time=2.0*(70/self.setDriveSpeed))        
-        action='reversing'
-      elif action=='reversing':
-        self.logger.debug('action['+action+']')
-        #waiting for reverse movement to stop
-        if self.stopped:
-          action='clearedObstacle'
-      elif action=='clearedObstacle':
-        self.logger.debug('action['+action+']')
-        #we are done driving backwards lets
-        #see if the sensor still detects 
-        #the obstruction
-        if not self.sensorFront.obstructed:
-          #no obstruction detected
-          #lets turn
-          action='turn'
-        else:
-          #oh oh still detecting obstruction
-          #lets reverse a bit more
-          action='reverse'
-      elif action=='turn':
-        self.logger.debug('action['+action+']')
-        #determine duration of curve, aim is 
-        #to turn aprox. 90 degrees
-        duration=0.9
-        if self.setDriveSpeed > 0 and self.setDriveSpeed <= 20:
-          duration=1.10
-        elif self.setDriveSpeed > 20 and self.setDriveSpeed <= 30:
-          duration=1.05
-        elif self.setDriveSpeed > 30 and self.setDriveSpeed <= 40:
-          duration=1.00
-        elif self.setDriveSpeed > 40 and self.setDriveSpeed <= 50:
-          duration=0.95
-        elif self.setDriveSpeed > 50 and self.setDriveSpeed <= 60:
-          duration=0.90
-        elif self.setDriveSpeed > 60 and self.setDriveSpeed <= 70:
-          duration=0.85
-        elif self.setDriveSpeed > 70 and self.setDriveSpeed <= 80:
-          duration=0.8
-        elif self.setDriveSpeed > 80 :
-          duration=0.7
- 
-        #lets make this exciting and decide
-        #randomly whether to turn left or right
-        direction=['left','right']
-        if random.choice(direction)=='left':
-          self.turnLeft(time=duration,radius=SHARP_TURN_RADIUS)
-        else:
-          self.turnRight(time=duration,radius=SHARP_TURN_RADIUS)
-        action='turning'
-      elif action == 'turning':
-        if self.stopped:
-          #turn has been executed, evasive
-          #action is complete we can go
-          #back to driving around at will
-          self.isEvading=False
+    self.logger.debug('action['+action+']')
+    if action=='reverse':
+      #evasive action starts with reversing
+      #until the front sensor no longer sees
+      #the obstacle
+      self.driveBackwards()
+      #we'll drive backwards for a bit
+      self.callback(function=self.callbackStop, time=self.reverseTime())
+      return 'reversing'
+    elif action=='reversing':
+      #waiting for reverse movement to stop
+      if self.stopped:
+        return 'clearedObstacle'
+      return action
+    elif action=='clearedObstacle':
+      #we are done driving backwards lets
+      #see if the sensor still detects 
+      #the obstruction
+      if not self.sensorFront.obstructed:
+        #no obstruction detected
+        #lets turn
+        return 'turn'
+      #oh oh still detecting obstruction
+      #lets reverse a bit more
+      self.repeatedReverses+=1
+      return 'reverse'
+    elif action=='turn':
+      #lets make this exciting and decide
+      #randomly whether to turn left or right
+      direction=['left','right']
+      if random.choice(direction)=='left':
+        self.turnLeft(time=self.turnDuration(),radius=SHARP_TURN_RADIUS)
+      else:
+        self.turnRight(time=self.turnDuration(),radius=SHARP_TURN_RADIUS)
+      return 'turning'
+    elif action == 'turning':
+      if self.stopped:
+        #turn has been executed, evasive
+        #action is complete we can go
+        #back to driving around at will
+        return None
+      return action
     
   #------------------------------------------------------------------------------#
   # stopRoving: Terminate roving mode                                            #
@@ -420,13 +941,53 @@ class PololuRobot():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Wake up the roving thread                             #
   #------------------------------------------------------------------------------#           
   def stopRoving(self):
     self.isRoving=False
     self.stop()
+    self.notifyRover()
     
   #------------------------------------------------------------------------------#
-  # roving: Drive around and avoid collisions                                    #
+  # rovingStep: advance the roving state machine as far as it goes without       #
+  #             waiting                                                          #
+  #                                                                              #
+  # paramteres: action: current evasive action, None when not evading            #
+  #                                                                              #
+  # returnvalues: the action to wait in                                          #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Count evades                                          #
+  #------------------------------------------------------------------------------#
+  def rovingStep(self, action):
+    while self.isRoving:
+      if action is None:
+        # we detected an obstacle, lets go and try
+        # to evade it
+        if self.sensorFront.obstructed:
+          self.isEvading=True
+          self.evades+=1
+          action='reverse'
+          continue
+        # we are stopped and the front sensor is not detecting an
+        # obstruction, we can start driving forwards
+        if self.stopped:
+          self.driveForwards()
+        return action
+      nextAction=self.evade(action)
+      if nextAction is None:
+        self.isEvading=False
+        self.evadesCompleted+=1
+      elif nextAction==action:
+        #waiting for the maneuver to complete
+        return action
+      action=nextAction
+    return action
+
+  #------------------------------------------------------------------------------#
+  # roving: Drive around and avoid collisions. The roving thread sleeps until    #
+  #         the sensor sees an edge or a maneuver completes                      #
   #                                                                              #
   # paramteres:                                                                  #
   #                                                                              #
@@ -434,6 +995,7 @@ class PololuRobot():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 State machine driven by events, no busy waiting       #
   #------------------------------------------------------------------------------#           
   def roving(self):
     #initialize evading as it may not
@@ -442,21 +1004,20 @@ class PololuRobot():
     self.isEvading=False
     #if we had not previously stopped driving we do it now
     self.stop()
+    action=None
     while self.isRoving:
-      # if we are not stopped, the front sensor is not detecting an
-      # obstruction and we are not in the processes of taking evasive
-      # action then we can start driving forwards
-      if self.stopped and not self.sensorFront.obstructed and not self.isEvading:
-        self.driveForwards()
-      # we detected an obstacle, and we are not already taking
-      # evasive action than we should go and try to evade the
-      # obstacle
-      if self.sensorFront.obstructed and not self.isEvading:
-        self.evade() # avoid collision
+      action=self.rovingStep(action)
+      with self.roverCondition:
+        #events which arrived whilst we were busy are not lost
+        while self.isRoving and not self.roverEvents:
+          self.roverCondition.wait()
+        self.roverEvents=0
     self.logger.info('leaving roving')
 
   #------------------------------------------------------------------------------#
-  # roving: Start roving in a thread                                             #
+  # roving: Start roving in a thread, unless roving already. A roving thread     #
+  #         which was just told to stop finishes first, so there is never more   #
+  #         than one                                                             #
   #                                                                              #
   # paramteres:                                                                  #
   #                                                                              #
@@ -464,13 +1025,18 @@ class PololuRobot():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Check and start atomically                            #
   #------------------------------------------------------------------------------#           
   def runRoving(self):
-    if not self.isRoving:
+    with self.rovingLock:
+      if self.isRoving:
+        return
+      if self.rovingThread is not None:
+        self.rovingThread.join()
       self.isRoving=True
-      threadRoving = threading.Thread(target=self.roving)
-      threadRoving.name='ROVING'
-      threadRoving.start()
+      self.rovingThread = threading.Thread(target=self.roving)
+      self.rovingThread.name='ROVING'
+      self.rovingThread.start()
         
         
   def __call__(self):
@@ -488,17 +1054,25 @@ class PololuRobot():
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 20.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Close motor controller                                #
+  # 1.02    hta 18.10.2026 Startup timing report                                 #
+  # 1.03    hta 18.10.2026 Close speed ramp                                      #
+  # 1.04    hta 18.10.2026 Close maneuver scheduler                              #
+  # 1.05    hta 18.10.2026 Clean up all sensors                                  #
+  # 1.06    hta 18.10.2026 Threaded web server, close sensor bus                 #
   #------------------------------------------------------------------------------#        
   def main(self):
       
     try:
       kwargs=self.kwargs
-      #add robot object to kwargs
-      kwargs.update(robot=self)
+      #add robot object to kwargs, requests are served by threads of their own
+      kwargs.update(robot=self, longPolling=True)
       app = PololuRobotWebControl.PololuRobotWebControlApp(**kwargs)
       #start
-      httpd = make_server(str(self.kwargs.get('webServerIp')),int(self.kwargs.get('webServerPort')), app)
+      httpd = self.timeStartup('webServer', lambda: make_server(str(self.kwargs.get('webServerIp')),int(self.kwargs.get('webServerPort')), app,
+                                                                      server_class=PololuRobotWebControl.ThreadingWSGIServer))
       self.logger.debug('webServerIp['+str(self.kwargs.get('webServerIp'))+'] webServerPort['+ str(self.kwargs.get('webServerPort')) +']')
+      self.logger.info('startup times['+', '.join(name+' '+'{:.3f}'.format(seconds)+'s' for name, seconds in self.getStartupReport().items())+']')
       httpd.serve_forever()
     except (KeyboardInterrupt):
       None
@@ -508,12 +1082,21 @@ class PololuRobot():
       except Exception as e:
         logging.error(str(traceback.format_exc()))
       try:
-        self.sensorFront.cleanUp()
+        self.sensors.cleanUp()
+        self.sensorBus.close()
+      except Exception as e:
+        logging.error(str(traceback.format_exc()))
+      try:
+        self.scheduler.close()
+        if self.speedRamp is not None:
+          self.speedRamp.close()
+        if self.healthMonitor is not None:
+          self.healthMonitor.close()
+        self.motorControl.close()
       except Exception as e:
         logging.error(str(traceback.format_exc()))
     return 0     
 
-main=PololuRobot() 
-
 if __name__ == '__main__':
+    main=PololuRobot() 
     sys.exit(main())
@@ -0,0 +1,279 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the SensorEventBus class. Obstruction sensors publish
+their raw edges and debounced changes of state on the bus once, any number of
+subscribers (roving, telemetry, the web application, a recorder) receive them
+through a queue of their own.
+
+Publishing never waits for a subscriber, it is done from the GPIO callback
+thread. Every queue is bounded, when a subscriber falls behind and its queue
+is full an event is dropped according to the subscriber's policy
+
+ - DROP_OLDEST: the oldest queued event makes room, for subscribers only
+   interested in the latest state
+ - DROP_NEWEST: the new event is dropped, for subscribers wanting an
+   unbroken record up to the moment they fell behind
+
+and counted. A subscriber takes events from its queue with get, or has them
+handed to a function by a thread of its own.
+"""
+
+import sys,os
+import collections
+import itertools
+import threading
+import logging, traceback
+sys.path.append(os.path.join("..","motor control"))
+import QikStatistics
+
+# kinds of event
+EDGE  = 'edge'
+STATE = 'state'
+
+# drop policies of a full queue
+DROP_OLDEST = 'oldest'
+DROP_NEWEST = 'newest'
+
+# sequence: numbered from 1 in the order published
+# time:     clock reading of the edge or change
+# sensor:   name of the sensor, e.g. FRONT
+# kind:     EDGE or STATE
+# obstructed: pin low for an edge, new state for a change of state
+SensorEvent = collections.namedtuple('SensorEvent', 'sequence time sensor kind obstructed')
+
+#------------------------------------------------------------------------------#
+# Subscription: bounded queue of the events a subscriber asked for             #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class Subscription():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger',)
+    self.name = kwargs.get('name')
+    #kinds of event and names of the sensors wanted, None for all sensors
+    self.kinds = frozenset(kwargs.get('kinds') or (STATE,))
+    self.sensors = kwargs.get('sensors')
+    if self.sensors is not None:
+      self.sensors = frozenset(self.sensors)
+    self.maxSize = int(kwargs.get('maxSize') or 64)
+    self.dropPolicy = kwargs.get('dropPolicy') or DROP_OLDEST
+    if self.dropPolicy not in (DROP_OLDEST, DROP_NEWEST):
+      raise ValueError('unknown drop policy['+str(self.dropPolicy)+']')
+    #guards the queue and counters, signals queued events
+    self.condition = threading.Condition()
+    self.queue = collections.deque()
+    self.delivered = 0
+    self.dropped = 0
+    self.maxDepth = 0
+    self.closed = False
+    #events are handed to handler by a thread of its own when given
+    self.handler = kwargs.get('handler')
+    self.thread = None
+    if self.handler is not None:
+      self.thread = threading.Thread(target=self.run)
+      self.thread.name = 'SENSOR BUS '+self.name.upper()
+      self.thread.daemon = True
+      self.thread.start()
+
+  def wants(self, event):
+    return event.kind in self.kinds and (self.sensors is None or event.sensor in self.sensors)
+
+  #------------------------------------------------------------------------------#
+  # offer: queue an event, drop one when the queue is full. Never waits          #
+  #                                                                              #
+  # paramteres: event: SensorEvent                                               #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def offer(self, event):
+    with self.condition:
+      if self.closed:
+        return
+      if len(self.queue) >= self.maxSize:
+        self.dropped += 1
+        if self.dropPolicy == DROP_NEWEST:
+          return
+        self.queue.popleft()
+      self.queue.append(event)
+      self.maxDepth = max(self.maxDepth, len(self.queue))
+      self.condition.notify()
+
+  #------------------------------------------------------------------------------#
+  # get: take the oldest queued event, wait for one when there is none           #
+  #                                                                              #
+  # paramteres: timeout: seconds, None to wait as long as it takes               #
+  #                                                                              #
+  # returnvalues: SensorEvent, None on timeout or when closed                    #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def get(self, timeout=None):
+    with self.condition:
+      if not self.condition.wait_for(lambda: self.queue or self.closed, timeout) or not self.queue:
+        return None
+      self.delivered += 1
+      return self.queue.popleft()
+
+  #------------------------------------------------------------------------------#
+  # run: handler thread, hands the events to the handler in order                #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def run(self):
+    while True:
+      event = self.get()
+      if event is None:
+        break
+      try:
+        self.handler(event)
+      except Exception:
+        self.logger.error('unexpected error ['+  str(traceback.format_exc()) +']')
+
+  #------------------------------------------------------------------------------#
+  # getStatistics: events delivered and dropped, queue depth now and at most     #
+  #                                                                              #
+  # returnvalues: dictionary                                                     #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getStatistics(self):
+    with self.condition:
+      return dict(delivered=self.delivered, dropped=self.dropped,
+                  depth=len(self.queue), maxDepth=self.maxDepth)
+
+  def close(self):
+    with self.condition:
+      self.closed = True
+      self.queue.clear()
+      self.condition.notify_all()
+    if self.thread is not None and self.thread is not threading.current_thread():
+      self.thread.join()
+
+class SensorEventBus():
+  def __init__(self, **kwargs):
+    #set logger
+    self.logger = kwargs.get('logger',)
+    #guards subscribing, publishing only reads the tuple of subscriptions
+    self.lock = threading.Lock()
+    self.subscriptions = ()
+    #a raw edge is only made into an event when a subscription wants edges
+    self.edgeSubscriptions = 0
+    self.sequence = itertools.count(1)
+    self.published = 0
+    #latest change of state per sensor
+    self.latest = {}
+
+  #------------------------------------------------------------------------------#
+  # subscribe: add a subscriber                                                  #
+  #                                                                              #
+  # paramteres: name:       name of the subscriber, e.g. roving                  #
+  #             handler:    function called with every event by a thread of the  #
+  #                         subscription, None to take events with get           #
+  #             kinds:      kinds of event wanted, STATE and/or EDGE             #
+  #             sensors:    names of the sensors wanted, None for all            #
+  #             maxSize:    events queued at most                                #
+  #             dropPolicy: DROP_OLDEST or DROP_NEWEST                           #
+  #                                                                              #
+  # returnvalues: Subscription                                                   #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def subscribe(self, name, handler=None, kinds=(STATE,), sensors=None, maxSize=64, dropPolicy=DROP_OLDEST):
+    subscription = Subscription(logger=self.logger, name=name, handler=handler, kinds=kinds,
+                                sensors=sensors, maxSize=maxSize, dropPolicy=dropPolicy)
+    with self.lock:
+      #replaced rather than changed, publish may be iterating the old one
+      self.subscriptions = self.subscriptions + (subscription,)
+      self.edgeSubscriptions = sum(EDGE in each.kinds for each in self.subscriptions)
+    return subscription
+
+  def unsubscribe(self, subscription):
+    with self.lock:
+      self.subscriptions = tuple(each for each in self.subscriptions if each is not subscription)
+      self.edgeSubscriptions = sum(EDGE in each.kinds for each in self.subscriptions)
+    subscription.close()
+
+  #------------------------------------------------------------------------------#
+  # publish: hand an event to every subscription wanting it, never waits for a   #
+  #          subscriber                                                          #
+  #                                                                              #
+  # paramteres: sensor:     name of the sensor                                   #
+  #             kind:       EDGE or STATE                                        #
+  #             obstructed: pin low for an edge, new state for a change          #
+  #             time:       clock reading, None for now                          #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def publish(self, sensor, kind, obstructed, time=None):
+    if kind == EDGE and not self.edgeSubscriptions:
+      return
+    event = SensorEvent(next(self.sequence), QikStatistics.clock() if time is None else time,
+                        sensor, kind, obstructed)
+    self.published = event.sequence
+    if kind == STATE:
+      self.latest[sensor] = event
+    for subscription in self.subscriptions:
+      if subscription.wants(event):
+        subscription.offer(event)
+
+  #------------------------------------------------------------------------------#
+  # getLatest: latest change of state of every sensor which changed              #
+  #                                                                              #
+  # returnvalues: dictionary sensor name: SensorEvent                            #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getLatest(self):
+    return dict(self.latest)
+
+  #------------------------------------------------------------------------------#
+  # getStatistics: events published and the statistics of every subscription     #
+  #                                                                              #
+  # returnvalues: dictionary                                                     #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getStatistics(self):
+    return dict(published=self.published,
+                subscriptions=dict((each.name, each.getStatistics()) for each in self.subscriptions))
+
+  def close(self):
+    with self.lock:
+      subscriptions = self.subscriptions
+      self.subscriptions = ()
+      self.edgeSubscriptions = 0
+    for subscription in subscriptions:
+      subscription.close()
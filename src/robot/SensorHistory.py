@@ -0,0 +1,143 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module implements the SensorHistory class, the latest changes of state of
+an obstruction sensor in a ring of preallocated arrays. Over the changes in
+the ring it keeps the time spent obstructed and clear and the number of
+intervals of each, updated as a change is recorded and as the oldest one drops
+out of the ring, so the statistics
+
+ - duty cycle, share of the time obstructed
+ - change rate, changes of state per second
+ - mean time obstructed and mean time clear
+ - time since the last change
+
+cost the same however large the ring. A sensor stuck in one state shows as a
+long time since the last change, a sensor failing intermittently as a high
+change rate.
+"""
+
+import array
+
+class SensorHistory():
+  def __init__(self, **kwargs):
+    #changes kept, at least two so there is an interval between them
+    self.size = max(2, int(kwargs.get('size') or 64))
+    #ring of changes, time and state entered
+    self.times = array.array('d', bytes(8 * self.size))
+    self.states = array.array('b', bytes(self.size))
+    self.index = 0
+    self.count = 0
+    self.changes = 0
+    #sums over the intervals between the changes in the ring
+    self.obstructedTime = 0.0
+    self.obstructedIntervals = 0
+    self.clearTime = 0.0
+    self.clearIntervals = 0
+
+  def addInterval(self, obstructed, seconds, sign):
+    if obstructed:
+      self.obstructedTime += sign * seconds
+      self.obstructedIntervals += sign
+    else:
+      self.clearTime += sign * seconds
+      self.clearIntervals += sign
+
+  #------------------------------------------------------------------------------#
+  # record: record a change of state, the interval it ends is added to the sums  #
+  #         and the interval of the change dropping out of the ring taken off    #
+  #                                                                              #
+  # paramteres: time:       clock reading of the change                          #
+  #             obstructed: state entered                                        #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def record(self, time, obstructed):
+    if self.count:
+      last = (self.index - 1) % self.size
+      self.addInterval(self.states[last], time - self.times[last], 1)
+    if self.count == self.size:
+      oldest = self.index
+      following = (oldest + 1) % self.size
+      self.addInterval(self.states[oldest], self.times[following] - self.times[oldest], -1)
+    else:
+      self.count += 1
+    self.times[self.index] = time
+    self.states[self.index] = obstructed
+    self.index = (self.index + 1) % self.size
+    self.changes += 1
+
+  #------------------------------------------------------------------------------#
+  # getMeanObstructed: mean time obstructed over the intervals in the ring       #
+  #                                                                              #
+  # paramteres: minIntervals: intervals obstructed needed for a mean             #
+  #                                                                              #
+  # returnvalues: seconds, None when there are fewer intervals                   #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getMeanObstructed(self, minIntervals=1):
+    if self.obstructedIntervals < max(1, minIntervals):
+      return None
+    return max(0.0, self.obstructedTime) / self.obstructedIntervals
+
+  #------------------------------------------------------------------------------#
+  # getStatistics: statistics over the changes in the ring, the interval since   #
+  #                the last change included                                      #
+  #                                                                              #
+  # paramteres: now: clock reading                                               #
+  #                                                                              #
+  # returnvalues: dictionary, None before the first change                       #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getStatistics(self, now):
+    if not self.count:
+      return None
+    last = (self.index - 1) % self.size
+    oldest = (self.index - self.count) % self.size
+    sinceLastChange = max(0.0, now - self.times[last])
+    window = now - self.times[oldest]
+    obstructedTime = max(0.0, self.obstructedTime) + (sinceLastChange if self.states[last] else 0.0)
+    return dict(changes=self.changes,
+                obstructed=bool(self.states[last]),
+                window=window,
+                dutyCycle=obstructedTime / window if window > 0 else None,
+                changeRate=(self.count - 1) / window if window > 0 else None,
+                meanObstructed=self.getMeanObstructed(),
+                meanClear=max(0.0, self.clearTime) / self.clearIntervals if self.clearIntervals else None,
+                sinceLastChange=sinceLastChange)
+
+  #------------------------------------------------------------------------------#
+  # getChanges: the changes in the ring, oldest first                            #
+  #                                                                              #
+  # returnvalues: list of (clock reading, obstructed) tuples                     #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def getChanges(self):
+    first = self.index - self.count
+    return [(self.times[index % self.size], bool(self.states[index % self.size]))
+            for index in range(first, first + self.count)]
@@ -0,0 +1,534 @@
+#    Copyright 2014 Helios Taraba
+#
+#    This file is part of PololuRobot.
+#
+#    PololuRobot is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PololuRobot is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PololuRobot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Headless simulation of the PololuRobot. The robot's own roving and evade code
+drives a simulated differential drive body through a 2D world, a rectangular
+arena with circular obstacles. Simulated time is used instead of wall time, so
+hours of roving run in seconds, e.g. to tune speeds and turn durations.
+
+ - SimulatedController stands in for PololuQik and keeps the speed of each track
+ - SimulatedSensor stands in for ObstructionSensor, its changes are kept in a
+   SensorHistory on simulated time
+ - VirtualClock stands in for the ManeuverScheduler, maneuvers end on simulated
+   time
+ - World holds the arena and the obstacles
+ - Simulation advances any number of robots, each in a world of its own, with
+   a fixed time step. The bodies and sensors of all robots are advanced in one
+   batch, with numpy when it is installed and in plain Python otherwise
+
+There is no roving thread. Whenever something happens which the roving thread
+would be woken up for, the simulation calls rovingStep as the roving thread
+does. Maneuvers end on the first step at or after their deadline.
+
+To run: cd src/simulation; python3 RobotSimulator.py [--hours 1] [--robots 4]
+"""
+
+import sys,os
+import time
+import math
+import heapq
+import random
+import argparse
+import itertools
+import threading
+import logging
+sys.path.append(os.path.join("..","robot"))
+import PololuRobot
+import SensorHistory
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# metres per second per unit of motor speed, 127 is about half a metre per second
+SPEED_SCALE  = 0.004
+# distance between the tracks in metres
+TRACK_WIDTH  = 0.15
+# radius of the robot's body in metres
+BODY_RADIUS  = 0.1
+# range of the obstruction sensor in metres, from the front of the body
+SENSOR_RANGE = 0.15
+# the sensor sees along three beams, straight ahead and this many radians to
+# either side
+SENSOR_ANGLE = 0.5
+# simulated seconds per step
+TIME_STEP    = 0.02
+
+#------------------------------------------------------------------------------#
+# VirtualManeuver: handle of a function scheduled on the virtual clock         #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class VirtualManeuver():
+  def __init__(self, clock, deadline, function):
+    self.clock     = clock
+    self.deadline  = deadline
+    self.function  = function
+    self.cancelled = False
+    self.done      = False
+
+  def cancel(self):
+    if self.done or self.cancelled:
+      return False
+    self.cancelled = True
+    self.clock.cancelled += 1
+    return True
+
+#------------------------------------------------------------------------------#
+# VirtualClock: simulated time, schedules maneuvers like ManeuverScheduler     #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class VirtualClock():
+  def __init__(self):
+    self.now = 0.0
+    #(deadline, sequence, maneuver)
+    self.heap = []
+    self.sequence = itertools.count()
+    self.scheduled = 0
+    self.cancelled = 0
+
+  def schedule(self, delay, function):
+    maneuver = VirtualManeuver(self, self.now + delay, function)
+    heapq.heappush(self.heap, (maneuver.deadline, next(self.sequence), maneuver))
+    self.scheduled += 1
+    return maneuver
+
+  #------------------------------------------------------------------------------#
+  # runDue: run the functions whose deadline has passed, in deadline order       #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def runDue(self):
+    while self.heap and self.heap[0][0] <= self.now:
+      deadline, sequence, maneuver = heapq.heappop(self.heap)
+      if not maneuver.cancelled:
+        maneuver.done = True
+        maneuver.function()
+
+  def getStatistics(self):
+    return dict(scheduled=self.scheduled, cancelled=self.cancelled)
+
+#------------------------------------------------------------------------------#
+# SimulatedController: stands in for PololuQik, keeps the speed of each motor  #
+#                      M0 drives the right hand side track, M1 the left one    #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class SimulatedController():
+  def __init__(self):
+    self.speeds   = [0, 0]
+    self.commands = 0
+
+  def setSpeeds(self, m0Speed, m1Speed):
+    self.speeds = [m0Speed, m1Speed]
+    self.commands += 1
+
+  def stopMotors(self):
+    self.speeds = [0, 0]
+    self.commands += 1
+
+  def reflexStop(self):
+    self.stopMotors()
+
+#------------------------------------------------------------------------------#
+# SimulatedSensor: stands in for ObstructionSensor, the simulation tells it    #
+#                  when the obstruction in front of the robot changes          #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class SimulatedSensor():
+  def __init__(self, clock=None):
+    self.obstructed = False
+    self.listeners  = []
+    self.reflex     = None
+    #changes on the simulated clock, for adaptive reverse
+    self.clock      = clock
+    self.history    = SensorHistory.SensorHistory()
+
+  def addListener(self, listener):
+    self.listeners.append(listener)
+
+  def setReflex(self, reflex):
+    self.reflex = reflex
+
+  #------------------------------------------------------------------------------#
+  # setObstructed: an edge of the sensor, as ObstructionSensor.do_edge           #
+  #                                                                              #
+  # paramteres: obstructed: True when an obstruction is in range                 #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 History                                               #
+  #------------------------------------------------------------------------------#
+  def setObstructed(self, obstructed):
+    if obstructed and self.reflex is not None:
+      self.reflex()
+    self.obstructed = obstructed
+    if self.clock is not None:
+      self.history.record(self.clock.now, obstructed)
+    for listener in self.listeners:
+      listener(obstructed)
+
+#------------------------------------------------------------------------------#
+# World: rectangular arena with circular obstacles, all in metres              #
+#                                                                              #
+# paramteres: width, height: size of the arena, (0, 0) is a corner             #
+#             obstacles:     (x, y, radius) tuples                             #
+#             start:         (x, y, heading in radians) of the robot           #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class World():
+  def __init__(self, width, height, obstacles=(), start=None):
+    self.width     = float(width)
+    self.height    = float(height)
+    self.obstacles = [tuple(float(value) for value in obstacle) for obstacle in obstacles]
+    self.start     = start or (self.width / 2, self.height / 2, 0.0)
+
+#------------------------------------------------------------------------------#
+# randomWorld: a world with randomly placed obstacles which leave the start    #
+#              position in the middle of the arena clear                       #
+#                                                                              #
+# paramteres: rng:       random.Random                                         #
+#             obstacles: number of obstacles                                   #
+#                                                                              #
+# returnvalues: World                                                          #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+def randomWorld(rng, width=4.0, height=4.0, obstacles=8, minRadius=0.05, maxRadius=0.3):
+  start = (width / 2, height / 2, rng.uniform(-math.pi, math.pi))
+  placed = []
+  while len(placed) < obstacles:
+    radius = rng.uniform(minRadius, maxRadius)
+    x, y = rng.uniform(0, width), rng.uniform(0, height)
+    if math.hypot(x - start[0], y - start[1]) > radius + BODY_RADIUS + SENSOR_RANGE:
+      placed.append((x, y, radius))
+  return World(width, height, placed, start)
+
+#------------------------------------------------------------------------------#
+# makeRobot: a robot object with the simulated controller, sensor and clock in #
+#            place of the hardware, no configuration is loaded                 #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+# 1.01    hta 18.10.2026 No sensor bus                                         #
+# 1.02    hta 18.10.2026 Adaptive reverse                                      #
+#------------------------------------------------------------------------------#
+def makeRobot(robotClass, controller, sensor, clock, driveSpeed, adaptiveReverse=False):
+  robot = robotClass.__new__(robotClass)
+  robot.logger = logging.getLogger('RobotSimulator')
+  robot.kwargs = {'adaptiveReverse': adaptiveReverse}
+  robot.timer = None
+  robot.scheduler = clock
+  robot.motorControl = controller
+  robot.motorCommands = controller
+  robot.commandArbiter = None
+  robot.speedRamp = None
+  robot.healthMonitor = None
+  robot.controllerHealth = None
+  robot.sensorBus = None
+  robot.sensorFront = sensor
+  robot.roverCondition = threading.Condition()
+  robot.roverEvents = 0
+  robot.setDriveSpeed = driveSpeed
+  robot.stopped = True
+  robot.isRoving = False
+  robot.isEvading = False
+  robot.evades = 0
+  robot.evadesCompleted = 0
+  robot.repeatedReverses = 0
+  robot.drivingForwards = False
+  robot.drivingBackwards = False
+  sensor.addListener(robot.sensorChanged)
+  return robot
+
+class Simulation():
+  def __init__(self, **kwargs):
+    #one robot per world, the same world may be given more than once
+    self.worlds = list(kwargs.get('worlds'))
+    self.timeStep = float(kwargs.get('timeStep', TIME_STEP))
+    driveSpeed = int(kwargs.get('driveSpeed', 30))
+    robotClass = kwargs.get('robotClass', PololuRobot.PololuRobot)
+    #reverse time adapted to how long obstacles stay in view, see
+    #PololuRobot.reverseTime
+    adaptiveReverse = kwargs.get('adaptiveReverse', False)
+    #batch the bodies with numpy, when installed
+    self.useNumpy = kwargs.get('useNumpy', True) and numpy is not None
+    self.clock = VirtualClock()
+    self.controllers = [SimulatedController() for world in self.worlds]
+    self.sensors = [SimulatedSensor(self.clock) for world in self.worlds]
+    self.robots = [makeRobot(robotClass, controller, sensor, self.clock, driveSpeed, adaptiveReverse)
+                   for controller, sensor in zip(self.controllers, self.sensors)]
+    #evasive action each robot waits in, see PololuRobot.rovingStep
+    self.actions = [None] * len(self.worlds)
+    count = len(self.worlds)
+    #per robot totals
+    self.distance = [0.0] * count
+    self.evadingTime = [0.0] * count
+    self.collisions = [0] * count
+    #bodies
+    self.x = [world.start[0] for world in self.worlds]
+    self.y = [world.start[1] for world in self.worlds]
+    self.heading = [world.start[2] for world in self.worlds]
+    self.contact = [False] * count
+    if self.useNumpy:
+      self.setUpArrays()
+
+  #------------------------------------------------------------------------------#
+  # setUpArrays: body state and worlds as numpy arrays. Worlds with fewer        #
+  #              obstacles are padded with obstacles of radius 0 far outside     #
+  #              the arena                                                       #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def setUpArrays(self):
+    count = len(self.worlds)
+    self.x = numpy.array(self.x)
+    self.y = numpy.array(self.y)
+    self.heading = numpy.array(self.heading)
+    self.contact = numpy.zeros(count, dtype=bool)
+    self.collisions = numpy.zeros(count, dtype=int)
+    self.width = numpy.array([world.width for world in self.worlds])
+    self.height = numpy.array([world.height for world in self.worlds])
+    obstacles = max([len(world.obstacles) for world in self.worlds] + [1])
+    padded = numpy.zeros((count, obstacles, 3))
+    padded[:, :, 0:2] = 1e6
+    for index, world in enumerate(self.worlds):
+      if world.obstacles:
+        padded[index, :len(world.obstacles)] = world.obstacles
+    self.obstacleX = padded[:, :, 0]
+    self.obstacleY = padded[:, :, 1]
+    self.obstacleRadius = padded[:, :, 2]
+
+  #------------------------------------------------------------------------------#
+  # moveBodiesNumpy: advance all bodies one step, in one batch with numpy        #
+  #                                                                              #
+  # paramteres: left, right: speed of the tracks in metres per second            #
+  #                                                                              #
+  # returnvalues: (distance moved, obstructed) per robot                         #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def moveBodiesNumpy(self, left, right):
+    left, right = numpy.array(left), numpy.array(right)
+    speed = (left + right) / 2
+    turnRate = (right - left) / TRACK_WIDTH
+    middle = self.heading + turnRate * self.timeStep / 2
+    x = self.x + speed * numpy.cos(middle) * self.timeStep
+    y = self.y + speed * numpy.sin(middle) * self.timeStep
+    self.heading = self.heading + turnRate * self.timeStep
+    #the body does not move into a wall or an obstacle, it may still turn
+    blocked = ((x < BODY_RADIUS) | (x > self.width - BODY_RADIUS) |
+               (y < BODY_RADIUS) | (y > self.height - BODY_RADIUS) |
+               (((self.obstacleX - x[:, None]) ** 2 + (self.obstacleY - y[:, None]) ** 2) <
+                (self.obstacleRadius + BODY_RADIUS) ** 2).any(axis=1))
+    self.x = numpy.where(blocked, self.x, x)
+    self.y = numpy.where(blocked, self.y, y)
+    self.collisions += blocked & ~self.contact
+    self.contact = blocked
+    moved = numpy.where(blocked, 0.0, numpy.abs(speed) * self.timeStep)
+    obstructed = numpy.zeros(len(self.worlds), dtype=bool)
+    for angle in (-SENSOR_ANGLE, 0.0, SENSOR_ANGLE):
+      cos, sin = numpy.cos(self.heading + angle), numpy.sin(self.heading + angle)
+      #closest point to each obstacle on the beam in front of the body
+      along = numpy.clip((self.obstacleX - self.x[:, None]) * cos[:, None] +
+                         (self.obstacleY - self.y[:, None]) * sin[:, None],
+                         BODY_RADIUS, BODY_RADIUS + SENSOR_RANGE)
+      beamX = self.x[:, None] + along * cos[:, None]
+      beamY = self.y[:, None] + along * sin[:, None]
+      endX = self.x + (BODY_RADIUS + SENSOR_RANGE) * cos
+      endY = self.y + (BODY_RADIUS + SENSOR_RANGE) * sin
+      obstructed |= ((endX < 0) | (endX > self.width) | (endY < 0) | (endY > self.height) |
+                     (((self.obstacleX - beamX) ** 2 + (self.obstacleY - beamY) ** 2) <=
+                      self.obstacleRadius ** 2).any(axis=1))
+    return moved.tolist(), obstructed.tolist()
+
+  #------------------------------------------------------------------------------#
+  # moveBodiesPython: as moveBodiesNumpy without numpy                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def moveBodiesPython(self, left, right):
+    moved, obstructed = [], []
+    for index, world in enumerate(self.worlds):
+      speed = (left[index] + right[index]) / 2
+      turnRate = (right[index] - left[index]) / TRACK_WIDTH
+      middle = self.heading[index] + turnRate * self.timeStep / 2
+      x = self.x[index] + speed * math.cos(middle) * self.timeStep
+      y = self.y[index] + speed * math.sin(middle) * self.timeStep
+      heading = self.heading[index] = self.heading[index] + turnRate * self.timeStep
+      blocked = (x < BODY_RADIUS or x > world.width - BODY_RADIUS or
+                 y < BODY_RADIUS or y > world.height - BODY_RADIUS or
+                 any((ox - x) ** 2 + (oy - y) ** 2 < (radius + BODY_RADIUS) ** 2
+                     for ox, oy, radius in world.obstacles))
+      if blocked:
+        if not self.contact[index]:
+          self.collisions[index] += 1
+        moved.append(0.0)
+      else:
+        self.x[index], self.y[index] = x, y
+        moved.append(abs(speed) * self.timeStep)
+      self.contact[index] = blocked
+      x, y = self.x[index], self.y[index]
+      seen = False
+      for angle in (-SENSOR_ANGLE, 0.0, SENSOR_ANGLE):
+        cos, sin = math.cos(heading + angle), math.sin(heading + angle)
+        endX = x + (BODY_RADIUS + SENSOR_RANGE) * cos
+        endY = y + (BODY_RADIUS + SENSOR_RANGE) * sin
+        seen = seen or endX < 0 or endX > world.width or endY < 0 or endY > world.height
+        for ox, oy, radius in world.obstacles:
+          if seen:
+            break
+          along = min(max((ox - x) * cos + (oy - y) * sin, BODY_RADIUS), BODY_RADIUS + SENSOR_RANGE)
+          seen = (ox - x - along * cos) ** 2 + (oy - y - along * sin) ** 2 <= radius ** 2
+      obstructed.append(seen)
+    return moved, obstructed
+
+  #------------------------------------------------------------------------------#
+  # startRoving: put every robot in roving mode, as PololuRobot.roving does      #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def startRoving(self):
+    for index, robot in enumerate(self.robots):
+      robot.isRoving = True
+      robot.isEvading = False
+      robot.stop()
+      robot.roverEvents = 0
+      self.actions[index] = robot.rovingStep(None)
+
+  #------------------------------------------------------------------------------#
+  # step: advance the simulation by one time step                                #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Evades counted by the robot                           #
+  #------------------------------------------------------------------------------#
+  def step(self):
+    self.clock.now += self.timeStep
+    #maneuvers ending now
+    self.clock.runDue()
+    left  = [controller.speeds[1] * SPEED_SCALE for controller in self.controllers]
+    right = [controller.speeds[0] * SPEED_SCALE for controller in self.controllers]
+    if self.useNumpy:
+      moved, obstructed = self.moveBodiesNumpy(left, right)
+    else:
+      moved, obstructed = self.moveBodiesPython(left, right)
+    for index, robot in enumerate(self.robots):
+      self.distance[index] += moved[index]
+      if obstructed[index] != self.sensors[index].obstructed:
+        self.sensors[index].setObstructed(obstructed[index])
+      if robot.isEvading:
+        self.evadingTime[index] += self.timeStep
+      #the roving thread would have been woken up
+      if robot.roverEvents and robot.isRoving:
+        robot.roverEvents = 0
+        self.actions[index] = robot.rovingStep(self.actions[index])
+
+  #------------------------------------------------------------------------------#
+  # run: rove for a number of simulated seconds                                  #
+  #                                                                              #
+  # paramteres: seconds: simulated time                                          #
+  #                                                                              #
+  # returnvalues: None                                                           #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------#
+  def run(self, seconds):
+    if not any(robot.isRoving for robot in self.robots):
+      self.startRoving()
+    steps = int(round(seconds / self.timeStep))
+    for step in range(steps):
+      self.step()
+
+  #------------------------------------------------------------------------------#
+  # getResults: totals per robot since the start of the simulation               #
+  #                                                                              #
+  # returnvalues: list with a dictionary per robot                               #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Repeated reverses                                     #
+  #------------------------------------------------------------------------------#
+  def getResults(self):
+    return [dict(seconds=self.clock.now,
+                 distance=self.distance[index],
+                 evadingTime=self.evadingTime[index],
+                 evades=self.robots[index].evades,
+                 repeatedReverses=self.robots[index].repeatedReverses,
+                 collisions=int(self.collisions[index]),
+                 commands=self.controllers[index].commands)
+            for index in range(len(self.robots))]
+
+def main():
+  parser = argparse.ArgumentParser(description='Simulated roving, faster than real time')
+  parser.add_argument('--hours', type=float, default=1.0, help='simulated hours of roving')
+  parser.add_argument('--robots', type=int, default=4, help='robots, each in a random world')
+  parser.add_argument('--obstacles', type=int, default=8, help='obstacles per world')
+  parser.add_argument('--speed', type=int, default=30, help='drive speed of the robots')
+  parser.add_argument('--time-step', type=float, default=TIME_STEP, help='simulated seconds per step')
+  parser.add_argument('--seed', type=int, default=1, help='seed for worlds and evade decisions')
+  parser.add_argument('--adaptive-reverse', action='store_true', help='reverse as long as obstacles usually stay in view')
+  parser.add_argument('--no-numpy', action='store_true', help='do not use numpy even when installed')
+  args = parser.parse_args()
+  logging.basicConfig(level=logging.WARNING)
+  rng = random.Random(args.seed)
+  #evade picks its turn with the random module
+  random.seed(args.seed)
+  worlds = [randomWorld(rng, obstacles=args.obstacles) for robot in range(args.robots)]
+  simulation = Simulation(worlds=worlds, timeStep=args.time_step, driveSpeed=args.speed,
+                          adaptiveReverse=args.adaptive_reverse, useNumpy=not args.no_numpy)
+  start = time.time()
+  simulation.run(args.hours * 3600)
+  wall = time.time() - start
+  print('simulated {:.0f}s of {} robots in {:.2f}s ({:.0f}x real time, {})'.format(
+        simulation.clock.now, args.robots, wall, simulation.clock.now / wall,
+        'numpy' if simulation.useNumpy else 'python'))
+  for index, result in enumerate(simulation.getResults()):
+    print('robot {:<3} distance {:8.1f}m evading {:5.1f}% evades {:5} repeated reverses {:5} collisions {:5}'.format(
+          index, result['distance'], 100 * result['evadingTime'] / result['seconds'],
+          result['evades'], result['repeatedReverses'], result['collisions']))
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
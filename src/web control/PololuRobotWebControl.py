@@ -26,12 +26,25 @@ handle URL processing, and 'WebOb''s Request and Response classes
 to ease construction of the responses. The pages themselves are stored as HTML
 with placeholders which are replaced as required
 
+On a threaded server the control form is processed and displayed by one
+request at a time, only sensor state requests are served concurrently.
+
+The control form shows which obstruction sensors are obstructed. The page asks
+for the sensor state with sensorState?after=<sequence>. When served by a
+threaded server (longPolling) the answer is held back until the state changes,
+so changes pushed by the robot's sensor bus reach the page straight away.
+Without a sensor bus (e.g. the asyncio runtime) the robot is asked for the
+obstructed sensors on every request and the page polls once a second.
+
 .. wheezy.routing: http://pythonhosted.org/wheezy.routing/
 .. WebOb: http://webob.org/
 """
 
 import sys,os
-from wsgiref.simple_server import make_server
+import json
+import threading
+import socketserver
+from wsgiref.simple_server import make_server, WSGIServer
 import logging
 from wheezy.routing import PathRouter, url
 from webob import Request, Response, exc
@@ -44,6 +57,18 @@ HERE = os.path.abspath(os.path.dirname(__file__))
 #text labels for roving on/off toggle button
 ROVING_ON = 'Roving ON'
 ROVING_OFF= 'Roving OFF'
+#seconds a sensor state request is held back waiting for a change
+LONG_POLL_TIMEOUT = 20
+
+#------------------------------------------------------------------------------#
+# ThreadingWSGIServer: WSGI server handling each request in a thread of its    #
+#                      own, so a long polling request does not hold up others  #
+#------------------------------------------------------------------------------#
+# version who when       description                                           #
+# 1.00    hta 18.10.2026 Initial version                                       #
+#------------------------------------------------------------------------------#
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+  daemon_threads = True
 #------------------------------------------------------------------------------#
 # WebControlFormHelper: helper class, holds pages and dynamic items on pages   #
 #                                                                              #
@@ -122,12 +147,26 @@ class PololuRobotWebControlApp(object):
     self.robot = kwargs.get('robot')
     #initialize speed in form with robot speed
     self.form.speed = self.robot.setDriveSpeed
+    #requests may be served concurrently, the form and the robot's controls
+    #are used by one request at a time
+    self.formLock = threading.RLock()
+    #sensor state requests may wait for a change, the server must be threaded
+    self.longPolling = kwargs.get('longPolling', False)
+    #obstructed sensors and the sequence of the event last seen, signalled
+    #when they change
+    self.sensorCondition = threading.Condition()
+    self.sensorSequence = 0
+    self.obstructedSensors = set(self.robot.getObstructedSensors())
+    #changes of state are pushed by the sensor bus, if the robot has one
+    if self.robot.sensorBus is not None:
+      self.robot.sensorBus.subscribe('web', handler=self.sensorEvent, maxSize=16)
     #create routes to web pages
     self.router = PathRouter()
     self.router.add_routes([
       url('/', self.do_main_page, name='home'),
       url('/doRobotControl', self.do_process_form, name='execute'),
-      url('/showRobotControlForm', self.do_display_form, name='view')
+      url('/showRobotControlForm', self.do_display_form, name='view'),
+      url('/sensorState', self.do_sensor_state, name='sensors')
       ])
 
   def __call__(self, environ, start_response):
@@ -181,8 +220,15 @@ class PololuRobotWebControlApp(object):
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 15.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 Obstructed sensors                                    #
+  # 1.02    hta 18.10.2026 Obstructed sensors without sensor bus                 #
+  # 1.03    hta 18.10.2026 One request at a time                                 #
   #------------------------------------------------------------------------------# 
   def do_display_form(self, req):
+    with self.formLock:
+      return self.display_form(req)
+
+  def display_form(self, req):
     res = Response()
     res.content_type = 'text/html'
     res.text         = self.form.controlForm % {'message':self.form.message, 
@@ -193,7 +239,9 @@ class PololuRobotWebControlApp(object):
                                     'rightButtonColor':        self.form.rightButtonColor, 
                                     'stopButtonColor':         self.form.stopButtonColor,
                                     'toggleRovingButtonColor': self.form.toggleRovingButtonColor,
-                                    'toggleRovingButtonText':  self.form.toggleRovingButtonText}   
+                                    'toggleRovingButtonText':  self.form.toggleRovingButtonText,
+                                    'sensorSequence':          self.sensorSequence,
+                                    'obstructedSensors':       ', '.join(self.getObstructedSensors()) or 'none'}   
     return res
     
   #------------------------------------------------------------------------------#
@@ -209,8 +257,13 @@ class PololuRobotWebControlApp(object):
   #------------------------------------------------------------------------------#
   # version who when       description                                           #
   # 1.00    hta 15.05.2014 Initial version                                       #
+  # 1.01    hta 18.10.2026 One request at a time                                 #
   #------------------------------------------------------------------------------# 
   def do_process_form(self, req):
+    with self.formLock:
+      return self.process_form(req)
+
+  def process_form(self, req):
     
     action           = req.params['action'] 
     speedSliderValue = req.params['speed']
@@ -258,6 +311,60 @@ class PololuRobotWebControlApp(object):
     #return updated control form to web client  
     return self.do_display_form (req)
 
+  #------------------------------------------------------------------------------#
+  # sensorEvent: subscriber of the sensor bus, keeps the obstructed sensors and  #
+  #              wakes up waiting sensor state requests                          #
+  # parameters: event: SensorEvent, a change of state                            #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------# 
+  def sensorEvent(self, event):
+    with self.sensorCondition:
+      if event.obstructed:
+        self.obstructedSensors.add(event.sensor)
+      else:
+        self.obstructedSensors.discard(event.sensor)
+      self.sensorSequence = event.sequence
+      self.sensorCondition.notify_all()
 
+  #------------------------------------------------------------------------------#
+  # getObstructedSensors: names of the obstructed sensors, as kept up to date    #
+  #                       by the sensor bus or, without one, as the robot sees   #
+  #                       them now                                               #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  #------------------------------------------------------------------------------# 
+  def getObstructedSensors(self):
+    if self.robot.sensorBus is None:
+      return sorted(self.robot.getObstructedSensors())
+    with self.sensorCondition:
+      return sorted(self.obstructedSensors)
 
-
+  #------------------------------------------------------------------------------#
+  # do_sensor_state: the obstructed sensors as JSON. When the sequence the page  #
+  #                  knows is still the latest and long polling is enabled the   #
+  #                  answer waits for a change, for LONG_POLL_TIMEOUT at most.   #
+  #                  Without a sensor bus the robot is asked straight away       #
+  # parameters: after: sequence of the state the page shows, anything but a     #
+  #                    number counts as -1 (no state shown yet)                  #
+  #------------------------------------------------------------------------------#
+  # version who when       description                                           #
+  # 1.00    hta 18.10.2026 Initial version                                       #
+  # 1.01    hta 18.10.2026 Obstructed sensors without sensor bus                 #
+  # 1.02    hta 18.10.2026 Invalid sequence                                      #
+  #------------------------------------------------------------------------------# 
+  def do_sensor_state(self, req):
+    try:
+      after = int(req.params.get('after', -1))
+    except ValueError:
+      after = -1
+    with self.sensorCondition:
+      if self.longPolling and self.robot.sensorBus is not None:
+        self.sensorCondition.wait_for(lambda: self.sensorSequence != after, LONG_POLL_TIMEOUT)
+      state = {'sequence': self.sensorSequence, 'obstructed': self.getObstructedSensors()}
+    res = Response()
+    res.content_type = 'application/json'
+    res.text         = json.dumps(state)
+    return res